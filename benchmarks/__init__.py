@@ -0,0 +1,5 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for meek (run as modules, e.g., python -m benchmarks.suite)
+"""
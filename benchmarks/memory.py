@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Report approximate memory cost per activity
+"""
+
+import argparse
+import gc
+from meek.activity import Activity
+import tracemalloc
+
+TAGS = ['home', 'work', 'health', 'errand', 'active', 'event']
+
+
+def build(n: int):
+    activities = list()
+    for i in range(0, n):
+        a = Activity(title=f'activity number {i}', tags=[TAGS[i % len(TAGS)], TAGS[(i * 7) % len(TAGS)]])
+        if i % 3 == 0:
+            a.interval = 'week'
+        activities.append(a)
+    return activities
+
+
+def measure(n: int):
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    activities = build(n)
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    events = sum([len(a.history) for a in activities])
+    return {
+        'activities': n,
+        'events': events,
+        'bytes_per_activity': (after - before) / n
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=2000, help='number of activities')
+    args = parser.parse_args()
+    r = measure(args.number)
+    print(
+        f'{r["activities"]} activities, {r["events"]} events: '
+        f'{r["bytes_per_activity"]:.0f} bytes per activity')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Check that importing the meek command interpreter stays within a time budget
+"""
+
+import argparse
+import re
+import subprocess
+import sys
+
+BUDGET_MS = 100
+MODULE = 'meek.interpreter'
+rx_importtime = re.compile(r'^import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \|(?P<indent>\s+)(?P<name>\S+)$')
+
+
+def measure(module: str = MODULE, runs: int = 5):
+    """Return the best cumulative import time (ms) and the slowest top-level imports of the last run."""
+    best = None
+    for i in range(0, runs):
+        p = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+            capture_output=True, text=True, check=True)
+        entries = list()
+        cumulative = None
+        for line in p.stderr.splitlines():
+            m = rx_importtime.match(line)
+            if m is None:
+                continue
+            us = int(m.group('cumulative'))
+            entries.append((us, m.group('name')))
+            if m.group('name') == module:
+                cumulative = us
+        if cumulative is None:
+            raise RuntimeError(f'No import time reported for {module}.')
+        if best is None or cumulative < best:
+            best = cumulative
+    entries.sort(reverse=True)
+    return (best / 1000, [(us / 1000, name) for us, name in entries[1:6]])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('-b', '--budget', type=float, default=BUDGET_MS, help='budget in milliseconds')
+    parser.add_argument('-m', '--module', default=MODULE, help='module to import')
+    args = parser.parse_args()
+    ms, slowest = measure(args.module)
+    print(f'import {args.module}: {ms:.1f} ms (budget {args.budget:.0f} ms)')
+    for t, name in slowest:
+        print(f'    {t:8.1f} ms  {name}')
+    if ms > args.budget:
+        sys.exit(f'FAIL: import {args.module} took {ms:.1f} ms, over the budget of {args.budget:.0f} ms')
+
+
+if __name__ == '__main__':
+    main()
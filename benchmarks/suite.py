@@ -0,0 +1,189 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Time core Manager operations on synthetic stores and write the results as JSON
+"""
+
+import argparse
+from benchmarks.synthetic import generate, write_import_file, write_store
+from datetime import datetime, timezone
+import json
+import logging
+from meek.dates import comprehend_date
+from meek.manager import Manager
+from pathlib import Path
+import platform
+from statistics import median
+import subprocess
+import sys
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+SIZES = [1000, 10000, 100000]
+IMPORT_LIMIT = 10000  # import creates live activities one at a time, so cap its input
+RANGE = 100  # activities touched by the modify and complete benchmarks
+# the kwargs each listing verb hands to Manager._get_list (see Interpreter)
+LISTINGS = {
+    'list': ('list', {}),
+    'due today': ('list', {'due': 'today'}),
+    'overdue today': ('list', {'overdue': 'today'}),
+    'projects': ('list', {'project': True}),
+    'stalled': ('list', {'project': True, 'stalled': 'True'}),
+    'current': ('current', {}),
+    'today': ('current', {'interval': 'any', 'overdue': 'today'}),
+    'tomorrow': ('current', {'interval': 'any', 'overdue': 'tomorrow'})
+}
+DATES = ['today', 'tomorrow', '2067-10-31', 'next friday', 'in 3 days', 'next month']
+
+
+def git_commit() -> str:
+    try:
+        p = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+            cwd=Path(__file__).parent)
+    except OSError:
+        return None
+    return p.stdout.strip() or None
+
+
+def measure(func, setup=None, repeat: int = 5) -> dict:
+    """ Run func repeat times (after setup, untimed, if given) and summarize the timings. """
+    times = list()
+    for i in range(0, repeat):
+        if setup is not None:
+            setup()
+        start = perf_counter()
+        func()
+        times.append(perf_counter() - start)
+    return {'seconds': median(times), 'min': min(times), 'max': max(times), 'runs': repeat}
+
+
+def loaded(where: Path) -> Manager:
+    m = Manager()
+    m.load_activities(where)
+    return m
+
+
+def cases(n: int, seed: int, repeat: int, tmp: Path):
+    """ Yield (name, func, setup, runs) for each benchmark on a store of size n, in order. """
+    activities = generate(n, seed)
+    where = write_store(tmp / f'store-{n}', activities)
+    heavy = max(1, min(repeat, 3 if n < 100000 else 1))  # whole-store operations are slow
+
+    yield 'load_activities', lambda: loaded(where), None, heavy
+
+    m = loaded(where)
+    out = tmp / f'save-{n}'
+
+    def full():
+        m.where = None  # otherwise later runs only write what changed
+    yield 'save_activities', lambda: m.save_activities(out), full, heavy
+    changed = list(m.activities.values())[0:RANGE]
+
+    def touch():
+        for a in changed:
+            a.title = a.title + '.'
+    yield 'save_activities (changed)', lambda: m.save_activities(out), touch, heavy
+
+    source = write_import_file(tmp / f'import-{n}.md', activities[0:IMPORT_LIMIT])
+    yield (
+        f'import_activities ({min(n, IMPORT_LIMIT)})', lambda: Manager().import_activities(source),
+        None, heavy)
+
+    for name, (base, kwargs) in LISTINGS.items():
+        def query(base=base, kwargs=kwargs):
+            kw = dict(kwargs)
+            if base == 'current':
+                m._current_kwargs(kw)
+            return m._get_list(**kw)
+        # clear the query cache so each run filters the store
+        yield f'_get_list {name}', query, m.query_cache.clear, repeat
+
+    incomplete = [a for a in m.activities.values() if not a.complete]
+
+    def context():
+        m.current = incomplete[0:RANGE]
+    yield (
+        f'modify_activity ({RANGE})', lambda: m.modify_activity([f'0-{RANGE - 1}'], tags='benchmark'),
+        context, repeat)
+
+    def pending():
+        m.current = [a for a in incomplete if not a.complete][0:RANGE]
+    yield (
+        f'complete_activity ({RANGE})', lambda: m.complete_activity([f'0-{RANGE - 1}']), pending,
+        repeat)
+
+    def dates():
+        for d in DATES:
+            comprehend_date(d)
+    yield f'comprehend_date ({len(DATES)})', dates, None, repeat
+
+
+def run(sizes: list, seed: int = 0, repeat: int = 5, verbose: bool = True) -> dict:
+    results = list()
+    with TemporaryDirectory() as tmp:
+        for n in sizes:
+            for name, func, setup, runs in cases(n, seed, repeat, Path(tmp)):
+                try:
+                    r = measure(func, setup, runs)
+                except Exception as err:
+                    # record the failure (e.g., a date the parser rejects) and carry on
+                    r = {'error': f'{type(err).__name__}: {err}'}
+                    summary = r['error']
+                else:
+                    summary = f'{r["seconds"] * 1000:>10.2f} ms'
+                results.append(dict(size=n, name=name, **r))
+                if verbose:
+                    print(f'{n:>7} {name:<32} {summary}', file=sys.stderr)
+    return {
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'time': datetime.now(timezone.utc).isoformat(),
+        'seed': seed,
+        'results': results
+    }
+
+
+def compare(old: dict, new: dict) -> list:
+    """ Return lines comparing the median timings of two result sets. """
+    before = {(r['size'], r['name']): r for r in old['results'] if 'seconds' in r}
+    lines = list()
+    for r in new['results']:
+        try:
+            b = before[(r['size'], r['name'])]
+        except KeyError:
+            continue
+        if 'seconds' not in r:
+            continue
+        ratio = r['seconds'] / b['seconds'] if b['seconds'] else float('inf')
+        lines.append(
+            f'{r["size"]:>7} {r["name"]:<32} {b["seconds"] * 1000:>10.2f} -> '
+            f'{r["seconds"] * 1000:>10.2f} ms  x{ratio:.2f}')
+    return lines
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument(
+        '-n', '--sizes', default=','.join([str(s) for s in SIZES]),
+        help='comma-separated store sizes')
+    parser.add_argument('-r', '--repeat', type=int, default=5, help='runs per benchmark')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    parser.add_argument('-o', '--output', default='benchmark-results.json', help='JSON results file')
+    parser.add_argument('-c', '--compare', help='earlier JSON results file to compare against')
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+    data = run([int(s) for s in args.sizes.split(',')], args.seed, args.repeat)
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(data, f, indent=4)
+    print(f'Wrote {len(data["results"])} results to {args.output}.')
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+        print(f'compared with {old["commit"]} ({old["time"]}):')
+        print('\n'.join(compare(old, data)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Generate deterministic synthetic activity stores of any size
+"""
+
+import argparse
+from datetime import date, datetime, timedelta, timezone
+import json
+from pathlib import Path
+import random
+from uuid import UUID
+
+WORDS = [
+    'call', 'email', 'write', 'read', 'review', 'draft', 'plan', 'buy', 'fix', 'clean', 'pay',
+    'book', 'renew', 'submit', 'prepare', 'schedule', 'update', 'order', 'return', 'check',
+    'report', 'paper', 'grant', 'budget', 'dentist', 'car', 'garden', 'taxes', 'invoice',
+    'slides', 'chapter', 'meeting', 'library', 'passport', 'insurance', 'lease', 'class',
+    'syllabus', 'proposal', 'workshop', 'server', 'backup', 'database', 'website', 'bike']
+TAGS = [
+    'work', 'home', 'active', 'errand', 'health', 'money', 'family', 'teaching', 'research',
+    'travel', 'admin', 'phone', 'computer', 'reading', 'writing', 'garden', 'car', 'kids',
+    'grants', 'conference']
+TAG_WEIGHTS = [1 / (rank + 1) for rank in range(len(TAGS))]  # Zipf-like: a few tags dominate
+INTERVALS = ['day', 'workday', 'week', 'biweekly', 'month', 'quarter', 'year']
+INTERVAL_WEIGHTS = [3, 2, 6, 2, 5, 2, 2]
+FIELDS = ['title', 'tags', 'due', 'interval', 'complete', 'not_before']
+FIELD_WEIGHTS = [2, 4, 8, 1, 3, 1]
+DAY = 86400
+
+
+def generate(n: int, seed: int = 0, today: date = None) -> list:
+    """
+    Return n activity dicts, as they are stored on disk, with realistic distributions:
+        ~20% complete, ~45% due (clustered around today, some long overdue), ~12% recurring,
+        ~5% deferred with not_before, ~4% projects owning 2-10 tasks, 0-4 Zipf-weighted tags,
+        and 1-40 history events (so some histories overflow the hot ring)
+    The same n, seed and today always produce the same store.
+    """
+    rng = random.Random(seed)
+    if today is None:
+        today = datetime.now(timezone.utc).date()
+    now = int(datetime(today.year, today.month, today.day, 12, tzinfo=timezone.utc).timestamp())
+    activities = list()
+    for i in range(0, n):
+        a = {
+            'id': UUID(int=rng.getrandbits(128), version=4).hex,
+            'title': ' '.join(rng.choices(WORDS, k=rng.randint(2, 6))) + f' {i}',
+            'complete': rng.random() < 0.2
+        }
+        ntags = min(rng.choices([0, 1, 2, 3, 4], weights=[3, 5, 4, 2, 1])[0], len(TAGS))
+        if ntags:
+            a['tags'] = sorted(set(rng.choices(TAGS, weights=TAG_WEIGHTS, k=ntags)))
+        if rng.random() < 0.45:
+            offset = int(rng.triangular(-60, 180, 7))
+            if rng.random() < 0.05:
+                offset -= rng.randint(60, 700)
+            a['due'] = (today + timedelta(days=offset)).isoformat()
+        if rng.random() < 0.12:
+            a['interval'] = rng.choices(INTERVALS, weights=INTERVAL_WEIGHTS)[0]
+        if rng.random() < 0.05:
+            a['not_before'] = (today + timedelta(days=rng.randint(2, 45))).isoformat()
+        created = now - rng.randint(0, 3 * 365) * DAY
+        history = [{'what': f'title={a["title"]}', 'when': created}]
+        for e in range(0, rng.choices([0, 1, 2, 5, 10, 39], weights=[4, 6, 4, 3, 2, 1])[0]):
+            field = rng.choices(FIELDS, weights=FIELD_WEIGHTS)[0]
+            history.append({'what': f'{field}={rng.choice(WORDS)}', 'when': rng.randint(created, now)})
+        history.sort(key=lambda h: h['when'])
+        a['history'] = [
+            {'what': h['what'], 'when': datetime.fromtimestamp(h['when'], timezone.utc).isoformat()}
+            for h in history]
+        activities.append(a)
+    # projects own tasks drawn from the activities that are not projects themselves
+    nprojects = max(1, n // 25) if n >= 3 else 0
+    projects = rng.sample(range(0, n), nprojects)
+    candidates = sorted(set(range(0, n)) - set(projects))
+    for p in projects:
+        a = activities[p]
+        a['project'] = True
+        if rng.random() < 0.15 or not candidates:
+            continue  # stalled
+        k = min(rng.randint(2, 10), len(candidates))
+        a['tasks'] = [activities[t]['id'] for t in rng.sample(candidates, k)]
+    return activities
+
+
+def write_store(where: Path, activities: list) -> Path:
+    """ Write activity dicts into a store directory that Manager.load_activities can read. """
+    activity_dir = where / 'activities'
+    activity_dir.mkdir(parents=True, exist_ok=True)
+    for a in activities:
+        with open(activity_dir / f'{a["id"]}.json', 'w', encoding='utf-8') as f:
+            json.dump(a, f, ensure_ascii=False)
+    return where
+
+
+def write_import_file(path: Path, activities: list) -> Path:
+    """ Write the titles of activities as a markdown list for Manager.import_activities. """
+    with open(path, 'w', encoding='utf-8') as f:
+        for a in activities:
+            f.write(f'- {a["title"]}\n')
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('where', help='directory for the new store')
+    parser.add_argument('-n', '--number', type=int, default=1000, help='number of activities')
+    parser.add_argument('-s', '--seed', type=int, default=0, help='random seed')
+    args = parser.parse_args()
+    where = Path(args.where).expanduser().resolve()
+    if (where / 'activities').exists():
+        raise SystemExit(f'{where} already contains a store')
+    write_store(where, generate(args.number, args.seed))
+    print(f'Wrote {args.number} activities to {where}.')
+
+
+if __name__ == '__main__':
+    main()
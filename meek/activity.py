@@ -5,60 +5,119 @@ Python 3 package template (changeme)
 """
 
 from collections import deque
+from copy import deepcopy
 
-from maya.core import MayaDT
-from meek.dates import comprehend_date, dow_future_proof, iso_datestamp
+from datetime import datetime
+from meek.dates import (
+    comprehend_date, dow_future_proof, is_mayadt, iso8601, iso_datestamp, local_tz, local_zone,
+    quick_datestamp, rx_iso_date)
 from meek.norm import norm
 import logging
-import maya
-from tzlocal import get_localzone
+from sys import intern
+from time import time
 from uuid import uuid4, UUID
 
 logger = logging.getLogger(__name__)
-tz = str(get_localzone())
+EMPTY = tuple()
+
+
+def event_time() -> int:
+    """Timestamp (epoch seconds) for a new history event."""
+    return int(time())
+
+
+def _epoch(when) -> int:
+    """Convert an event timestamp to integer seconds since the epoch."""
+    if isinstance(when, int):
+        return when
+    elif is_mayadt(when):
+        return int(when.epoch)
+    elif isinstance(when, str):
+        try:
+            # fast path for the ISO 8601 strings written by Event.asdict
+            return int(datetime.fromisoformat(when.replace('Z', '+00:00')).timestamp())
+        except ValueError:
+            import maya
+            return int(maya.when(when, local_tz()).epoch)
+    raise TypeError(f'Unexpected value for when: {type(when)}={repr(when)}')
 
 
 class Event:
     """An entry in the Activity history."""
 
+    __slots__ = ('what', '_when')
+
     def __init__(self, what: str, when=None):
         if when is None:
-            self.when = maya.when('today', tz)
-        else:
-            self.when = maya.when(when, tz)
-        self.what = what
+            when = event_time()
+        self._when = _epoch(when)
+        self.what = intern(what)
 
     def asdict(self):
         d = {
             'what': self.what,
-            'when': self.when.iso8601()
+            'when': iso8601(self._when)
         }
         return d
 
+    @ property
+    def epoch(self):
+        return self._when
+
+    @ property
+    def field(self):
+        return self.what.split('=')[0]
+
+    @ property
+    def when(self):
+        from maya import MayaDT
+        return MayaDT(self._when)
+
 
 class Activity:
     """Something you want or need to do."""
 
+    # history retention policy: the most recent events are kept in a bounded
+    # "hot" ring; older events are rolled up into a summary and queued for the
+    # per-activity archive (see Manager.save_activities)
+    history_limit = 32
+    history_keep = ('title', 'tags', 'id', 'interval')
+    supported_intervals = (
+        'none', 'day', 'workday', 'week', 'biweekly', 'month', 'quarter', 'year')
+
+    # collections (tags, tasks, notes, history) are allocated on first use
+    __slots__ = (
+        '_id', '_tags', '_title', '_due', '_not_before', '_complete', '_project',
+        '_tasks', '_history', '_history_spill', '_history_summary', '_interval',
+        '_notes', 'mode', '_cache', '_cache_json', '_dirty', '_pending', '_snapshot')
+
     def __init__(self, mode='live', **kwargs):
         self._id = None
-        self._tags = set()
+        self._tags = None
         self._title = None
         self._due = None
         self._not_before = None
         self._complete = False
         self._project = False
-        self._tasks = set()
-        self._history = deque()
-        self.supported_intervals = [
-            'none', 'day', 'workday', 'week', 'biweekly', 'month', 'quarter', 'year']
+        self._tasks = None
+        self._history = None
+        self._history_spill = None
+        self._history_summary = None
         self._interval = None
         self.mode = mode
-        # keeps events out of history if mode is not "live", e.g., reload from json
-        self._notes = dict()
+        # "memorex" keeps events out of history, e.g., reload from json;
+        # "batch" collects them into a single event (see begin_batch)
+        self._notes = None
+        self._cache = None
+        self._cache_json = None
+        self._dirty = True
+        self._pending = None
+        self._snapshot = None
         for k, arg in kwargs.items():
             if k == 'history':
-                for d in arg:
-                    self._history.append(Event(**d))
+                if arg:
+                    self._history = deque([Event(**d) for d in arg])
+                    self._compact_history()
                 continue
             try:
                 setattr(self, k, arg)
@@ -71,6 +130,9 @@ class Activity:
             self._id = uuid4()
 
     def asdict(self):
+        """Serialize to a dict, cached until the next change (treat it as read-only)."""
+        if self._cache is not None:
+            return self._cache
         d = {
             'id': self.id.hex,
             'title': self.title,
@@ -88,23 +150,89 @@ class Activity:
                 if len(v) == 0:
                     continue
                 val = list(v)
-            elif isinstance(v, maya.MayaDT):
+            elif is_mayadt(v):
                 val = v.iso8601()
             elif isinstance(v, bool):
                 val = v
             else:
                 raise TypeError(f'activity.{attrname}: {type(v)} = {repr(v)}')
             d[attrname] = val
-        if len(self._history) != 0:
-            d['history'] = [e.asdict() for e in self.history]
+        if self._history:
+            d['history'] = [e.asdict() for e in self._history]
+        if self._history_summary:
+            d['history_summary'] = self.history_summary
+        self._cache = d
         return d
 
+    def asjson(self):
+        """Serialize to UTF-8 encoded JSON, cached until the next change."""
+        if self._cache_json is None:
+            import ujson as json
+            self._cache_json = json.dumps(
+                self.asdict(), ensure_ascii=False, indent=4).encode('utf-8')
+        return self._cache_json
+
+    # batch: collect changes into history events stamped together, or roll them back
+
+    def begin_batch(self):
+        if self.mode == 'batch':
+            raise RuntimeError(f'Activity "{self.title}" is already in a batch.')
+        self._snapshot = (
+            self._tags and set(self._tags), self._title, self._due, self._not_before,
+            self._complete, self._project, self._tasks and set(self._tasks),
+            self._history and deque(self._history),
+            self._history_spill and list(self._history_spill),
+            self._history_summary and deepcopy(self._history_summary),
+            self._interval, self._notes and dict(self._notes), self._dirty)
+        self._pending = list()
+        self.mode = 'batch'
+
+    def commit_batch(self, when=None):
+        """Record the changes made since begin_batch, an event per field, all at one time."""
+        pending = self._pending
+        self._pending = None
+        self._snapshot = None
+        self.mode = 'live'
+        if pending and when is None:
+            when = event_time()
+        for what in pending or EMPTY:
+            self._append_event(what, when)
+
+    def rollback_batch(self):
+        """Undo all changes made since begin_batch."""
+        (
+            self._tags, self._title, self._due, self._not_before,
+            self._complete, self._project, self._tasks,
+            self._history, self._history_spill, self._history_summary,
+            self._interval, self._notes, dirty) = self._snapshot
+        self._touch()
+        self._dirty = dirty
+        self._pending = None
+        self._snapshot = None
+        self.mode = 'live'
+
+    # dirty: changed since last loaded from or saved to storage
+
+    @ property
+    def dirty(self):
+        return self._dirty
+
+    def mark_clean(self):
+        # retired events still have to reach the archive
+        self._dirty = bool(self._history_spill)
+
+    def _touch(self):
+        self._cache = None
+        self._cache_json = None
+        self._dirty = True
+
     @ property
     def complete(self):
         return self._complete
 
     @ complete.setter
     def complete(self, value):
+        self._touch()
         if value is None:
             v = False
         elif isinstance(value, bool):
@@ -120,7 +248,7 @@ class Activity:
             raise TypeError(
                 f'Value ({repr(value)} is {type(value)}. Expected {bool}.')
         self._complete = v
-        if self.mode == 'live':
+        if self.mode != 'memorex':
             self._append_event(f'complete={self.complete}')
         if self._complete:
             self._due_interval()
@@ -131,11 +259,14 @@ class Activity:
 
     @ due.setter
     def due(self, value):
+        self._touch()
         if isinstance(value, str):
             if value in ['none', '']:
                 value = None
         if value is None:
             self._due = None
+        elif isinstance(value, str) and quick_datestamp(value) is not None:
+            self._due = quick_datestamp(value)
         else:
             start_dt, end_dt = comprehend_date(value)
             if end_dt is not None:
@@ -144,16 +275,44 @@ class Activity:
                 dt = start_dt
             dt = dow_future_proof(value, dt)
             self._due = iso_datestamp(dt)
-        if self.mode == 'live':
+        if self.mode != 'memorex':
             self._append_event(f'due={self.due}')
 
     @ property
     def history(self):
-        return list(self._history)
+        return list(self._history or EMPTY)
 
     def reset_history(self):
-        self._history = deque([e for e in self._history if e.what in [
-                              'title', 'tags', 'id', 'interval']])
+        """Retire all events except those recording identity fields."""
+        self._touch()
+        if not self._history:
+            return
+        keep = deque()
+        for e in self._history:
+            if e.field in self.history_keep:
+                keep.append(e)
+            else:
+                self._retire_event(e)
+        self._history = keep
+
+    @ property
+    def history_spill(self):
+        """Retired events not yet written to the archive."""
+        return list(self._history_spill or EMPTY)
+
+    def clear_history_spill(self):
+        self._history_spill = None
+
+    @ property
+    def history_summary(self):
+        return dict(self._history_summary or EMPTY)
+
+    @ history_summary.setter
+    def history_summary(self, value):
+        self._touch()
+        if not isinstance(value, dict):
+            raise TypeError(f'value: {type(value)}={repr(value)}')
+        self._history_summary = dict(value) or None
 
     @ property
     def id(self):
@@ -161,13 +320,14 @@ class Activity:
 
     @ id.setter
     def id(self, value):
+        self._touch()
         if isinstance(value, UUID):
             self._id = value
         elif isinstance(value, str):
             self._id = UUID(value)
         else:
             raise TypeError(f'{type(value)}: {repr(value)}')
-        if self.mode == 'live':
+        if self.mode != 'memorex':
             self._append_event(f'id={self.id}')
 
     # interval: how soon to make due after completion
@@ -177,40 +337,59 @@ class Activity:
 
     @ interval.setter
     def interval(self, value):
+        self._touch()
+        if isinstance(value, list):
+            value = ','.join(value)  # e.g., BYDAY=MO,WE split apart by the interpreter
         if not isinstance(value, str):
             raise TypeError(f'value: {type(value)}: {repr(value)}')
         if value not in self.supported_intervals:
-            support_string = ', '.join(
-                [f'"{s}"' for s in self.supported_intervals])
-            raise ValueError(
-                f'Unexpected interval value "{value}". Supported values are: {support_string}.')
+            from meek.recurrence import parse_rule
+            try:
+                value = parse_rule(value).text
+            except ValueError as err:
+                support_string = ', '.join(
+                    [f'"{s}"' for s in self.supported_intervals])
+                raise ValueError(
+                    f'Unexpected interval value "{value}" ({err}). Supported values are: '
+                    f'{support_string}, or a recurrence rule like "FREQ=MONTHLY;BYDAY=-1FR".')
         if value == 'none':
             self._interval = None
         else:
-            self._interval = value
-        if self.mode == 'live':
+            self._interval = intern(value)
+        if self.mode != 'memorex':
             self._append_event(f'interval={self.interval}')
 
     # notes
 
     @ property
     def notes(self):
+        if not self._notes:
+            return list()
         note_list = [(n, k) for k, n in self._notes.items()]
         note_list.sort(key=lambda t: t[1])
         return note_list
 
     @ notes.setter
     def notes(self, value):
+        self._touch()
         for v, k in value:
-            self._notes[k] = v
+            self._add_note(k, v)
 
     @ notes.deleter
     def notes(self):
-        self._notes = dict()
+        self._touch()
+        self._notes = None
 
     def add_note(self, value):
-        k = maya.now().iso8601()
-        self._notes[k] = norm(value)
+        self._touch()
+        k = iso8601()
+        self._add_note(k, norm(value))
+
+    def _add_note(self, k, v):
+        self._touch()
+        if self._notes is None:
+            self._notes = dict()
+        self._notes[k] = v
 
     # not before: keep out of most listings until this date
 
@@ -220,20 +399,32 @@ class Activity:
 
     @ not_before.setter
     def not_before(self, value):
+        self._touch()
         if value is None or value in ['none', '']:
             self._not_before = None
         else:
-            start_dt, end_dt = comprehend_date(value)
-            tomorrow = maya.when('tomorrow', tz)
-            if start_dt >= tomorrow:
-                self._not_before = iso_datestamp(start_dt)
+            datestamp = None
+            if isinstance(value, str) and rx_iso_date.match(value):
+                # a date at least a day away is kept as a plain datestamp
+                start = datetime.fromisoformat(value).replace(tzinfo=local_zone())
+                if start.timestamp() >= time() + 86400:
+                    datestamp = quick_datestamp(value)
+            if datestamp is not None:
+                self._not_before = datestamp
             else:
-                self._not_before = start_dt
-            if self.mode == 'live':
+                import maya
+                start_dt, end_dt = comprehend_date(value)
+                tomorrow = maya.when('tomorrow', local_tz())
+                if start_dt >= tomorrow:
+                    self._not_before = iso_datestamp(start_dt)
+                else:
+                    self._not_before = start_dt
+            if self.mode != 'memorex':
                 self._append_event(f'not_before={self.due}')
 
     @ not_before.deleter
     def not_before(self):
+        self._touch()
         self._not_before = None
 
     # project: this activity is a project (True) or not
@@ -244,6 +435,7 @@ class Activity:
 
     @ project.setter
     def project(self, value):
+        self._touch()
         if isinstance(value, bool):
             val = value
         elif isinstance(value, str):
@@ -260,20 +452,21 @@ class Activity:
             raise TypeError(
                 f'Expected value of type {bool} but got {type(value)} = {repr(value)}')
         if not val:
-            if len(self._tasks) > 0:
+            if self._tasks:
                 raise RuntimeError(
                     f'Attempt to set project to false but there are still tasks.')
         self._project = val
 
     @ property
     def tags(self):
-        return list(self._tags)
+        return list(self._tags or EMPTY)
 
     @ tags.setter
     def tags(self, value):
+        self._touch()
         logger.debug(f'>>> {value} <<<')
         if value is None:
-            self._tags = set()
+            self._tags = None
         else:
             if isinstance(value, str):
                 values = [value, ]
@@ -284,22 +477,30 @@ class Activity:
             logger.debug(f'self._tags: {repr(self._tags)}')
             remove = set([v[1:] for v in values if v.startswith('-')])
             logger.debug(f'remove: {repr(remove)}')
-            add = set([v for v in values if not v.startswith('-')])
+            add = set([intern(v) for v in values if not v.startswith('-')])
             logger.debug(f'add: {repr(add)}')
-            self._tags.update(add)
+            if self._tags is None:
+                self._tags = add
+            else:
+                self._tags.update(add)
             self._tags.difference_update(remove)
+            if not self._tags:
+                self._tags = None
             logger.debug(f'self._tags: {repr(self._tags)}')
-        if self.mode == 'live':
+        if self.mode != 'memorex':
             self._append_event(f'tags={self.tags}')
 
     # tasks: activities subordinate to this activity, which is therefore a project
 
     @ property
     def tasks(self):
+        if self._tasks is None:
+            return set()
         return self._tasks
 
     @ tasks.setter
     def tasks(self, value):
+        self._touch()
         if isinstance(value, list):
             self.add_tasks(value)
         elif isinstance(value, (UUID, Activity)):
@@ -316,15 +517,19 @@ class Activity:
             self._add_task(v)
 
     def remove_tasks(self, value: list):
+        self._touch()
         if not isinstance(value, (UUID, Activity)):
             raise TypeError(
                 f'Expected value of type {UUID} or {Activity} but got {type(value)} = {repr(value)}')
         id = value
         if isinstance(value, Activity):
             id = value.id
+        if self._tasks is None:
+            raise KeyError(id.hex)
         self._tasks.remove(id.hex)
 
     def _add_task(self, value):
+        self._touch()
         if not isinstance(value, (UUID, Activity, str)):
             raise TypeError(
                 f'Expected value of type {UUID}, {Activity}, or {str} but got {type(value)} = {repr(value)}')
@@ -333,6 +538,8 @@ class Activity:
             id = value.id.hex
         elif isinstance(value, UUID):
             id = value.hex
+        if self._tasks is None:
+            self._tasks = set()
         self._tasks.add(id)
 
     @ property
@@ -341,29 +548,69 @@ class Activity:
 
     @ title.setter
     def title(self, value):
+        self._touch()
         if not isinstance(value, str):
             raise TypeError(f'{type(value)}: {repr(value)}')
         self._title = norm(value)
-        if self.mode == 'live':
+        if self.mode != 'memorex':
             self._append_event(f'title={self.title}')
 
     @ property
     def words(self):
-        attrs = [a for a in dir(self) if a not in ['_id', '_due', '_not_before'] and a.startswith(
-            '_') and not a.startswith('__')]
         attrvals = set()
-        for a in attrs:
-            v = getattr(self, a)
-            if isinstance(v, str):
+        for v in [self._title, self._interval]:
+            if v is not None:
                 attrvals.update(v.split())
-            elif isinstance(v, (list, set)):
-                for vv in v:
+        for vals in [self._tags, self._tasks]:
+            if vals:
+                for vv in vals:
                     attrvals.update(vv.split())
         return attrvals
 
-    def _append_event(self, what: str):
-        e = Event(what)
+    def _append_event(self, what: str, when=None):
+        self._touch()
+        if self.mode == 'batch':
+            self._pending.append(what)
+            return
+        e = Event(what, when)
+        if self._history is None:
+            self._history = deque()
         self._history.append(e)
+        self._compact_history()
+
+    def _compact_history(self):
+        """Retire the oldest events until the hot ring is within its limit."""
+        while len(self._history) > self.history_limit:
+            self._retire_event(self._history.popleft())
+
+    def _retire_event(self, event: Event):
+        """Roll an event up into the summary and queue it for the archive."""
+        self._touch()
+        if self._history_spill is None:
+            self._history_spill = list()
+        self._history_spill.append(event)
+        if self._history_summary is None:
+            self._history_summary = dict()
+        summary = self._history_summary
+        when = iso8601(event.epoch)
+        try:
+            summary['count'] += 1
+        except KeyError:
+            summary['count'] = 1
+            summary['first'] = when
+            summary['fields'] = dict()
+        if when < summary['first']:
+            summary['first'] = when
+        try:
+            if when > summary['last']:
+                summary['last'] = when
+        except KeyError:
+            summary['last'] = when
+        fields = summary['fields']
+        try:
+            fields[event.field] += 1
+        except KeyError:
+            fields[event.field] = 1
 
     def _due_interval(self):
         """Reset due date if an interval is set."""
@@ -371,17 +618,13 @@ class Activity:
             return
         if not self.complete:
             return
-        if self.interval == 'quarter':
-            kwargs = {'months': 3}
-        elif self.interval == 'biweekly':
-            kwargs = {'weeks': 2}
-        else:
-            kwargs = {f'{self.interval}s': 1}
-        logger.debug(f'kwargs: {kwargs}')
-        today = maya.when('today', tz)
-        logger.debug(f'today: {today}')
-        when = today.add(**kwargs)
+        # the next occurrence after today, so a rule's dates (e.g., the last workday of
+        # the month) are kept while plain intervals count from the day of completion
+        from meek.recurrence import next_due
+        when = next_due(self.interval, quick_datestamp('today'))
         logger.debug(f'when: {when}')
+        if when is None:
+            return
         self.due = when
         self.complete = False
 
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+asyncio meek server: concurrent readers, serialized writers, per-client sessions
+"""
+
+import asyncio
+from contextlib import asynccontextmanager
+import json
+import logging
+from meek.client import SOCKET_DEFAULT
+from meek.interpreter import Interpreter, WHERE_DEFAULT, split_command
+from meek.manager import Session, active_session
+from meek.norm import norm
+from meek.reminders import Reminders, sink_for
+from meek.script import load_store, run_command, save_store
+from meek.server import IDLE_DEFAULT, claim_socket, error_record
+import os
+from pathlib import Path
+from time import monotonic, time
+
+logger = logging.getLogger(__name__)
+
+# verbs that only look at the store (and the caller's own session context)
+READ_VERBS = frozenset([
+    'agenda', 'current', 'due', 'dump', 'export', 'full', 'help', 'history', 'list', 'memory',
+    'occurrences', 'overdue', 'projects', 'reminders', 'stalled', 'stats', 'tasks', 'today',
+    'tomorrow'])
+LINE_LIMIT = 2 ** 16  # longest request line accepted, in bytes
+
+
+class RWLock:
+    """Many readers or one writer; waiting writers block new readers so they cannot starve."""
+
+    def __init__(self):
+        self.readers = 0
+        self.writing = False
+        self.waiting = 0
+        self._cond = asyncio.Condition()
+
+    @asynccontextmanager
+    async def read(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: not self.writing and not self.waiting)
+            self.readers += 1
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.readers -= 1
+                if not self.readers:
+                    self._cond.notify_all()
+
+    @asynccontextmanager
+    async def write(self):
+        async with self._cond:
+            self.waiting += 1
+            try:
+                await self._cond.wait_for(lambda: not self.writing and not self.readers)
+            finally:
+                self.waiting -= 1
+            self.writing = True
+        try:
+            yield
+        finally:
+            async with self._cond:
+                self.writing = False
+                self._cond.notify_all()
+
+
+class AsyncServer:
+    """Serve one Interpreter to many clients over a Unix domain socket."""
+
+    def __init__(
+            self, path=SOCKET_DEFAULT, where=WHERE_DEFAULT, engine: str = 'dict',
+            idle: float = IDLE_DEFAULT, max_inflight: int = 16, write_timeout: float = 10.0,
+            stats_file=None, remind: str = None):
+        sink = sink_for(remind) if remind else None  # a bad spec fails before claiming the socket
+        self.path = Path(path)
+        self.stats_file = stats_file
+        self.where = Path(where).expanduser().resolve()
+        claim_socket(self.path, self.where)
+        self.interpreter = Interpreter(engine=engine)
+        self.interpreter.echo_errors = False
+        self.exists = load_store(self.interpreter, self.where)
+        # readers share the manager, so none of them may roll it over (see rollover)
+        self.interpreter.manager.lazy_rollover = False
+        self.reminders = None
+        if sink is not None:
+            # sent from their own thread, as each time arrives
+            self.reminders = Reminders(sink)
+            self.interpreter.manager.remind(self.reminders)
+        self.idle = idle
+        self.max_inflight = max_inflight
+        self.write_timeout = write_timeout
+        self.lock = None  # asyncio primitives are created on the serving loop
+        self.inflight = None
+        self.stopping = None
+        self.last_write = monotonic()
+        self.server = None
+        self.clients = set()
+
+    def is_read(self, command: str) -> bool:
+        """Decide whether a command line can run alongside other readers."""
+        try:
+            parts = split_command(norm(command))
+        except ValueError:
+            return True  # it will fail to parse without touching anything
+        if not parts:
+            return True
+        verb = parts[0]
+        if verb not in self.interpreter.verbs:
+            try:
+                verb = self.interpreter.aliases[verb]
+            except KeyError:
+                return True  # implicit tag/word listing, or an unrecognized verb
+        return verb in READ_VERBS
+
+    async def execute(self, session: Session, command: str) -> dict:
+        """Run one command line for a client under the appropriate lock."""
+        if command.strip() == 'shutdown':
+            self.stopping.set()
+            return {
+                'command': command,
+                'ok': True,
+                'output': 'Server stopping.',
+                'error': None,
+                'unexpected': False,
+                'context': []
+            }
+        read = self.is_read(command)
+        await self.rollover()
+        async with self.inflight:
+            if read:
+                async with self.lock.read():
+                    return await asyncio.to_thread(self._run, session, command)
+            async with self.lock.write():
+                self.last_write = monotonic()
+                return await asyncio.to_thread(self._run, session, command)
+
+    def _run(self, session: Session, command: str) -> dict:
+        token = active_session.set(session)
+        try:
+            return run_command(self.interpreter, command)
+        except SystemExit:
+            return error_record(command, 'The server keeps running; use "shutdown" to stop it.')
+        finally:
+            active_session.reset(token)
+
+    async def autosave(self):
+        """Save unsaved changes, if any, excluding writers while doing so."""
+        async with self.lock.write():
+            try:
+                result = await asyncio.to_thread(
+                    save_store, self.interpreter, self.where, self.exists)
+            except OSError as err:
+                logger.error(f'Autosave to {self.where} failed: {err}')
+                return
+        if result is not None:
+            self.exists = True
+
+    async def rollover(self):
+        """Advance date-relative state if the day has changed, excluding readers and writers."""
+        manager = self.interpreter.manager
+        if time() < manager.rollover_at:
+            return
+        async with self.lock.write():
+            if time() >= manager.rollover_at:  # unless a request waiting on the lock got here first
+                logger.info(await asyncio.to_thread(manager.rollover))
+
+    def dump_stats(self):
+        """Append the interpreter's statistics to the stats file, if there is one."""
+        if self.stats_file is None:
+            return
+        manager = self.interpreter.manager
+        try:
+            manager.metrics.dump(self.stats_file, manager.gauges())
+        except OSError as err:
+            logger.error(f'Writing statistics to {self.stats_file} failed: {err}')
+
+    async def start(self):
+        self.lock = RWLock()
+        self.inflight = asyncio.Semaphore(self.max_inflight)
+        self.stopping = asyncio.Event()
+        self.server = await asyncio.start_unix_server(
+            self._client, path=str(self.path), limit=LINE_LIMIT)
+        os.chmod(self.path, 0o600)
+        logger.info(f'Serving {self.where} at {self.path}')
+
+    async def serve(self, handle_signals: bool = False):
+        """Handle clients until "shutdown"; autosave when idle and on the way out."""
+        await self.start()
+        if self.reminders is not None:
+            self.reminders.start()
+        if handle_signals:
+            import signal
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self.stopping.set)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    await asyncio.wait_for(self.stopping.wait(), self.idle)
+                except asyncio.TimeoutError:
+                    if monotonic() - self.last_write >= self.idle:
+                        await self.autosave()
+                    self.dump_stats()
+                    await self.rollover()
+        finally:
+            self.server.close()
+            for writer in list(self.clients):
+                writer.close()
+            await self.server.wait_closed()
+            await self.autosave()
+            self.dump_stats()
+            if self.reminders is not None:
+                self.reminders.stop()
+            self.path.unlink(missing_ok=True)
+
+    async def _client(self, reader, writer):
+        session = Session()
+        self.clients.add(writer)
+        try:
+            while not self.stopping.is_set():
+                try:
+                    raw = await reader.readline()
+                except ValueError:  # line longer than LINE_LIMIT
+                    record = error_record(None, 'Bad request: line too long')
+                    raw = None
+                else:
+                    if not raw:
+                        break
+                    try:
+                        command = json.loads(raw)['command']
+                    except (ValueError, KeyError, TypeError) as err:
+                        record = error_record(None, f'Bad request: {err}')
+                    else:
+                        record = await self.execute(session, command)
+                writer.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+                # backpressure: stop reading requests from a client that is not reading answers
+                await asyncio.wait_for(writer.drain(), self.write_timeout)
+                if raw is None:
+                    break
+        except asyncio.TimeoutError:
+            logger.warning('Dropping a client that stopped reading responses.')
+        except ConnectionError:
+            pass
+        finally:
+            self.clients.discard(writer)
+            writer.close()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+LRU cache for query results, validated against per-index generation counters
+"""
+
+from collections import OrderedDict
+from math import inf
+from threading import Lock
+from time import time
+
+
+def freeze(value):
+    """ Make a kwargs value hashable (lists become tuples). """
+    if isinstance(value, list):
+        return tuple(freeze(v) for v in value)
+    return value
+
+
+class QueryCache:
+    """
+    Map normalized query keys to results. Each entry remembers the generations of the
+    indexes it depended on and is discarded on lookup if any of them has moved on.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()  # key -> (result, dependencies, expires)
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self._lock = Lock()  # concurrent readers (see meek.aserver) share the cache
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, generations: dict):
+        """ Return a copy of the cached result, or None on a miss. """
+        with self._lock:
+            try:
+                result, dependencies, expires = self.entries[key]
+            except KeyError:
+                self.misses += 1
+                return None
+            if time() >= expires or any(generations[d] != g for d, g in dependencies):
+                del self.entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return list(result)  # callers sort their lists in place
+
+    def peek(self, key, generations: dict) -> bool:
+        """ Say whether get would hit, without counting a lookup or evicting anything. """
+        with self._lock:
+            try:
+                result, dependencies, expires = self.entries[key]
+            except KeyError:
+                return False
+            return time() < expires and all(generations[d] == g for d, g in dependencies)
+
+    def put(self, key, depends_on, generations: dict, result: list, expires: float = inf):
+        dependencies = tuple((d, generations[d]) for d in depends_on)
+        with self._lock:
+            self.entries[key] = (list(result), dependencies, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self.entries),
+            'maxsize': self.maxsize,
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else 0.0
+        }
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thin client for the meek server (standard library only, so it starts fast)
+"""
+
+import json
+import os
+from pathlib import Path
+import socket
+
+SOCKET_DEFAULT = str(
+    Path(os.environ.get('XDG_RUNTIME_DIR', '/tmp')) / f'meek-{os.getuid()}.sock')
+
+
+def send(commands: list, path: str = SOCKET_DEFAULT, timeout: float = 30.0):
+    """Send command lines over one connection; yield the server's response records."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        s.settimeout(timeout)
+        s.connect(str(path))
+        with s.makefile('rwb') as f:
+            for command in commands:
+                f.write(json.dumps({'command': command}).encode('utf-8') + b'\n')
+                f.flush()
+                line = f.readline()
+                if not line:
+                    raise ConnectionError('server closed the connection')
+                yield json.loads(line)
+
+
+def main(argv: list) -> int:
+    """Run "meekc <verb> ..." (or command lines on standard input) against the server."""
+    import shlex
+    import sys
+    path = os.environ.get('MEEK_SOCKET', SOCKET_DEFAULT)
+    if argv:
+        commands = [shlex.join(argv)]
+    else:
+        commands = [line.strip() for line in sys.stdin if line.strip()]
+    status = 0
+    try:
+        for record in send(commands, path):
+            if record['output']:
+                print(record['output'])
+            if not record['ok']:
+                status = 1
+                if record['error'] != record['output']:
+                    print(f'Error: {record["error"]}', file=sys.stderr)
+    except OSError as err:
+        print(f'Cannot reach meek server at {path}: {err}', file=sys.stderr)
+        return 2
+    return status
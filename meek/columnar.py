@@ -0,0 +1,188 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar (struct-of-arrays) mirror of indexed activity fields
+"""
+
+import logging
+from meek.dates import day_ordinal, not_before_epoch
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+logger = logging.getLogger(__name__)
+NO_DAY = 0  # date ordinals start at 1, so 0 can stand for "no due date"
+NO_TIME = not_before_epoch(None)  # a missing not_before never hides anything
+
+
+class ColumnarStore:
+    """Keep scalar activity fields in NumPy arrays so predicates evaluate as masks."""
+
+    def __init__(self, capacity: int = 1024):
+        if np is None:
+            raise ImportError('The columnar engine requires numpy.')
+        self.capacity = capacity
+        self.rows = dict()  # activity id hex -> row number
+        self.activities = list()  # row number -> activity (None if free)
+        self.free = list()
+        self.alive = np.zeros(capacity, dtype=bool)
+        self.due = np.zeros(capacity, dtype=np.int32)
+        self.not_before = np.full(capacity, NO_TIME, dtype=np.float64)
+        self.complete = np.zeros(capacity, dtype=bool)
+        self.project = np.zeros(capacity, dtype=bool)
+        self.interval = np.zeros(capacity, dtype=np.int16)
+        self.interval_codes = {None: 0}
+        self.tags = dict()  # tag -> set of row numbers (sparse membership)
+        self.row_tags = dict()  # row number -> tags, so updates can retract
+
+    def __len__(self):
+        return len(self.rows)
+
+    def update(self, activity):
+        """Insert or refresh the row for an activity."""
+        try:
+            row = self.rows[activity.id.hex]
+        except KeyError:
+            row = self._allocate()
+            self.rows[activity.id.hex] = row
+            self.activities[row] = activity
+        self.alive[row] = True
+        if activity.due is None:
+            self.due[row] = NO_DAY
+        else:
+            self.due[row] = day_ordinal(activity.due)
+        self.not_before[row] = not_before_epoch(activity.not_before)
+        self.complete[row] = activity.complete
+        self.project[row] = activity.project
+        self.interval[row] = self._interval_code(activity.interval)
+        self._retract_tags(row)
+        tags = [t.lower() for t in activity.tags]
+        for t in tags:
+            try:
+                self.tags[t].add(row)
+            except KeyError:
+                self.tags[t] = {row}
+        if tags:
+            self.row_tags[row] = tags
+
+    def remove(self, activity):
+        """Drop the row for an activity."""
+        try:
+            row = self.rows.pop(activity.id.hex)
+        except KeyError:
+            return
+        self._retract_tags(row)
+        self.alive[row] = False
+        self.activities[row] = None
+        self.free.append(row)
+
+    def select(self, mask) -> list:
+        """Return the live activities selected by a mask."""
+        return [self.activities[i] for i in np.flatnonzero(mask & self.alive)]
+
+    def count(self, mask) -> int:
+        """Count the live activities selected by a mask."""
+        return int(np.count_nonzero(mask & self.alive))
+
+    def mask_all(self):
+        return self.alive.copy()
+
+    def mask_none(self):
+        return np.zeros(self.capacity, dtype=bool)
+
+    def mask_of(self, activities):
+        """Build a mask from a list of activities (for predicates kept in dict indexes)."""
+        mask = self.mask_none()
+        rows = [self.rows[a.id.hex] for a in activities]
+        if rows:
+            mask[np.array(rows, dtype=np.intp)] = True
+        return mask
+
+    def mask_bool(self, field: str, value):
+        if isinstance(value, bool):
+            col = getattr(self, field)
+            if value:
+                return col.copy()
+            else:
+                return ~col
+        return self.mask_none()
+
+    def mask_due(self, start: int, end: int):
+        return (self.due >= start) & (self.due <= end)
+
+    def bucket_due(self, start: int, days: int):
+        """Count unfinished activities due on each day from ordinal start; return rows by day too."""
+        offsets = self.due.astype(np.int64) - start
+        mask = self.alive & ~self.complete & (offsets >= 0) & (offsets < days)
+        rows = np.flatnonzero(mask)
+        offsets = offsets[rows]
+        counts = np.bincount(offsets, minlength=days)
+        return counts, rows[np.argsort(offsets, kind='stable')]
+
+    def mask_due_none(self):
+        return self.due == NO_DAY
+
+    def mask_overdue(self, end: int):
+        return (self.due != NO_DAY) & (self.due <= end)
+
+    def mask_not_before(self, epoch: float):
+        return self.not_before <= epoch
+
+    def mask_interval(self, value):
+        try:
+            code = self.interval_codes[value]
+        except KeyError:
+            return self.mask_none()
+        return self.interval == code
+
+    def mask_tag(self, tag):
+        mask = self.mask_none()
+        try:
+            rows = self.tags[tag]
+        except KeyError:
+            return mask
+        mask[np.fromiter(rows, dtype=np.intp, count=len(rows))] = True
+        return mask
+
+    def _allocate(self) -> int:
+        if self.free:
+            return self.free.pop()
+        row = len(self.activities)
+        if row >= self.capacity:
+            self._grow(self.capacity * 2)
+        self.activities.append(None)
+        return row
+
+    def _grow(self, capacity: int):
+        logger.debug(f'growing columnar store from {self.capacity} to {capacity} rows')
+        for name, fill in [
+                ('alive', False), ('due', NO_DAY), ('not_before', NO_TIME), ('complete', False),
+                ('project', False), ('interval', 0)]:
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[0:self.capacity] = old
+            setattr(self, name, new)
+        self.capacity = capacity
+
+    def _interval_code(self, value):
+        if value is not None:
+            value = value.lower()
+        try:
+            return self.interval_codes[value]
+        except KeyError:
+            code = len(self.interval_codes)
+            self.interval_codes[value] = code
+            return code
+
+    def _retract_tags(self, row: int):
+        try:
+            tags = self.row_tags.pop(row)
+        except KeyError:
+            return
+        for t in tags:
+            rows = self.tags[t]
+            rows.discard(row)
+            if not rows:
+                self.tags.pop(t)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Context-aware tab completion for the interactive interpreter
+"""
+
+from heapq import merge
+import logging
+from meek.activity import Activity
+from meek.trie import PrefixTrie
+
+logger = logging.getLogger(__name__)
+
+# keyword names understood by verbs through Interpreter._objectify
+KEYWORDS = [
+    'complete', 'days', 'due', 'force', 'interval', 'limit', 'months', 'not_before', 'offset',
+    'overdue', 'page', 'project', 'sort', 'tags', 'title', 'weeks', 'words', 'years']
+BOOLEANS = ['false', 'true']
+DATES = [
+    'today', 'tomorrow', 'monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday',
+    'sunday', 'week', 'month', 'quarter', 'year']
+LIMIT = 200  # more candidates than this are not useful at a prompt
+
+
+class Completer:
+    """Complete verbs, keyword names, and keyword values from the manager's tries."""
+
+    def __init__(self, interpreter):
+        self.interpreter = interpreter
+        self.verbs = PrefixTrie(list(interpreter.verbs) + list(interpreter.aliases.keys()))
+        self.keywords = PrefixTrie([f'{k}:' for k in KEYWORDS])
+        self.values = {
+            'complete': PrefixTrie(BOOLEANS),
+            'force': PrefixTrie(BOOLEANS),
+            'project': PrefixTrie(BOOLEANS),
+            'interval': PrefixTrie(Activity.supported_intervals),
+            'due': PrefixTrie(DATES),
+            'not_before': PrefixTrie(DATES),
+            'overdue': PrefixTrie(DATES)
+        }
+        self.matches = []
+
+    def candidates(self, line: str, begidx: int, text: str) -> list:
+        """Return completions for text, the word that starts at begidx in line."""
+        completions = self.interpreter.manager.completions
+        if not line[0:begidx].strip():
+            return self.verbs.complete(text, LIMIT)
+        for delim in [':', '=']:
+            if delim in text:
+                key, value = text.split(delim, 1)
+                head, sep, value = value.rpartition(',')
+                try:
+                    trie = self.values[key]
+                except KeyError:
+                    try:
+                        trie = completions[key]
+                    except KeyError:
+                        return []
+                return [f'{key}{delim}{head}{sep}{v}' for v in trie.complete(value, LIMIT)]
+        found = merge(
+            self.keywords.complete(text, LIMIT),
+            completions['tags'].complete(text, LIMIT),
+            completions['words'].complete(text, LIMIT))
+        results = list()
+        for v in found:
+            if not results or results[-1] != v:
+                results.append(v)
+                if len(results) >= LIMIT:
+                    break
+        return results
+
+    def complete(self, text: str, state: int):
+        """The readline completer protocol: return the state-th match, or None."""
+        if state == 0:
+            import readline
+            try:
+                self.matches = self.candidates(
+                    readline.get_line_buffer(), readline.get_begidx(), text)
+            except Exception as err:  # readline swallows errors; log them instead
+                logger.debug(f'completion failed: {err}')
+                self.matches = []
+        try:
+            return self.matches[state]
+        except IndexError:
+            return None
+
+
+def install(interpreter):
+    """Install a Completer for interpreter as the readline completer."""
+    import readline
+    completer = Completer(interpreter)
+    readline.set_completer(completer.complete)
+    readline.set_completer_delims(' \t\n"\'')
+    if 'libedit' in (readline.__doc__ or ''):
+        readline.parse_and_bind('bind ^I rl_complete')
+    else:
+        readline.parse_and_bind('tab: complete')
+    return completer
@@ -4,25 +4,90 @@
 Manage dates
 """
 
+from calendar import timegm
 from copy import copy
+from datetime import date, datetime, timedelta, timezone
+from functools import lru_cache
 import logging
 import math
-import maya
 import re
-from tzlocal import get_localzone
+import sys
 
 days_of_week = ['monday', 'tuesday', 'wednesday',
                 'thursday', 'friday', 'saturday', 'sunday']
 logger = logging.getLogger(__name__)
 rx_descriptive_date = re.compile(
     r'^(?P<relation>last|next|this)? ?(?P<period>monday|tuesday|wednesday|thursday|friday|saturday|sunday|week|month|quarter|year)$')
-tz = str(get_localzone())
+rx_iso_date = re.compile(r'^(?P<year>\d{4})-(?P<month>\d{2})-(?P<day>\d{2})$')
+relative_days = {'': 0, 'today': 0, 'tomorrow': 1, 'yesterday': -1}
+
+# maya (with pendulum and dateparser) and tzlocal are slow to import, so
+# they are loaded on first use; see quick_datestamp for the common cases
+# that avoid them entirely
+
+
+def __getattr__(name):
+    if name == 'tz':
+        return local_tz()
+    raise AttributeError(f'module {__name__} has no attribute {name}')
+
+
+@lru_cache(maxsize=None)
+def local_tz() -> str:
+    """Name of the local timezone."""
+    from tzlocal import get_localzone
+    return str(get_localzone())
+
+
+@lru_cache(maxsize=None)
+def local_zone():
+    from zoneinfo import ZoneInfo
+    return ZoneInfo(local_tz())
+
+
+def is_mayadt(value) -> bool:
+    """Test for a MayaDT without importing maya (none can exist until it is loaded)."""
+    maya = sys.modules.get('maya')
+    return maya is not None and isinstance(value, maya.MayaDT)
+
+
+def iso8601(epoch=None) -> str:
+    """ISO 8601 UTC timestamp formatted like MayaDT.iso8601 (default: now)."""
+    if epoch is None:
+        dt = datetime.now(timezone.utc)
+    else:
+        dt = datetime.fromtimestamp(epoch, timezone.utc)
+    return f'{dt.replace(tzinfo=None).isoformat()}Z'
+
+
+def quick_datestamp(when: str):
+    """
+    Return the datestamp iso_datestamp(comprehend_date(when)[0]) would produce,
+    without loading maya, for "today", "tomorrow", "yesterday" and ISO dates.
+    Returns None for anything else.
+    """
+    try:
+        days = relative_days[when]
+    except KeyError:
+        pass
+    else:
+        # maya reads these relative to now, in UTC
+        return (datetime.now(timezone.utc) + timedelta(days=days)).date().isoformat()
+    m = rx_iso_date.match(when)
+    if m is None:
+        return None
+    try:
+        midnight = datetime(
+            int(m.group('year')), int(m.group('month')), int(m.group('day')), tzinfo=local_zone())
+    except ValueError:
+        return None
+    return midnight.astimezone(timezone.utc).date().isoformat()
 
 
 def quarter(when):
     if isinstance(when, int):
         m = when
-    elif isinstance(when, maya.MayaDT):
+    elif is_mayadt(when):
         m = when.month
     else:
         raise TypeError(
@@ -43,6 +108,8 @@ def quarter(when):
 
 def comprehend_date(when):
     """Figure out a datetime for whatever is in the 'when' argument. """
+    import maya
+    tz = local_tz()
     if isinstance(when, maya.MayaDT):
         return (when, None)
     elif isinstance(when, str):
@@ -94,19 +161,62 @@ def comprehend_date(when):
     return (start_date, end_date)
 
 
-def dow_future_proof(when, dt: maya.MayaDT):
+def period_bounds(when: str, today: date = None) -> tuple:
+    """
+    First and last dates of "[this|next|last] week|month|quarter|year", with the periods
+    comprehend_date uses (a week is Monday-Friday), computed without maya.
+    """
+    m = rx_descriptive_date.match(when.strip().lower())
+    if m is None or m.group('period') in days_of_week:
+        raise ValueError(f'Expected a week, month, quarter or year, not {repr(when)}.')
+    if today is None:
+        today = date.fromisoformat(quick_datestamp('today'))
+    shift = {'last': -1, 'next': 1}.get(m.group('relation'), 0)
+    period = m.group('period')
+    if period == 'week':
+        start = today - timedelta(days=today.weekday()) + timedelta(weeks=shift)
+        return (start, start + timedelta(days=4))
+    elif period == 'year':
+        return (date(today.year + shift, 1, 1), date(today.year + shift, 12, 31))
+    months = 3 if period == 'quarter' else 1
+    first = (today.month - 1) // months * months + shift * months
+    start = date(today.year + first // 12, first % 12 + 1, 1)
+    following = first + months
+    end = date(today.year + following // 12, following % 12 + 1, 1) - timedelta(days=1)
+    return (start, end)
+
+
+def day_ordinal(datestamp: str) -> int:
+    """Convert an ISO 8601 date string (YYYY-MM-DD) to a proleptic Gregorian ordinal."""
+    return date.fromisoformat(datestamp[0:10]).toordinal()
+
+
+def not_before_epoch(value) -> float:
+    """Convert a not_before value to epoch seconds; None never hides anything."""
+    if value is None:
+        return -math.inf
+    elif isinstance(value, str):
+        # a bare date sorts before any time on that day, i.e., UTC midnight
+        return float(timegm(date.fromisoformat(value[0:10]).timetuple()))
+    elif is_mayadt(value):
+        return value.epoch
+    raise TypeError(f'value: {type(value)}={repr(value)}')
+
+
+def dow_future_proof(when, dt: 'maya.MayaDT'):
     """ If 'when' is a day of the week, make sure dt is in the future, not past. """
     if isinstance(when, str):
         if when in days_of_week:
-            today = maya.when('today', tz)
+            import maya
+            today = maya.when('today', local_tz())
             if today.weekday >= dt.weekday:
                 dt = dt.add(days=7)
     return dt
 
 
-def iso_datestamp(dt: maya.MayaDT):
+def iso_datestamp(dt: 'maya.MayaDT'):
     """Return just the date part of the ISO 8601 string for the MayaDT """
-    if isinstance(dt, maya.MayaDT):
+    if is_mayadt(dt):
         return dt.iso8601().split('T')[0]
     else:
         raise TypeError(f'Unexpected value for dt: {type(dt)}={repr(dt)}')
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Markdown export of activities, one bullet per activity, that import can read back
+"""
+
+import json
+import logging
+from meek.views import is_true
+import re
+from string import Formatter
+
+logger = logging.getLogger(__name__)
+INDENT = '  '  # per level of nesting: a project's tasks sit one level under it
+DEFAULT_TEMPLATE = (
+    '- [{check}] {title} due:{due} not_before:{not_before} interval:{interval} tags:{tags}'
+    ' project:{project}')
+TOKENS = ['due', 'not_before', 'interval', 'tags', 'project']  # key:value tokens import reads back
+rx_bullet = re.compile(r'^(?P<indent>\s*)[-*+]\s+(?:\[(?P<check>[ xX])\]\s*)?(?P<text>.*)$')
+rx_note = re.compile(r'^(?P<indent>\s*)>\s?(?P<text>.*)$')
+VALUE = r'(?:"(?:[^"\\]|\\.)*"|[^\s",]+)'  # a bare or quoted value; tags are a comma-separated list of them
+rx_token = re.compile(
+    r'\s+(?P<key>' + '|'.join(TOKENS) + r'):(?P<value>' + VALUE + r'(?:,' + VALUE + r')*)$')
+rx_value = re.compile(VALUE)
+# a title word that reads as a token gets a backslash, so import keeps it in the title
+rx_title_token = re.compile(r'(^|\s)(\\*)(?=(?:' + '|'.join(TOKENS) + r'):)')
+rx_escaped_token = re.compile(r'(^|\s)\\(\\*)(?=(?:' + '|'.join(TOKENS) + r'):)')
+
+
+def _quoted(value: str) -> str:
+    """ Quote a value containing whitespace, so that it stays one token. """
+    if value and (value.split() != [value] or value.startswith('"')):
+        return json.dumps(value, ensure_ascii=False)
+    return value
+
+
+def _escaped(title: str) -> str:
+    """ Put a backslash before title words like "tags:foo", and before those already escaped. """
+    return rx_title_token.sub(r'\1\2\\', title)
+
+
+def _dates(name):
+    def get(activity):
+        return getattr(activity, name) or ''
+    return get
+
+
+FIELDS = {
+    'check': lambda a: 'x' if a.complete else ' ',
+    'title': lambda a: _escaped(a.title or ''),
+    'due': _dates('due'),
+    'not_before': _dates('not_before'),
+    'interval': lambda a: _quoted(a.interval or ''),
+    'tags': lambda a: ','.join([_quoted(t) for t in sorted(a.tags)]) if a.tags else '',
+    'project': lambda a: 'true' if a.project else '',  # a project without tasks has nothing nested
+    'id': lambda a: a.id.hex,
+}
+
+
+def _word(space: str, steps: list, tail: str):
+    """ A function rendering one word of a template, with the space before it, or '' if it is empty. """
+    if not steps:
+        text = space + tail
+        return lambda a: text
+    if len(steps) == 1:
+        literal, get = steps[0]
+        before = space + literal
+
+        def single(a):
+            value = get(a)
+            return f'{before}{value}{tail}' if value else ''
+        return single
+
+    def several(a):
+        values = [get(a) for literal, get in steps]
+        if not any(values):
+            return ''
+        return space + ''.join([literal + value for (literal, get), value in zip(steps, values)]) + tail
+    return several
+
+
+class Template:
+    """
+    A line template like "- [{check}] {title} due:{due}", compiled once into a function per
+    word. A word whose fields are all empty is left out, with the space before it, so "due:"
+    is only written for activities that have a due date.
+    """
+
+    def __init__(self, text: str):
+        if '\n' in text:
+            raise ValueError('A template is one line.')
+        self.text = text
+        self.words = list()
+        parts = re.split(r'(\s+)', text)
+        constant = ''  # words without fields are joined to the next word that has some
+        for space, word in zip([''] + parts[1::2], parts[0::2]):
+            steps = list()
+            tail = ''
+            for literal, field, spec, conversion in Formatter().parse(word):
+                if field is None:
+                    tail = literal
+                    continue
+                if spec or conversion:
+                    raise ValueError(f'Template field {{{field}}} cannot have a format or conversion.')
+                try:
+                    steps.append((literal, FIELDS[field]))
+                except KeyError:
+                    raise ValueError(
+                        f'Unknown template field {{{field}}}. Expected any of {", ".join(FIELDS)}.')
+            if steps:
+                if constant:
+                    self.words.append(_word(constant, [], ''))
+                    constant = ''
+                self.words.append(_word(space, steps, tail))
+            else:
+                constant += space + tail
+        if constant:
+            self.words.append(_word(constant, [], ''))
+
+    def render(self, activity) -> str:
+        return ''.join([word(activity) for word in self.words])
+
+
+def load_template(path) -> Template:
+    """ A template from the first non-blank line of a file. """
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                return Template(line.rstrip('\r\n'))
+    raise ValueError(f'No template in {path}.')
+
+
+def walk(activities, lookup: dict, key=None):
+    """
+    Yield (depth, activity) for activities in order, each project followed by its tasks
+    (looked up by id hex and ordered by key). Tasks of a listed project are written under
+    it rather than at the top level, and a task shared by projects only under the first.
+    """
+    nested = set()
+    for a in activities:
+        if a.project and a.tasks:
+            nested.update(a.tasks)
+    placed = set()  # tasks already written under a project
+    for a in activities:
+        if a.id.hex in nested:
+            continue
+        yield from _subtree(a, lookup, key, 0, placed)
+
+
+def _subtree(activity, lookup, key, depth, placed):
+    yield (depth, activity)
+    if not (activity.project and activity.tasks):
+        return
+    tasks = list()
+    for hexid in activity.tasks:
+        if hexid in placed:
+            continue
+        placed.add(hexid)
+        try:
+            tasks.append(lookup[hexid])
+        except KeyError:
+            logger.warning(f'Project "{activity.title}" has a task that is not loaded: {hexid}.')
+    if key is not None:
+        tasks.sort(key=key)
+    for task in tasks:
+        yield from _subtree(task, lookup, key, depth + 1, placed)
+
+
+def lines(rows, template: Template, notes: bool = False):
+    """ Yield a markdown line for each (depth, activity), with notes quoted under it. """
+    for depth, a in rows:
+        indent = INDENT * depth
+        yield f'{indent}{template.render(a)}\n'
+        if notes:
+            for text, when in a.notes:
+                yield f'{indent}{INDENT}> {text}\n'
+
+
+def write(f, rows, template: Template, notes: bool = False) -> int:
+    """ Write the lines for rows to an open file as they are produced; return how many activities. """
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+    f.writelines(lines(counted(), template, notes))
+    return count
+
+
+def parse_line(line: str):
+    """
+    Read one line of markdown: ("activity", depth, fields) for a bullet, ("note", depth,
+    text) for a quote, and ("text", 0, line) otherwise. The fields are the title, key:value
+    tokens at its end, and complete when the bullet is checked. A backslash before a
+    key:value word in the title, as export writes it, is taken off.
+    """
+    m = rx_bullet.match(line)
+    if m is None:
+        m = rx_note.match(line)
+        if m is None:
+            return ('text', 0, line.strip())
+        return ('note', _depth(m.group('indent')), m.group('text').strip())
+    fields = dict()
+    text = ' ' + m.group('text').strip()
+    while True:
+        t = rx_token.search(text)
+        if t is None:
+            break
+        key, value = t.group('key'), t.group('value')
+        if key in fields:
+            break  # a repeated key belongs to the title
+        if key == 'tags':
+            value = [_unquoted(v) for v in rx_value.findall(value)]
+        elif key == 'project':
+            value = is_true(_unquoted(value))
+        else:
+            value = _unquoted(value)
+        fields[key] = value
+        text = text[:t.start()]
+    title = rx_escaped_token.sub(r'\1\2', text.strip())
+    if title:
+        fields['title'] = title
+    if m.group('check') in ['x', 'X']:
+        fields['complete'] = True
+    return ('activity', _depth(m.group('indent')), fields)
+
+
+def _unquoted(value: str) -> str:
+    if value.startswith('"'):
+        return json.loads(value)
+    return value
+
+
+def _depth(indent: str) -> int:
+    return len(indent.replace('\t', INDENT)) // len(INDENT)
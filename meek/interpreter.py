@@ -4,17 +4,17 @@
 Command interpreter for meek
 """
 
-from inspect import getdoc
 import logging
-import maya
 from meek.manager import Manager, UsageError
+from meek.norm import norm
 from pathlib import Path
 from pprint import pprint
 import re
-import readline
+import shlex
 from shutil import get_terminal_size
 import textwrap
 
+PROFILE_LIMIT = 25  # functions listed by the profile verb
 WHERE_DEFAULT = '~/.meek'
 
 logger = logging.getLogger(__name__)
@@ -37,12 +37,27 @@ rx_numeric = re.compile(r'^(?P<numeric>\d+)$')
 rx_numeric_range = re.compile(r'^(?P<start>\d+)\s*-\s*(?P<end>\d+)$')
 
 
+def split_command(s: str) -> list:
+    """Split a command line into parts, fixing common quoting errors."""
+    while True:
+        try:
+            return shlex.split(s)
+        except ValueError:
+            if (
+                s[0:4] == 'new ' and len(s) > 5 and s[4] == '"' and s[-1] == "'"
+                    and len([c for c in s[4:] if c == "'"]) % 2 == 0):
+                s = s[:-1] + '"'
+            else:
+                raise
+
+
 class Interpreter:
 
-    def __init__(self):
-        self.manager = Manager()
+    def __init__(self, engine: str = 'dict'):
+        self.manager = Manager(engine=engine)
         self.loaded = False
         self.modified = True
+        self.echo_errors = True
         self.verbs = ['_'.join(a.split('_')[2:]) for a in dir(self) if a.startswith('_verb_')]
         self.aliases = {
             '?': 'help',
@@ -74,6 +89,18 @@ class Interpreter:
         for v, aliases in self.reverse_aliases.items():
             aliases.sort()
 
+    @property
+    def errors(self):
+        """Usage errors recorded for the active session."""
+        return self.manager.session.errors
+
+    def execute(self, line: str):
+        """Normalize, split, and parse one command line; return its output."""
+        parts = split_command(norm(line))
+        if not parts:
+            return ''
+        return self.parse(parts)
+
     def parse(self, parts):
         verb = parts[0]
         try:
@@ -93,13 +120,16 @@ class Interpreter:
                     else:
                         kwargs[k] = verb
                 if len(kwargs) == 0:
-                    return f'Unrecognized verb "{verb}"'
+                    msg = f'Unrecognized verb "{verb}"'
+                    self.errors.append(msg)
+                    return msg
                 elif len(kwargs) > 1:
                     kwargs['or'] = list(kwargs.keys())
                 return self.manager.list_activities(**kwargs)
         args, kwargs = self._objectify(objects)
         try:
-            msg = getattr(self, f'_verb_{verb}')(args, **kwargs)
+            with self.manager.metrics.time(f'verb.{verb}'):
+                msg = getattr(self, f'_verb_{verb}')(args, **kwargs)
         except UsageError as err:
             msg = self._uerror(verb, err)
         if msg is not None:
@@ -180,6 +210,7 @@ class Interpreter:
                 return None
             if not unit[-1] == 's':
                 unit = f'{unit}s'
+            import maya
             now = maya.now()
             then = now.add(**{unit: qty})
             now = now.iso8601()
@@ -220,17 +251,58 @@ class Interpreter:
         logger.debug(f'args: {repr(args)}')
         return (args, kwargs)
 
+    def _unparse(self, args, kwargs):
+        """ Rebuild command parts from parsed args and keyword arguments. """
+        parts = list(args)
+        for k, v in kwargs.items():
+            if isinstance(v, list):
+                v = ','.join(v)
+            elif v is None:
+                v = ''
+            parts.append(f'{k}:{v}')
+        return parts
+
     def _uerror(self, verb: str, exception: Exception):
         """Handle usage error."""
         msg = str(exception)
-        print(f'Error: {msg}')
+        self.errors.append(msg)
+        if self.echo_errors:
+            print(f'Error: {msg}')
         self._usage(verb)
 
     def _usage(self, verb):
         """Print usage for indicated command"""
+        from inspect import getdoc
         usage = getdoc(getattr(self, f'_verb_{verb}')).splitlines()[1:]
         return '\n'.join(usage)
 
+    def _verb_agenda(self, args, **kwargs):
+        """
+        Show how many unfinished activities fall due on each day of a period, with
+        upcoming recurrences (marked ↻) and the first few titles for each day.
+            > agenda
+            > agenda next week
+            > agenda this month
+            > agenda next quarter titles:5
+            > agenda days:90
+        Weeks run Monday through Friday; months and quarters are shown as a calendar.
+        """
+        options = dict()
+        for k, v in kwargs.items():
+            if k not in ['days', 'titles']:
+                raise UsageError(f'Unexpected keyword: {k}')
+            try:
+                options[k] = int(v)
+            except ValueError:
+                raise UsageError(f'Expected a number for {k}, not {repr(v)}.')
+            if options[k] < 1 and k == 'days':
+                raise UsageError(f'Expected a positive number for {k}, not {repr(v)}.')
+        if args:
+            if 'days' in options:
+                raise UsageError(f'Unexpected arguments: {" ".join(args)}')
+            options['when'] = ' '.join(args)
+        return self.manager.agenda(**options)
+
     def _verb_complete(self, args, **kwargs):
         """
         Mark activities as complete.
@@ -331,6 +403,56 @@ class Interpreter:
         logging.getLogger().setLevel(level=logging.ERROR)
         return self._verb_level(args, **kwargs)
 
+    def _verb_explain(self, args, **kwargs):
+        """
+        Run a listing command and show how it was answered: each filter step, the index it
+        used, the activities going in and out, and the time spent.
+            > explain current
+            > explain list tags:errand due:tomorrow
+        """
+        if not args:
+            raise UsageError('Expected a listing command to explain.')
+        parts = self._unparse(args, kwargs)
+        with self.manager.capturing() as captured:
+            self.parse(parts)
+        if len(captured) != 1:
+            raise UsageError(f'"{shlex.join(parts)}" is not a listing, so there is nothing to explain.')
+        base, listing_kwargs = captured[0]
+        return self.manager.explain(shlex.join(parts), base, listing_kwargs)
+
+    def _verb_export(self, args, **kwargs):
+        """
+        Export activities to a markdown file that import can read back.
+            > export path/to/file.md
+              every activity, with projects' tasks nested under them
+            > export path/to/file.md due:"this week" tags:errand
+              what the same list command would show
+            > export path/to/file.md notes:true template:path/to/template.md
+              notes quoted under each activity; a one-line template such as
+              "- {title} (due {due})" using {check}, {title}, {due}, {not_before},
+              {interval}, {tags} and {id}
+            > export jsonl path/to/file.jsonl
+              every activity as a line of JSON (compressed if the name ends in .gz or .zst)
+        """
+        if len(args) == 2 and args[0] == 'jsonl':
+            if kwargs:
+                raise UsageError('JSON Lines export takes every activity, so it has no options.')
+            return self.manager.export_jsonl(args[1])
+        if len(args) != 1:
+            raise UsageError('Expected one argument: the path of the file to write.')
+        options = dict()
+        for k in ['template', 'notes']:
+            try:
+                options[k] = kwargs.pop(k)
+            except KeyError:
+                pass
+        if kwargs:
+            try:
+                kwargs['complete']
+            except KeyError:
+                kwargs['complete'] = False
+        return self.manager.export_activities(args[0], **options, **kwargs)
+
     def _verb_full(self, args, **kwargs):
         """
         Display all information for indicated activities (requires context).
@@ -344,6 +466,7 @@ class Interpreter:
             > help (lists all available command verbs)
             > help {verb} (prints usage for the indicated verb)
         """
+        from inspect import getdoc
         if args:
             verb = ' '.join(args)
             try:
@@ -375,15 +498,37 @@ class Interpreter:
                 )
             return '\n'.join(lines)
 
+    def _verb_history(self, args, **kwargs):
+        """
+        Display the full history of an activity, including archived events (requires context).
+            > history 7
+        """
+        try:
+            return self.manager.display_history(args, **kwargs)
+        except UsageError as err:
+            self._uerror('history', err)
+
     def _verb_import(self, args, **kwargs):
         """
         Import activities from an external file.
             > import path/to/file
             > import path/to/file due:friday tags:personal
               (keyword arguments used here are applied to all imported activities)
+            > import jsonl path/to/file.jsonl workers:4
+              activities exported with "export jsonl" (optionally decoded in 4 processes)
         """
         result = None
-        if len(args) == 0:
+        if args and args[0] == 'jsonl':
+            if len(args) != 2:
+                raise UsageError('Expected one path after "jsonl".')
+            try:
+                workers = kwargs.pop('workers')
+            except KeyError:
+                workers = 1
+            if kwargs:
+                raise UsageError('JSON Lines import keeps activities as they were, so only workers: is accepted.')
+            result = self.manager.import_jsonl(args[1], workers)
+        elif len(args) == 0:
             self._uerror('import', 'Path to file required for import')
         elif len(args) > 1:
             self._uerror(
@@ -522,7 +667,7 @@ class Interpreter:
         if len(args) == 0:
             where = WHERE_DEFAULT
         elif len(args) == 1:
-            where = args
+            where = args[0]
         else:
             raise ValueError(args)
         where = Path(where).expanduser().resolve()
@@ -535,6 +680,26 @@ class Interpreter:
                 self.modified = False
         return result
 
+    def _verb_memory(self, args, **kwargs):
+        """
+        Estimate the memory used by activities (history, MayaDT values, cached JSON),
+        indexes, and caches, and list the activities with the largest histories.
+            > memory
+            > memory top:20 sample:5000
+              (larger samples are slower but closer to exact)
+        """
+        if args:
+            raise UsageError(f'Unexpected arguments: {" ".join(args)}')
+        options = dict()
+        for k, v in kwargs.items():
+            if k not in ['sample', 'top']:
+                raise UsageError(f'Unexpected keyword: {k}')
+            try:
+                options[k] = int(v)
+            except ValueError:
+                raise UsageError(f'Expected a number for {k}, not {repr(v)}.')
+        return self.manager.memory(**options)
+
     def _verb_modify(self, args, **kwargs):
         """
         Make modifications to selected activities.
@@ -621,6 +786,39 @@ class Interpreter:
 
         return ''
 
+    def _verb_occurrences(self, args, **kwargs):
+        """
+        Show when recurring activities fall due: over the next two weeks, or the next
+        dates of one activity in context.
+            > occurrences
+            > occurrences days:30
+            > occurrences 3
+            > occurrences 3 count:5
+        Intervals may be recurrence rules as well as "day", "workday", "week", etc.:
+            > modify 3 interval:FREQ=MONTHLY;BYDAY=-1FR
+              (the last Friday of every month)
+            > modify 3 interval:FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1
+              (the last workday of every month)
+        """
+        options = dict()
+        for k, v in kwargs.items():
+            if k not in ['count', 'days']:
+                raise UsageError(f'Unexpected keyword: {k}')
+            try:
+                options[k] = int(v)
+            except ValueError:
+                raise UsageError(f'Expected a number for {k}, not {repr(v)}.')
+            if options[k] < 1:
+                raise UsageError(f'Expected a positive number for {k}, not {repr(v)}.')
+        i, j, other = self._comprehend_args(args)
+        if j is not None or other:
+            raise UsageError(f'Unexpected arguments: {" ".join(args)}')
+        if i is None:
+            options.pop('count', None)
+        else:
+            options.pop('days', None)
+        return self.manager.show_occurrences(i, **options)
+
     def _verb_overdue(self, args, **kwargs):
         """
         List unfinished activities by due date (including those previously due)
@@ -633,6 +831,38 @@ class Interpreter:
         kwargs['overdue'] = ' '.join(args)
         return self._verb_list([], **kwargs)
 
+    def _verb_profile(self, args, **kwargs):
+        """
+        Run any command under cProfile, then show its output and the functions that took the
+        most time.
+            > profile current
+            > profile save
+        """
+        if not args:
+            raise UsageError('Expected a command to profile.')
+        import cProfile
+        from io import StringIO
+        import pstats
+        parts = self._unparse(args, kwargs)
+        profiler = cProfile.Profile()
+        stream = self.manager.stream
+        self.manager.stream = False  # format inside the profile, not later while printing
+        try:
+            profiler.enable()
+            try:
+                result = self.parse(parts)
+            finally:
+                profiler.disable()
+        finally:
+            self.manager.stream = stream
+        out = StringIO()
+        pstats.Stats(profiler, stream=out).sort_stats('tottime', 'cumulative').print_stats(
+            PROFILE_LIMIT)
+        report = '\n'.join([line for line in out.getvalue().splitlines() if line.strip()])
+        if result:
+            return f'{result}\n\n{report}'
+        return report
+
     def _verb_projects(self, args, **kwargs):
         """
         List all projects
@@ -672,6 +902,25 @@ class Interpreter:
                 return 'Quitting without force:true not permitted unless you have first saved all changes.'
         exit()
 
+    def _verb_reminders(self, args, **kwargs):
+        """
+        List the next reminders a server started with --remind will send, as activities
+        fall due or come out from under not_before.
+            > reminders
+            > reminders count:20
+        """
+        if args:
+            raise UsageError(f'Unexpected arguments: {" ".join(args)}')
+        options = dict()
+        for k, v in kwargs.items():
+            if k != 'count':
+                raise UsageError(f'Unexpected keyword: {k}')
+            try:
+                options[k] = int(v)
+            except ValueError:
+                raise UsageError(f'Expected a number for {k}, not {repr(v)}.')
+        return self.manager.show_reminders(**options)
+
     def _verb_reschedule(self, args, **kwargs):
         """
         Reschedule a "due" activity.
@@ -692,6 +941,32 @@ class Interpreter:
             self.modified = True
             return result
 
+    def _verb_rules(self, args, **kwargs):
+        """
+        Show, load or apply the rules that tag and schedule new activities by their titles.
+            > rules
+            > rules load ~/meek-rules.json
+            > rules apply
+              (makes the changes the rules call for to every unfinished activity)
+        A rules file is a JSON list of triggers (a word, a phrase or a regular expression)
+        and the due, interval, not_before and tags they set; rules.json in the store
+        directory is loaded with the store:
+            [{"word": "meds", "set": {"tags": "health"}},
+             {"phrase": "pay rent", "set": {"due": "today", "interval": "month"}},
+             {"regex": "^[Cc]all ", "set": {"tags": ["phone"]}}]
+        """
+        if kwargs:
+            raise UsageError(f'Unexpected keywords: {", ".join(kwargs.keys())}')
+        if not args:
+            return self.manager.rules.describe()
+        elif args[0] == 'load' and len(args) == 2:
+            return self.manager.load_rules(Path(args[1]).expanduser().resolve())
+        elif args == ['apply']:
+            result = self.manager.apply_rules()
+            self.modified = True
+            return result
+        raise UsageError(f'Unexpected arguments: {" ".join(args)}')
+
     def _verb_save(self, args, **kwargs):
         """
         Save activities to storage.
@@ -716,7 +991,7 @@ class Interpreter:
         if len(args) == 0:
             where = WHERE_DEFAULT
         elif len(args) == 1:
-            where = args
+            where = args[0]
         else:
             raise ValueError(args)
         where = Path(where).expanduser().resolve()
@@ -733,6 +1008,33 @@ class Interpreter:
         kwargs['stalled'] = 'True'
         return self._verb_projects(args, **kwargs)
 
+    def _verb_stats(self, args, **kwargs):
+        """
+        Show timings (count, p50/p95/p99, max), sizes, and cache counters.
+            > stats
+            > stats reset
+            > stats off
+              (stop timing; "stats on" resumes)
+            > stats dump ~/meek-stats.jsonl
+              (appends the figures as JSON lines)
+        """
+        metrics = self.manager.metrics
+        if not args:
+            return self.manager.stats()
+        elif args[0] == 'reset':
+            metrics.reset()
+            return 'Statistics reset.'
+        elif args[0] in ['on', 'off']:
+            metrics.enabled = args[0] == 'on'
+            return f'Statistics {args[0]}.'
+        elif args[0] == 'dump':
+            if len(args) != 2:
+                raise UsageError('Expected a file path to dump statistics to.')
+            path = Path(args[1]).expanduser().resolve()
+            n = metrics.dump(path, self.manager.gauges())
+            return f'Appended {n} records to {path}.'
+        raise UsageError(f'Unexpected argument: {args[0]}')
+
     def _verb_tasks(self, args, **kwargs):
         """
         List all the tasks associated with a particular project that's in context.
@@ -779,6 +1081,45 @@ class Interpreter:
             kwargs['overdue'] = 'tomorrow'
         return self.manager.list_current(**kwargs)
 
+    def _verb_view(self, args, **kwargs):
+        """
+        Save, run, and remove named views (listings kept up to date as activities change).
+            > view
+              (lists saved views)
+            > view save errands list tags:errand
+            > view save stuck projects stalled:true
+            > view errands
+            > view errands limit:5
+            > view delete errands
+        """
+        views = self.manager.views
+        if not args:
+            if len(views) == 0:
+                return 'There are no saved views. Try "view save {name} {listing command}".'
+            return '\n'.join(
+                [f'{v.name}: {v.command}' for v in sorted(views.views.values(), key=lambda v: v.name)])
+        if args[0] == 'save':
+            if len(args) < 3:
+                raise UsageError('Expected a view name and a listing command.')
+            parts = self._unparse(args[2:], kwargs)
+            with self.manager.capturing() as captured:
+                self.parse(parts)
+            result = self.manager.save_view(args[1], shlex.join(parts), captured)
+            self.modified = True
+            return result
+        if args[0] in ['delete', 'del', 'rm']:
+            if len(args) != 2:
+                raise UsageError('Expected the name of a view to delete.')
+            try:
+                views.remove(args[1])
+            except KeyError:
+                raise UsageError(f'There is no saved view named "{args[1]}".')
+            self.modified = True
+            return f'Deleted view "{args[1]}".'
+        if len(args) != 1:
+            raise UsageError(f'Unexpected arguments: {" ".join(args[1:])}')
+        return self.manager.run_view(args[0], **kwargs)
+
     def _verb_warning(self, args, **kwargs):
         """
         Change logging level to WARNING
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+JSON Lines interchange: a whole store as one stream of activities, optionally compressed
+"""
+
+from collections import deque
+import gzip
+import io
+import logging
+from meek.activity import Activity
+import pathlib
+import ujson as json
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+CHUNK = 2000  # lines per task when decoding in parallel
+WRITE_LINES = 1000  # lines joined into each write
+SUFFIXES = {'.gz': 'gzip', '.gzip': 'gzip', '.zst': 'zstd', '.zstd': 'zstd'}
+
+
+def compression(path) -> str:
+    """ "gzip", "zstd" or None, from the suffix of the path. """
+    return SUFFIXES.get(pathlib.Path(path).suffix.lower())
+
+
+def open_jsonl(path, mode: str = 'rb'):
+    """ Open a JSON Lines file for binary reading ("rb") or writing ("wb"), compressed by suffix. """
+    if mode not in ['rb', 'wb']:
+        raise ValueError(f'Expected mode "rb" or "wb", not {repr(mode)}.')
+    kind = compression(path)
+    if kind == 'gzip':
+        # a low level: most of the size saved, at a fraction of the time of the default
+        return gzip.open(path, mode, compresslevel=1) if mode == 'wb' else gzip.open(path, mode)
+    elif kind == 'zstd':
+        if zstandard is None:
+            raise ImportError('Reading or writing zstd-compressed files requires zstandard.')
+        f = open(path, mode)
+        if mode == 'wb':
+            return zstandard.ZstdCompressor().stream_writer(f, closefd=True)
+        return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(f, closefd=True))
+    return open(path, mode)
+
+
+def write_jsonl(f, activities) -> int:
+    """ Write each activity's asdict() as a line of JSON, as they come; return how many. """
+    count = 0
+    lines = list()
+    for a in activities:
+        lines.append(json.dumps(a.asdict(), ensure_ascii=False))
+        if len(lines) == WRITE_LINES:
+            count += len(lines)
+            f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+            lines = list()
+    if lines:
+        count += len(lines)
+        f.write(('\n'.join(lines) + '\n').encode('utf-8'))
+    return count
+
+
+def _activities(lines: list) -> list:
+    return [Activity(**json.loads(line), mode='memorex') for line in lines]
+
+
+def _chunks(f, size: int):
+    chunk = list()
+    for line in f:
+        if line.strip():
+            chunk.append(line)
+            if len(chunk) == size:
+                yield chunk
+                chunk = list()
+    if chunk:
+        yield chunk
+
+
+def read_jsonl(f):
+    """ Yield a dict for each line of an open JSON Lines file, in order. """
+    for n, line in enumerate(f, start=1):
+        if line.strip():
+            try:
+                yield json.loads(line)
+            except ValueError as err:
+                raise ValueError(f'Line {n} is not valid JSON: {err}')
+
+
+def read_activities(f, workers: int = 1):
+    """
+    Yield an Activity for each line of an open JSON Lines file, in order. With more than
+    one worker, chunks of lines are decoded and made into activities in that many
+    processes, which send them back pickled (about half the cost of building them here),
+    with at most two chunks per worker in flight so that memory stays bounded.
+    """
+    if workers <= 1:
+        for d in read_jsonl(f):
+            yield Activity(**d, mode='memorex')
+        return
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(workers) as executor:
+        pending = deque()
+        for chunk in _chunks(f, CHUNK):
+            pending.append(executor.submit(_activities, chunk))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
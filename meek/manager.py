@@ -4,32 +4,95 @@
 Manager for meek
 """
 
-import chardet
 import codecs
 from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
 from copy import copy
-from meek.dates import comprehend_date, iso_datestamp
+from datetime import date, datetime, timedelta, timezone
+import gc
+from itertools import chain
+import heapq
+from math import inf
+from meek.dates import (
+    comprehend_date, day_ordinal, is_mayadt, iso8601, iso_datestamp, local_tz, not_before_epoch,
+    period_bounds, quick_datestamp, relative_days)
 from meek.norm import norm
-import mimetypes
+from meek.stats import Metrics, timed
+from operator import itemgetter
 import logging
-import maya
-from meek.activity import Activity
-from meek.dates import comprehend_date
+from meek.activity import Activity, event_time
 import os
 import pathlib
 from pprint import pformat, pprint
 import re
 import shutil
-from tzlocal import get_localzone
-import ujson as json
+from time import perf_counter, time
 
 
 logger = logging.getLogger(__name__)
-mimetypes.init()
-mimetypes.add_type('text/markdown', '.md')
-mimetypes.add_type('text/markdown', '.markdown')
 rx_numeric = re.compile(r'^(?P<numeric>\d+)$')
 rx_numeric_range = re.compile(r'^(?P<start>\d+)\s*-\s*(?P<end>\d+)$')
+AGENDA_TITLES = 3  # titles shown per day by the agenda
+BOUNDS_LIMIT = 1000  # date filter values whose bounds are remembered until the next rollover
+PAGE_SIZE = 20  # rows per page when "page:" is given without "limit:"
+# fields a listing can be sorted by, in the order of the precomputed key tuples; the
+# default sort (due, then title) is a prefix, so it can compare whole tuples
+SORT_FIELDS = ('due', 'title', 'not_before', 'interval', 'project', 'complete', 'tags')
+SORT_POSITIONS = {f: i for i, f in enumerate(SORT_FIELDS)}
+MISSING = (1, 0)  # sorts after every present value, (0, value), whatever its type
+MASKED = ('not_before', 'due', 'overdue', 'complete', 'project', 'interval', 'tags')  # see _mask
+
+
+def sort_key(activity) -> tuple:
+    """ Build the fixed-shape sort key for an activity: one (missing, value) pair per field. """
+    due = activity.due
+    title = activity.title
+    not_before = activity.not_before
+    interval = activity.interval
+    tags = activity.tags
+    return (
+        MISSING if due is None else (0, day_ordinal(due)),
+        MISSING if title is None else (0, title.casefold()),
+        MISSING if not_before is None else (0, not_before_epoch(not_before)),
+        MISSING if interval is None else (0, interval_rank(interval)),
+        (0, activity.project),
+        (0, activity.complete),
+        (0, min(t.casefold() for t in tags)) if tags else MISSING
+    )
+
+
+def interval_rank(interval: str) -> tuple:
+    """ Order named intervals from most to least frequent, then recurrence rules by text. """
+    try:
+        return (Activity.supported_intervals.index(interval), '')
+    except ValueError:
+        return (len(Activity.supported_intervals), interval)
+
+
+def guess_type(path):
+    """ Guess the mimetype of a file, reading the system mimetype databases on first use. """
+    import mimetypes
+    if not mimetypes.inited:
+        mimetypes.init()
+        mimetypes.add_type('text/markdown', '.md')
+        mimetypes.add_type('text/markdown', '.markdown')
+    return mimetypes.guess_type(path, strict=False)
+
+
+class Session:
+    """ Per-client context: the last listing, recent additions, and usage errors. """
+
+    __slots__ = ('current', 'previous', 'errors')
+
+    def __init__(self):
+        self.current = list()
+        self.previous = deque()
+        self.errors = list()
+
+
+# set by servers so that each client sees its own context on a shared Manager
+active_session = ContextVar('active_session', default=None)
 
 
 class UsageError(Exception):
@@ -39,12 +102,65 @@ class UsageError(Exception):
         super().__init__(self.message)
 
 
+class Batch:
+    """ Changes to many activities, applied together (see Manager.batch). """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.activities = dict()
+
+    def add(self, activity):
+        """ Enlist an activity so that direct changes to it are part of the batch. """
+        if activity.id.hex not in self.activities:
+            activity.begin_batch()
+            self.activities[activity.id.hex] = activity
+        return activity
+
+    def modify(self, activity, **kwargs):
+        self.add(activity)
+        for k, arg in kwargs.items():
+            setattr(activity, k, arg)
+
+    def commit(self):
+        when = event_time()
+        for a in self.activities.values():
+            a.commit_batch(when)
+        for a in self.activities.values():
+            self.manager._index_activity(a)
+        self.activities = dict()
+
+    def rollback(self):
+        for a in self.activities.values():
+            a.rollback_batch()
+        self.activities = dict()
+
+
 class Manager:
 
-    def __init__(self):
+    def __init__(self, engine: str = 'dict'):
+        # imported with the first manager rather than the module, so the interpreter starts quickly
+        from meek.cache import QueryCache
+        from meek.recurrence import OccurrenceIndex
+        from meek.rollover import DateBuckets
+        from meek.rules import DEFAULT_RULES, RuleSet, parse_rules
+        from meek.trie import PrefixTrie
+        from meek.views import Views
+        if engine == 'dict':
+            self.store = None
+        elif engine == 'columnar':
+            # numpy is optional, so only import it when asked
+            from meek.columnar import ColumnarStore
+            self.store = ColumnarStore()
+        else:
+            raise ValueError(
+                f'Unsupported engine "{engine}". Expected "dict" or "columnar".')
+        self.engine = engine
+        self.stream = False  # list verbs return row generators instead of strings
+        self.capture = None  # see capturing()
+        self.trace = None  # see tracing()
+        self.trace_depth = 0
         self.activities = dict()
-        self.previous = deque()
-        self.current = list()
+        self.default_session = Session()
         self.indexes = {
             'title': {},
             'words': {},
@@ -56,6 +172,50 @@ class Manager:
             'interval': {}
         }
         self.reverse_index = {}
+        self.sort_keys = {}  # activity (hashed by identity) -> sort_key(activity)
+        self.views = Views(self)
+        self.occurrences = OccurrenceIndex()  # upcoming dates of recurring activities
+        # date-relative state, advanced once a day by rollover()
+        self.today = None  # ISO date
+        self.today_ordinal = None
+        self.rollover_at = 0.0  # epoch seconds when the day next changes
+        # roll over on the first query of a new day; a server with concurrent readers turns
+        # this off and rolls over itself, holding its write lock
+        self.lazy_rollover = True
+        self.date_buckets = DateBuckets()  # overdue, today, this week
+        self.hidden = dict()  # activity -> not_before epoch, for those hidden when indexed
+        self.bounds = dict()  # date filter value -> _date_bounds result, for today
+        self.reminders = None  # see remind()
+        self.rules = RuleSet(parse_rules(DEFAULT_RULES))  # see load_rules()
+        # bumped whenever an index's keys for some activity change; "activities" counts
+        # additions and removals, "all" any (re)indexing at all
+        self.generations = {k: 0 for k in list(self.indexes.keys()) + ['activities', 'all']}
+        self.query_cache = QueryCache()
+        self.metrics = Metrics()
+        # index keys available for completion, kept in step with self.indexes
+        self.completions = {k: PrefixTrie() for k in ['tags', 'words']}
+        self.where = None
+        self.stored = set()  # ids of activities written at self.where
+
+    @property
+    def session(self):
+        """ The active client session, or the manager's own when none is active. """
+        s = active_session.get()
+        if s is None:
+            return self.default_session
+        return s
+
+    @property
+    def current(self):
+        return self.session.current
+
+    @current.setter
+    def current(self, value):
+        self.session.current = value
+
+    @property
+    def previous(self):
+        return self.session.previous
 
     def add_activity(self, activity):
         """ Add an activity to the manager. """
@@ -70,6 +230,124 @@ class Manager:
         a.add_note(note_text)
         return f'Added note to activity "{a.title}"'
 
+    def archived_history(self, activity):
+        """ Read the archived (cold) history of an activity from storage. """
+        import ujson as json
+        if self.where is None:
+            return list()
+        path = self.where / 'archive' / f'{activity.id.hex}.jsonl'
+        if not path.exists():
+            return list()
+        with open(path, 'r', encoding='utf-8') as f:
+            events = [json.loads(line) for line in f if line.strip()]
+        del f
+        return events
+
+    def agenda(self, when: str = 'week', days: int = None, titles: int = AGENDA_TITLES):
+        """
+        Show how many unfinished activities fall due on each day of a period (this week by
+        default, or days from today), with upcoming recurrences, and the first few titles.
+        """
+        today = date.fromisoformat(self._today())
+        if days is None:
+            try:
+                start, end = period_bounds(when, today)
+            except ValueError as err:
+                raise UsageError(str(err))
+            label = when
+        else:
+            start, end = today, today + timedelta(days=days - 1)
+            label = f'{days} days'
+        n = (end - start).days + 1
+        counts, due = self._due_buckets(start.toordinal(), n)
+        projected = [list() for i in range(0, n)]
+        for day, alist in self.occurrences.by_day(start.isoformat(), end.isoformat(), today.isoformat()).items():
+            projected[(date.fromisoformat(day) - start).days] = alist
+        total_due = sum(counts)
+        total_projected = sum([len(p) for p in projected])
+        lines = [
+            f'agenda: {start.isoformat()} to {end.isoformat()} ({label}): {total_due} due, '
+            f'{total_projected} recurring']
+        if n > 7:
+            lines.extend(self._agenda_grid(start, n, counts, projected))
+        for i in range(0, n):
+            count = counts[i] + len(projected[i])
+            if count == 0 and n > 7:
+                continue
+            day = start + timedelta(days=i)
+            shown = [a.title for a in heapq.nsmallest(titles, due[i], key=self.sort_keys.__getitem__)]
+            shown.extend([f'↻ {a.title}' for a in projected[i][0:titles - len(shown)]])
+            more = count - len(shown)
+            if more > 0:
+                shown.append(f'(+{more} more)')
+            lines.append(f'{day.strftime("%a")} {day.isoformat()} {count:>4}  {"; ".join(shown)}'.rstrip())
+        return '\n'.join(lines)
+
+    def _agenda_grid(self, start: date, n: int, counts: list, projected: list) -> list:
+        """ Lay out per-day counts as a calendar, one row per Monday-Sunday week. """
+        lines = [' ' * 10 + ''.join([f'{d:>8}' for d in ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']])]
+        monday = start - timedelta(days=start.weekday())
+        while monday <= start + timedelta(days=n - 1):
+            cells = list()
+            for wd in range(0, 7):
+                i = (monday - start).days + wd
+                if i < 0 or i >= n:
+                    cells.append(' ' * 8)
+                else:
+                    day = monday + timedelta(days=wd)
+                    count = counts[i] + len(projected[i])
+                    cells.append(f'{day.day:>4}:{count if count else ".":<3}')
+            lines.append((f'{monday.isoformat():<10}' + ''.join(cells)).rstrip())
+            monday += timedelta(weeks=1)
+        return lines
+
+    def _due_buckets(self, start: int, n: int) -> tuple:
+        """
+        Per-day counts and lists of the unfinished activities due on each of n days from
+        ordinal start: by bincount over the columnar store's due ordinals when there is one,
+        otherwise from the due index, whose keys are already days.
+        """
+        due = [list() for i in range(0, n)]
+        if self.store is not None:
+            counts, rows = self.store.bucket_due(start, n)
+            activities = self.store.activities
+            i = 0
+            for day, count in enumerate(counts.tolist()):
+                due[day] = [activities[r] for r in rows[i:i + count].tolist()]
+                i += count
+            return (counts.tolist(), due)
+        first = date.fromordinal(start).isoformat()
+        last = date.fromordinal(start + n - 1).isoformat()
+        for k, alist in self.indexes['due'].items():
+            if first <= k <= last:
+                due[day_ordinal(k) - start].extend([a for a in alist if not a.complete])
+        return ([len(d) for d in due], due)
+
+    def apply_rules(self):
+        """ Apply the keyword rules to every unfinished activity: one batch, one re-index pass. """
+        changed = 0
+        with self.batch() as b:
+            for a in list(self.activities.values()):
+                if a.complete:
+                    continue
+                changes = self.rules.changes(a)
+                if changes:
+                    b.modify(a, **changes)
+                    changed += 1
+        return f'Rules changed {changed} of {len(self.activities)} activities.'
+
+    @contextmanager
+    def batch(self):
+        """ Group changes to many activities: history events stamped together, one re-index pass. """
+        b = Batch(self)
+        try:
+            yield b
+        except Exception:
+            b.rollback()
+            raise
+        else:
+            b.commit()
+
     def complete_activity(self, args, **kwargs):
         context = self.current
         if len(context) == 0:
@@ -103,9 +381,9 @@ class Manager:
         alist = [context[i]]
         if j is not None:
             alist = context[i:j]
-        for a in alist:
-            a.complete = True
-            self._index_activity(a)
+        with self.batch() as b:
+            for a in alist:
+                b.modify(a, complete=True)
         if len(alist) == 1:
             msg = f'Marked 1 activity as completed.'
         else:
@@ -125,7 +403,7 @@ class Manager:
         id_list = [a.id for a in alist]
         for id in id_list:
             a = self.activities.pop(id.hex)
-            logger.warning('Deletion will work but indexes will be stale.')
+            self._unindex_activity(a)
         if len(id_list) == 1:
             return 'Deleted 1 activity.'
         else:
@@ -184,6 +462,19 @@ class Manager:
         d = a.asdict()
         return pformat(d, indent=4, sort_dicts=True)
 
+    def display_history(self, args, **kwargs):
+        """ Display hot and archived history for an activity in context. """
+        i, j, other = self._comprehend_args(args)
+        if i is None:
+            raise UsageError('The first argument must be a number.')
+        if j is not None or other:
+            raise UsageError(f'Unexpected additional arguments: {repr(args[1:])}.')
+        a = self._contextualize(i)[0]
+        events = self.archived_history(a)
+        events.extend([e.asdict() for e in a.history_spill])
+        events.extend([e.asdict() for e in a.history])
+        return '\n'.join([f'{e["when"].split("T")[0]}: {e["what"]}' for e in events])
+
     def dump_indexes(self, args):
         msg = []
         if len(args) > 1:
@@ -199,6 +490,103 @@ class Manager:
             msg.append(pformat(self.reverse_index, indent=4))
         return '\n'.join(msg)
 
+    def export_activities(self, path, template=None, notes=False, **kwargs):
+        """
+        Write activities to a markdown file, one bullet each with projects' tasks nested
+        under them: those a listing with kwargs would show, or every activity without any.
+        Lines are written as they are formatted, so the document is never held in memory.
+        """
+        from meek.export import DEFAULT_TEMPLATE, Template, load_template, walk, write
+        from meek.views import is_true
+        outpath = pathlib.Path(path).expanduser().resolve()
+        try:
+            if template is None:
+                template = Template(DEFAULT_TEMPLATE)
+            else:
+                template = load_template(pathlib.Path(template).expanduser())
+        except OSError as err:
+            raise UsageError(f'Cannot read the template: {err}')
+        except ValueError as err:
+            raise UsageError(f'Bad template: {err}')
+        try:
+            sortkeys = kwargs.pop('sort')
+        except KeyError:
+            sortkeys = ['due', 'title']
+        else:
+            if isinstance(sortkeys, str):
+                sortkeys = [sortkeys, ]
+        if kwargs:
+            try:
+                alist = self._get_list(**kwargs)
+            except NotImplementedError as err:
+                raise UsageError(f'Meek does not currently support export using "{str(err)}".')
+        else:
+            alist = list(self.activities.values())
+        self._sort_list(alist, sortkeys)
+        rows = walk(alist, self.activities, key=self.sort_keys.__getitem__)
+        temp = outpath.with_name(f'.{outpath.name}.tmp')
+        with open(temp, 'w', encoding='utf-8') as f:
+            count = write(f, rows, template, is_true(notes))
+        del f
+        os.replace(temp, outpath)
+        return f'Exported {count} activities to {outpath}.'
+
+    def export_jsonl(self, path):
+        """
+        Write every activity to a JSON Lines file, one asdict() per line, compressed if the
+        name ends in .gz or .zst. Archived history stays with the store it came from.
+        """
+        from meek.jsonl import open_jsonl, write_jsonl
+        outpath = pathlib.Path(path).expanduser().resolve()
+        temp = outpath.with_name(f'.tmp.{outpath.name}')  # same suffix, so same compression
+        with open_jsonl(temp, 'wb') as f:
+            count = write_jsonl(f, self.activities.values())
+        del f
+        os.replace(temp, outpath)
+        return f'Exported {count} activities to {outpath}.'
+
+    def import_jsonl(self, path, workers=1):
+        """
+        Add the activities in a JSON Lines file written by export_jsonl; those with the id
+        of an activity already here replace it. With workers, decode in that many processes.
+        The whole file is read before any activity is added, so a bad line changes nothing.
+        """
+        from meek.jsonl import open_jsonl, read_activities
+        inpath = pathlib.Path(path).expanduser().resolve()
+        try:
+            workers = int(workers)
+        except (TypeError, ValueError):
+            raise UsageError(f'workers must be a whole number, not {repr(workers)}.')
+        incoming = list()
+        replaced = 0
+        collecting = gc.isenabled()
+        # nothing made here is garbage, so collections as the heap grows would only rescan it
+        gc.disable()
+        try:
+            try:
+                with open_jsonl(inpath, 'rb') as f:
+                    for a in read_activities(f, workers):
+                        incoming.append(a)
+            except OSError as err:
+                raise UsageError(f'Cannot read {inpath}: {err}')
+            except (AttributeError, TypeError, ValueError) as err:
+                # e.g., a line that is JSON but not an object, or an object with unknown fields
+                raise UsageError(f'Bad JSON Lines in {inpath} after {len(incoming)} activities: {err}')
+            del f
+            for a in incoming:
+                try:
+                    old = self.activities[a.id.hex]
+                except KeyError:
+                    pass
+                else:
+                    self._unindex_activity(old)
+                    replaced += 1
+                self.add_activity(a)
+        finally:
+            if collecting:
+                gc.enable()
+        return f'Imported {len(incoming)} activities from {inpath} ({replaced} replaced).'
+
     def import_activities(self, path, **kwargs):
         if isinstance(path, str):
             inpath = pathlib.Path(path).expanduser().resolve()
@@ -207,7 +595,7 @@ class Manager:
         else:
             raise TypeError(
                 f'Expected {pathlib.Path} or {str} for "path" but got {type(path)}={repr(path)}.')
-        mime, encoding = mimetypes.guess_type(inpath, strict=False)
+        mime, encoding = guess_type(inpath)
         if mime is None:
             raise RuntimeError('Cannot determined file type.')
         num_bytes = min(2048, os.path.getsize(inpath))
@@ -215,22 +603,59 @@ class Manager:
         if raw.startswith(codecs.BOM_UTF8):
             character_encoding = 'utf-8-sig'
         else:
+            import chardet
             character_encoding = chardet.detect(raw)['encoding']
+            if character_encoding in [None, 'ascii']:
+                # the sample is only the start of the file, and UTF-8 reads ASCII too
+                character_encoding = 'utf-8'
+        if not mime.startswith('text/'):
+            return f'Error: Unsupported mimetype ({mime}).'
+        from meek.export import parse_line
         with open(inpath, 'r', encoding=character_encoding) as f:
-            if mime.startswith('text/'):
-                data = f.read()
-            else:
-                return f'Error: Unsupported mimetype ({mime}).'
+            data = [line.rstrip('\r\n') for line in f if line.strip()]
         del f
-        # NB: nested lists in markdown are flattened
-        data = [norm(datum) for datum in data.split('\n')]
-        data = [datum for datum in data if datum != '']
-        bullets = [datum[2:] for datum in data if datum[0:2] in ['- ', '* ']]
-        if bullets:
-            data = bullets
+        entries = [parse_line(datum) for datum in data]
+        if not [e for e in entries if e[0] == 'activity']:
+            # no bullets, so each line is an activity
+            entries = [('activity', 0, {'title': norm(datum)}) for datum in data]
+        # NB: nested bullets become the tasks of the bullet above them, which is a project
         result = list()
-        for datum in data:
-            result.append(self.new_activity(title=datum, **kwargs))
+        above = list()  # (depth, activity) for the bullets enclosing the current one
+        projects = dict()
+        last = None
+        stamp = time()
+        for kind, depth, value in entries:
+            if kind == 'text':
+                continue
+            elif kind == 'note':
+                if last is not None:
+                    stamp += 1e-6  # distinct keys keep the notes in order
+                    last.notes = [(norm(value), iso8601(stamp))]
+                continue
+            fields = dict(value)
+            for k, v in kwargs.items():
+                if k == 'tags' and 'tags' in fields:
+                    extra = v if isinstance(v, list) else [v, ]
+                    fields['tags'] = fields['tags'] + [t for t in extra if t not in fields['tags']]
+                else:
+                    fields[k] = v
+            try:
+                # last, so that completing a recurring activity sees its interval
+                fields['complete'] = fields.pop('complete')
+            except KeyError:
+                pass
+            result.append(self.new_activity(**fields))
+            last = self.previous[-1]
+            while above and above[-1][0] >= depth:
+                above.pop()
+            if above:
+                project = above[-1][1]
+                project.project = True
+                project.add_tasks([last])
+                projects[project.id.hex] = project
+            above.append((depth, last))
+        for project in projects.values():
+            self._index_activity(project)
         sep = '\n\t'
         return f'Created {len(result)} activities:{sep}{sep.join(result)}'
 
@@ -248,55 +673,116 @@ class Manager:
 
     def list_activities(self, **kwargs):
         logger.debug(f'list_activities:kwargs: {pformat(kwargs, indent=4)}')
+        if self.capture is not None:
+            self.capture.append(('list', dict(kwargs)))
+            return ''
+        offset, limit = self._paginate(kwargs)
         try:
             alist = self._get_list(**kwargs)
         except NotImplementedError as err:
             msg = f'Meek does not currently support list creation using "{str(err)}".'
             raise UsageError(msg)
-        try:
-            sortkeys = kwargs['sort']
-        except KeyError:
-            out_list = self._format_list(alist)
-        else:
-            out_list = self._format_list(alist, sort=sortkeys)
-        self.current = alist
-        return '\n'.join(out_list)
+        return self._present_list(alist, kwargs, offset, limit)
+
+    def list_notes(self, activity_number: int):
+        alist = self._contextualize(activity_number)
+        a = alist[0]
+        notes = a.notes
+        notes = [f'{n[1].split("T")[0]}: {n[0]}' for n in notes]
+        return '\n'.join(notes)
 
     def list_current(self, **kwargs):
+        if self.capture is not None:
+            self.capture.append(('current', dict(kwargs)))
+            return ''
+        self._current_kwargs(kwargs)
+        offset, limit = self._paginate(kwargs)
+        alist = self._get_list(**kwargs)
+        return self._present_list(alist, kwargs, offset, limit)
+
+    @contextmanager
+    def capturing(self):
+        """ Record the (list verb, kwargs) of listing calls instead of running them. """
+        self.capture = list()
         try:
-            kwargs['overdue']
-        except KeyError:
-            try:
-                kwargs['due']
-            except KeyError:
-                kwargs['overdue'] = 'this week'
+            yield self.capture
+        finally:
+            self.capture = None
+
+    @contextmanager
+    def tracing(self):
+        """ Record the steps of the queries run in this block (see explain). """
+        self.trace = list()
+        self.trace_depth = 0
         try:
-            kwargs['interval']
-        except KeyError:
-            kwargs['interval'] = None
-        kwargs['tags'] = 'active'
-        kwargs['complete'] = False
-        kwargs['or'] = ['overdue', 'tags']
-        alist = self._get_list(**kwargs)
+            yield self.trace
+        finally:
+            self.trace = None
+
+    def explain(self, command, base, kwargs):
+        """ Run a listing uncached, reporting each step's index, cardinalities and time. """
+        kwargs = dict(kwargs)
+        if base == 'current':
+            self._current_kwargs(kwargs)
+        offset, limit = self._paginate(kwargs)
         try:
             sortkeys = kwargs['sort']
         except KeyError:
-            out_list = self._format_list(alist)
+            sortkeys = ['due', 'title']
         else:
-            out_list = self._format_list(alist, sort=sortkeys)
-        self.current = alist
-        return '\n'.join(out_list)
-
-    def list_notes(self, activity_number: int):
-        alist = self._contextualize(activity_number)
-        a = alist[0]
-        notes = a.notes
-        notes = [f'{n[1].split("T")[0]}: {n[0]}' for n in notes]
-        return '\n'.join(notes)
+            if isinstance(sortkeys, str):
+                sortkeys = [sortkeys, ]
+        if kwargs:
+            or_list, not_before_today = self._normalize_list_kwargs(kwargs)
+        else:
+            or_list, not_before_today = list(), True
+        cached = self.query_cache.peek(
+            self._query_key(kwargs, not_before_today), self.generations)
+        with self.tracing() as trace:
+            start = perf_counter()
+            blist = self._run_query(kwargs, or_list, not_before_today)
+            filtered = perf_counter() - start
+        n = len(blist)
+        start = perf_counter()
+        if limit is None:
+            self._sort_list(blist, sortkeys)
+            shown = blist
+        else:
+            shown = self._sort_list(blist, sortkeys, offset + limit)
+        sorted_ = perf_counter() - start
+        start = perf_counter()
+        formatted = list(self._format_rows(shown, start=offset))
+        format_time = perf_counter() - start
+        rows = [
+            (
+                '  ' * step['depth'] + step['step'], step['index'] or '', step['in'], step['out'],
+                step['seconds'])
+            for step in trace]
+        rows.append(('filter total', '', len(self.activities), n, filtered))
+        rows.append((f'sort {",".join(sortkeys)}', 'sort keys', n, len(shown), sorted_))
+        rows.append(('format', '', len(shown[offset:]), len(formatted), format_time))
+        args = ', '.join([f'{k}={repr(v)}' for k, v in sorted(kwargs.items())])
+        lines = [
+            f'explain: {command}',
+            f'query: {args}',
+            f'engine: {self.engine}; {len(self.activities)} activities; query cache: '
+            f'{("miss", "hit")[cached]} (explain always recomputes)']
+        w0 = max([len(r[0]) for r in rows] + [4])
+        w1 = max([len(r[1]) for r in rows] + [5])
+        lines.append(f'{"step":<{w0}}  {"index":<{w1}}  {"in":>7}  {"out":>7}  {"ms":>9}')
+        for step, index, n_in, n_out, seconds in rows:
+            n_in = '' if n_in is None else n_in
+            n_out = '' if n_out is None else n_out
+            lines.append(
+                f'{step:<{w0}}  {index:<{w1}}  {n_in:>7}  {n_out:>7}  {seconds * 1000:>9.3f}')
+        return '\n'.join(lines)
 
+    @timed('manager.load')
     def load_activities(self, where: pathlib.Path):
+        import ujson as json
         activity_dir = where / 'activities'
         i = 0
+        loaded = set()
         for p in activity_dir.iterdir():
             if p.is_file():
                 if p.name.endswith('.json'):
@@ -307,10 +793,41 @@ class Manager:
                     logger.debug(f'instantiating activity for {p.name}')
                     logger.debug(f'json: {adict}')
                     a = Activity(**adict, mode='memorex')
+                    a.mark_clean()
                     self.add_activity(a)
+                    loaded.add(a.id.hex)
                     i += 1
+        views_path = where / 'views.json'
+        if views_path.is_file():
+            with open(views_path, 'r', encoding='utf-8') as f:
+                self.views.load(json.load(f))
+        rules_path = where / 'rules.json'
+        if rules_path.is_file():
+            self.load_rules(rules_path)
+        self.where = where
+        # only what was read from here: activities kept from an earlier load are not stored here
+        self.stored = loaded
+        self.rollover()
         return f'Loaded {i} activities from JSON files at {where}.'
 
+    def load_rules(self, path: pathlib.Path):
+        """ Replace the keyword rules with those in a JSON rules file. """
+        from meek.rules import RuleSet, load_rules
+        try:
+            rules = load_rules(path)
+        except OSError as err:
+            raise UsageError(f'Cannot read rules from {path}: {err}')
+        except ValueError as err:
+            raise UsageError(f'Bad rules in {path}: {err}')
+        self.rules = RuleSet(rules)
+        return f'Loaded {len(rules)} rules from {path}.'
+
+    def memory(self, sample=None, top=None):
+        """ Report the approximate memory used by activities, indexes and caches. """
+        from meek.memory import Footprint, SAMPLE, TOP
+        return Footprint(
+            self, sample=SAMPLE if sample is None else sample, top=TOP if top is None else top).report()
+
     def modify_activity(self, args, **kwargs):
         """ Modify an existing activity. """
         i, j, other = self._comprehend_args(args)
@@ -324,15 +841,15 @@ class Manager:
                     kwargs['complete'] = True
                 else:
                     raise UsageError(f'Unrecognized argument {repr(val)}.')
-        for a in alist:
-            for k, arg in kwargs.items():
-                try:
-                    setattr(a, k, arg)
-                except ValueError as err:
-                    msg = str(err)
-                    msg += f' activity="{a.title}", attribute="{k}", value="{arg}"'
-                    raise UsageError(msg)
-            self._index_activity(a)
+        with self.batch() as b:
+            for a in alist:
+                for k, arg in kwargs.items():
+                    try:
+                        b.modify(a, **{k: arg})
+                    except ValueError as err:
+                        msg = str(err)
+                        msg += f' activity="{a.title}", attribute="{k}", value="{arg}"'
+                        raise UsageError(msg)
         if len(alist) == 1:
             msg = f'Modified 1 activity.'
         else:
@@ -342,59 +859,112 @@ class Manager:
     def new_activity(self, **kwargs):
         """ Create a new activity and add it to the manager. """
         a = Activity(**kwargs)
+        self.rules.apply(a)  # before indexing, so that what the rules set is indexed too
         a = self.add_activity(a)
-        self._apply_keywords(a)
         self.previous.append(a)
         return f'Added {repr(a)}.'
 
     def purge(self):
         count = len(self.activities)
         self.activities = dict()
-        logger.warning('Purging works, but indexes will be stale.')
+        for idx in self.indexes.values():
+            idx.clear()
+        self.reverse_index = {}
+        self.sort_keys = {}
+        self.views.reset()
+        self.occurrences.clear()
+        self.date_buckets.clear()
+        self.hidden = dict()
+        if self.reminders is not None:
+            self.reminders.clear()
+        for k in self.generations.keys():
+            self.generations[k] += 1
+        for trie in self.completions.values():
+            trie.clear()
+        if self.store is not None:
+            self.store = type(self.store)()
         return f'Purged {count} activities from memory.'
 
+    @timed('manager.rollover')
+    def rollover(self, now: float = None) -> str:
+        """
+        Advance date-relative state to the day of now (the current time by default): refill
+        the due-date buckets, forget hides that have expired, slide the window of upcoming
+        occurrences, and drop date bounds and cached queries from the day before.
+        """
+        from meek.rollover import bucket_spans, next_midnight
+        if now is None:
+            now = time()
+        today = datetime.fromtimestamp(now, timezone.utc).date()
+        self.today = today.isoformat()
+        self.today_ordinal = today.toordinal()
+        self.rollover_at = next_midnight(now)
+        self.bounds = dict()
+        expired = [a for a, e in self.hidden.items() if e <= now]
+        for a in expired:
+            del self.hidden[a]
+        spans = bucket_spans(today)
+        self.date_buckets.reset(spans, self.activities.values())
+        self.occurrences.roll(self.today)
+        self.query_cache.clear()
+        counts = [f'{len(self.date_buckets.lookup(*span))} {name}' for name, span in spans.items()]
+        return f'Rolled over to {self.today}: {", ".join(counts)}; {len(expired)} hides expired.'
+
+    def _today(self) -> str:
+        """ Today's ISO date, rolling over first if the day has changed (unless lazy_rollover is off). """
+        if self.lazy_rollover and time() >= self.rollover_at:
+            self.rollover()
+        return self.today
+
+    def remind(self, reminders):
+        """ Schedule reminders (a meek.reminders.Reminders) for all activities and keep them current. """
+        self.reminders = reminders
+        reminders.reset(self.activities.values())
+
     def reschedule_activity(self, args, **kwargs):
         """Change the due date on an activity."""
         i, j, other = self._comprehend_args(args)
         if i is None:
             raise UsageError(
                 'The first argument must be a number or numeric range.')
-        tz = str(get_localzone())
+        import maya
+        tz = local_tz()
         logger.debug(f'i: {i}')
         logger.debug(f'j: {j}')
         alist = self._contextualize(i, j)
         success = 0
-        for idx, a in enumerate(alist):
-            if a.due is None:
-                logger.error(
-                    f'Activity {idx}:"{a.title}" has no due date. Reschedule command ignored.')
-                continue
-            due_dt = maya.when(a.due, tz)
-            if len(other) == 0:
-                if len(kwargs) == 0:
-                    due_dt = maya.when('tomorrow', tz)
-                elif len(kwargs) == 1:
-                    k = list(kwargs.keys())[0]
-                    if k in ['days', 'weeks', 'months', 'years']:
-                        due_dt = due_dt.add(**kwargs)
+        with self.batch() as b:
+            for idx, a in enumerate(alist):
+                if a.due is None:
+                    logger.error(
+                        f'Activity {idx}:"{a.title}" has no due date. Reschedule command ignored.')
+                    continue
+                due_dt = maya.when(a.due, tz)
+                if len(other) == 0:
+                    if len(kwargs) == 0:
+                        due_dt = maya.when('tomorrow', tz)
+                    elif len(kwargs) == 1:
+                        k = list(kwargs.keys())[0]
+                        if k in ['days', 'weeks', 'months', 'years']:
+                            due_dt = due_dt.add(**kwargs)
+                        else:
+                            raise NotImplementedError(f'kwargs={repr(kwargs)}')
                     else:
                         raise NotImplementedError(f'kwargs={repr(kwargs)}')
                 else:
-                    raise NotImplementedError(f'kwargs={repr(kwargs)}')
-            else:
-                arg = ' '.join(other)
-                start_dt, end_dt = comprehend_date(arg)
-                if end_dt is not None:
-                    due_dt = end_dt
-                elif start_dt is not None:
-                    due_dt = start_dt
-                else:
-                    raise NotImplementedError(f'arg={arg}')
-            a.reset_history()
-            a.due = due_dt
-            del a.not_before
-            self._index_activity(a)
-            success += 1
+                    arg = ' '.join(other)
+                    start_dt, end_dt = comprehend_date(arg)
+                    if end_dt is not None:
+                        due_dt = end_dt
+                    elif start_dt is not None:
+                        due_dt = start_dt
+                    else:
+                        raise NotImplementedError(f'arg={arg}')
+                b.add(a)
+                a.reset_history()
+                a.due = due_dt
+                del a.not_before
+                success += 1
         if len(alist) <= 1:
             noun = 'activity'
         else:
@@ -405,6 +975,7 @@ class Manager:
             msg = f'Rescheduled {success} out of {len(alist)} {noun}.'
         return msg
 
+    @timed('manager.save')
     def save_activities(self, where: pathlib.Path):
         if len(self.activities) == 0:
             return 'There are no loaded activities to save. Command ignored.'
@@ -414,21 +985,132 @@ class Manager:
         else:
             where.mkdir(parents=True)
         backup_dir = where / '.bak'
+        if where == self.where and (where / 'activities').is_dir() and self._stored_here():
+            # the backup is kept, and gains the files this save replaces (see _save_changed)
+            result = self._save_changed(where, backup_dir)
+            self._write_views(where)
+            self._write_rules(where)
+            return result
         if backup_dir.exists():
             shutil.rmtree(backup_dir, ignore_errors=False)
-        backup_dir.mkdir(exist_ok=True)
+        backup_dir.mkdir()
+        archive_dir = where / 'archive'
         for fsobj in where.iterdir():
+            if fsobj == archive_dir:
+                # append-only, so never rewritten or backed up
+                continue
             if not fsobj.name.startswith('.'):
                 logger.info(f'moving {fsobj} to {backup_dir}')
                 shutil.move(fsobj, backup_dir / fsobj.name)
         activity_dir = where / 'activities'
         activity_dir.mkdir()
         for aid, adata in self.activities.items():
-            with open(activity_dir / f'{aid}.json', 'w', encoding='utf-8') as f:
-                json.dump(adata.asdict(), f, ensure_ascii=False, indent=4)
-            del f
+            self._write_activity(activity_dir, archive_dir, adata)
+        self._write_views(where)
+        self._write_rules(where)
+        self.where = where
+        self.stored = set(self.activities.keys())
         return f'Wrote {len(self.activities)} JSON files at {where}.'
 
+    def _stored_here(self) -> bool:
+        """ Whether every unchanged activity is already written at self.where, so a save can skip it. """
+        stored = self.stored
+        return all([a.dirty or k in stored for k, a in self.activities.items()])
+
+    def _write_views(self, where: pathlib.Path):
+        """ Write saved view definitions next to the activities (results are rebuilt on load). """
+        import ujson as json
+        views_path = where / 'views.json'
+        if len(self.views) == 0:
+            views_path.unlink(missing_ok=True)
+            return
+        with open(views_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(self.views.asdicts(), indent=4, ensure_ascii=False))
+
+    def _write_rules(self, where: pathlib.Path):
+        """ Write the keyword rules next to the activities, unless they are the defaults. """
+        import ujson as json
+        from meek.rules import DEFAULT_RULES
+        rules_path = where / 'rules.json'
+        rules = [rule.asdict() for rule in self.rules.rules]
+        if rules == DEFAULT_RULES:
+            rules_path.unlink(missing_ok=True)
+            return
+        with open(rules_path, 'w', encoding='utf-8') as f:
+            f.write(json.dumps(rules, indent=4, ensure_ascii=False))
+
+    def run_view(self, name, **kwargs):
+        """ List the members of a saved view; limit/offset/page/sort may be given. """
+        try:
+            view = self.views.views[name]
+        except KeyError:
+            raise UsageError(f'There is no saved view named "{name}".')
+        alist = self.views.run(name)
+        present = dict(view.kwargs)
+        present.update(kwargs)
+        offset, limit = self._paginate(present)
+        return self._present_list(alist, present, offset, limit)
+
+    def save_view(self, name, command, captured):
+        """ Define a saved view from the (list verb, kwargs) captured while running command. """
+        if len(captured) != 1:
+            raise UsageError(f'"{command}" is not a listing, so it cannot be saved as a view.')
+        base, kwargs = captured[0]
+        try:
+            self.views.define(name, command, base, kwargs)
+        except NotImplementedError as err:
+            raise UsageError(f'Meek does not currently support views using "{str(err)}".')
+        return f'Saved view "{name}" ({command}).'
+
+    def gauges(self) -> dict:
+        """ Current sizes and cache counters, reported alongside the timings. """
+        gauges = {'activities': len(self.activities)}
+        for k, idx in self.indexes.items():
+            gauges[f'index.{k}.keys'] = len(idx)
+        for k, v in self.query_cache.stats().items():
+            gauges[f'query_cache.{k}'] = v
+        gauges['views'] = len(self.views)
+        gauges['hidden'] = len(self.hidden)
+        for name, span in self.date_buckets.names.items():
+            gauges[f'bucket.{name}'] = len(self.date_buckets.lookup(*span))
+        return gauges
+
+    def stats(self):
+        """ Summarize timings, sizes, and cache counters. """
+        return self.metrics.report(self.gauges())
+
+    def show_occurrences(self, number=None, days: int = 14, count: int = 10):
+        """
+        List the dates recurring activities fall due over the next days, or the next count
+        dates of one activity in context.
+        """
+        from meek.recurrence import upcoming
+        today = self._today()
+        if number is not None:
+            a = self._contextualize(number)[0]
+            if a.interval is None or a.due is None:
+                raise UsageError(f'{repr(a)} does not recur (it needs both a due date and an interval).')
+            dates = [a.due[0:10]] + upcoming(a.interval, a.due, count - 1)
+            return f'{a.title} ({a.interval}):\n' + '\n'.join([f'    {d}' for d in dates[0:count]])
+        end = (date.fromisoformat(today) + timedelta(days=days)).isoformat()
+        rows = [
+            (a.due[0:10], a) for k, alist in self.indexes['due'].items() if today <= k <= end
+            for a in alist if a.interval is not None and not a.complete]
+        rows.extend(self.occurrences.schedule(today, end, today))
+        if not rows:
+            return f'Nothing recurs in the next {days} days.'
+        rows.sort(key=lambda row: (row[0], self.sort_keys[row[1]]))
+        return '\n'.join([f'{day}: {a.title} ({a.interval})' for day, a in rows])
+
+    def show_reminders(self, count: int = 10):
+        """ List the next reminders the server will send. """
+        if self.reminders is None:
+            return 'Reminders are off (serve with --remind to turn them on).'
+        rows = [r.message() for r in self.reminders.upcoming(count)]
+        if not rows:
+            return 'No reminders are scheduled.'
+        return '\n'.join(rows)
+
     def show_tasks(self, project_number):
         activity = self._contextualize(project_number)[0]
         tasks = [self.activities[id] for id in activity.tasks]
@@ -440,56 +1122,54 @@ class Manager:
         msg += '\n   '.join(out_list[1:])
         return msg
 
-    def _apply_keywords(self, activity):
-        logger.debug(f'_apply_keywords: activity={repr(activity)}')
-        keywords = {
-            'annually': {
-                'due': 'today',
-                'interval': 'year'
-            },
-            'daily': {
-                'due': 'today',
-                'interval': 'day'
-            },
-            'medicate': {
-                'tags': 'health'
-            },
-            'medicated': {
-                'tags': 'health'
-            },
-            'medicine': {
-                'tags': 'health'
-            },
-            'meds': {
-                'tags': 'health',
-            },
-            'monthly': {
-                'due': 'today',
-                'interval': 'month'
-            },
-            'quarterly': {
-                'due': 'today',
-                'interval': 'quarter'
-            },
-            'weekly': {
-                'due': 'today',
-                'interval': 'week'
-            },
-            'yearly': {
-                'due': 'today',
-                'interval': 'year'
-            },
-        }
-        awords = activity.words
-        logger.debug(f'awords = {repr(awords)}')
-        for kw, actions in keywords.items():
-            if kw in awords:
-                for attrname, value in actions.items():
-                    if attrname in ['due']:
-                        v = getattr(activity, attrname)
-                        if v is not None:
-                            continue
-                    setattr(activity, attrname, value)
+    def _archive_history(self, archive_dir: pathlib.Path, activity):
+        """ Append retired history events to the activity's archive file. """
+        import ujson as json
+        spill = activity.history_spill
+        if not spill:
+            return
+        archive_dir.mkdir(exist_ok=True)
+        with open(archive_dir / f'{activity.id.hex}.jsonl', 'a', encoding='utf-8') as f:
+            for e in spill:
+                f.write(json.dumps(e.asdict(), ensure_ascii=False) + '\n')
+        del f
+        activity.clear_history_spill()
+
+    def _save_changed(self, where: pathlib.Path, backup_dir: pathlib.Path):
+        """
+        Rewrite only changed or deleted activities in the store they were loaded from. The
+        backup is added to rather than replaced: each file rewritten or deleted here replaces
+        its own entry there, so every activity file in the backup is the version from just
+        before it was last rewritten, by this save or an earlier one.
+        """
+        activity_dir = where / 'activities'
+        archive_dir = where / 'archive'
+        backup_activity_dir = backup_dir / 'activities'
+        backup_activity_dir.mkdir(parents=True, exist_ok=True)
+        for aid in self.stored.difference(self.activities.keys()):
+            path = activity_dir / f'{aid}.json'
+            if path.exists():
+                logger.info(f'moving deleted {path} to {backup_activity_dir}')
+                os.replace(path, backup_activity_dir / path.name)
+        written = 0
+        for aid, adata in self.activities.items():
+            if not adata.dirty:
+                continue
+            path = activity_dir / f'{aid}.json'
+            if path.exists():
+                os.replace(path, backup_activity_dir / path.name)
+            self._write_activity(activity_dir, archive_dir, adata)
+            written += 1
+        self.stored = set(self.activities.keys())
+        unchanged = len(self.activities) - written
+        return f'Wrote {written} JSON files at {where} ({unchanged} unchanged).'
+
+    def _write_activity(self, activity_dir: pathlib.Path, archive_dir: pathlib.Path, activity):
+        with open(activity_dir / f'{activity.id.hex}.json', 'wb') as f:
+            f.write(activity.asjson())
+        del f
+        self._archive_history(archive_dir, activity)
+        activity.mark_clean()
 
     def _contextualize(self, i, j=None):
         for context in [self.current, list(self.previous)]:
@@ -542,6 +1222,51 @@ class Manager:
         logger.debug(f'Results: i={i}, j={j}, other={repr(other)}')
         return (i, j, other)
 
+    def _date_bounds(self, idxname, argv):
+        """ Resolve a date filter argument to ISO date bounds (None means "no date"). """
+        if isinstance(argv, str):
+            val = argv
+            if val.lower() == 'none':
+                val = None
+        elif isinstance(argv, list):
+            if len(argv) > 1:
+                raise ValueError(
+                    f'Only 1 value is supported for filtering by {idxname}. Got {len(argv)} = {repr(argv)}.')
+            else:
+                val = argv[0]
+        else:
+            val = argv
+        if val is None:
+            return None
+        today = self._today()  # first, since a rollover forgets the bounds
+        try:
+            return self.bounds[val]
+        except KeyError:
+            pass
+        try:
+            quick = date.fromordinal(self.today_ordinal + relative_days[val]).isoformat()
+        except KeyError:
+            quick = quick_datestamp(val)
+        if quick is not None:
+            bounds = (quick, quick)
+        else:
+            start_dt, end_dt = self._traced(
+                f'comprehend_date {repr(val)}', None, None, comprehend_date, val, count=None)
+            start = iso_datestamp(start_dt)
+            try:
+                end = iso_datestamp(end_dt)
+            except TypeError:
+                end = start
+            bounds = (start, end)
+        self._remember_bounds(val, bounds)
+        return bounds
+
+    def _remember_bounds(self, key, bounds):
+        """ Keep resolved date bounds until the next rollover (or until there are too many). """
+        if len(self.bounds) >= BOUNDS_LIMIT:
+            self.bounds.clear()
+        self.bounds[key] = bounds
+
     def _filter_list(self, alist, idxname, argv, operator='and'):
         logger.debug(f'idxname: {idxname}')
         if argv == 'any':
@@ -552,7 +1277,9 @@ class Manager:
         if idxname == 'not_before':
             return self._filter_list_not_before(alist, argv)
         elif idxname == 'stalled':
-            blist = [a for a in alist if len(a.tasks) == 0]
+            from meek.views import is_true
+            stalled = is_true(argv)
+            blist = [a for a in alist if (len(a.tasks) == 0) == stalled]
             result = set(alist)
             if operator == 'and':
                 result = result.intersection(blist)
@@ -561,29 +1288,14 @@ class Manager:
             else:
                 raise ValueError(
                     f'operator={operator}. Expected "and" or "or".')
+            return list(result)
         elif idxname in ['due', 'overdue']:
             return self._filter_list_by_date(alist, idxname, argv)
         try:
             idx = self.indexes[idxname]
         except KeyError:
             raise NotImplementedError(idxname)
-        if argv is None:
-            filtervals = [argv, ]
-        elif isinstance(argv, str):
-            filtervals = [argv.lower(), ]
-        elif isinstance(argv, list):
-            filtervals = [val.lower() for val in argv]
-        elif isinstance(argv, bool):
-            filtervals = [argv, ]
-        else:
-            raise TypeError(f'argv: {type(argv)}={repr(argv)}')
-        filtervals = [(fv, None)[fv is None or fv == 'none']
-                      for fv in filtervals]
-        for fv in filtervals:
-            if isinstance(fv, str):
-                if fv == 'none':
-                    fv = None
-        logger.debug(f'filtervals: {repr(filtervals)}')
+        filtervals = self._filter_values(argv)
         result = set(alist)
         for fv in filtervals:
             try:
@@ -611,27 +1323,14 @@ class Manager:
                 idx = self.indexes['due']
             else:
                 raise NotImplementedError(idxname)
-        if isinstance(argv, str):
-            val = argv
-            if val.lower() == 'none':
-                val = None
-        elif isinstance(argv, list):
-            if len(argv) > 1:
-                raise ValueError(
-                    f'Only 1 value is supported for filtering by {idxname}. Got {len(argv)} = {repr(argv)}.')
-            else:
-                val = argv[0]
-        if val is None:
-            return [a for a in self.activities.values() if a.due is None]
-        if val == '':
-            val = 'today'
-        start_dt, end_dt = comprehend_date(val)
-        start = iso_datestamp(start_dt)
-        try:
-            end = iso_datestamp(end_dt)
-        except TypeError:
-            end = start
-        if idxname == 'due' and end == start:
+        bounds = self._date_bounds(idxname, argv)
+        if bounds is None:
+            return [a for a in alist if a.due is None]
+        start, end = bounds
+        bucket = self.date_buckets.lookup(None if idxname == 'overdue' else start, end)
+        if bucket is not None:
+            blist = bucket
+        elif idxname == 'due' and end == start:
             try:
                 blist = idx[start]
             except KeyError:
@@ -642,6 +1341,9 @@ class Manager:
         elif idxname == 'overdue':
             matches = [a for k, a in idx.items() if k <= end]
             blist = [item for sublist in matches for item in sublist]
+        if idxname == 'due':
+            # recurring activities are also due on their upcoming occurrences
+            blist = chain(blist, self.occurrences.between(start, end, self._today()))
         result = set(alist)
         try:
             result = result.intersection(blist)
@@ -651,19 +1353,15 @@ class Manager:
         return list(result)
 
     def _filter_list_not_before(self, alist, argv):
-        if isinstance(argv, str):
-            val = argv
-        elif isinstance(argv, list):
-            if len(argv) > 1:
-                raise ValueError(
-                    f'Only 1 value is supported for filtering by not_before. Got {len(argv)} = {repr(argv)}.')
-            else:
-                val = argv[0]
-        if val == '':
-            val = 'today'
+        now = time()
+        start, epoch = self._not_before_bound(argv)
+        if epoch >= now:
+            # nothing visible when indexed can be hidden now, so only the hidden need checking
+            hidden = [a for a, e in self.hidden.items() if e > epoch]
+            if not hidden:
+                return list(alist)
+            return list(set(alist).difference(hidden))
         idx = self.indexes['not_before']
-        start_dt, end_dt = comprehend_date(val)
-        start = start_dt.iso8601()
         logger.debug(f'start: {start}')
         matches = []
         for k, a in idx.items():
@@ -677,28 +1375,99 @@ class Manager:
         result = result.intersection(blist)
         return list(result)
 
+    def _filter_values(self, argv):
+        """ Normalize a filter argument to a list of index keys. """
+        if argv is None:
+            filtervals = [argv, ]
+        elif isinstance(argv, str):
+            filtervals = [argv.lower(), ]
+        elif isinstance(argv, list):
+            filtervals = [val.lower() for val in argv]
+        elif isinstance(argv, bool):
+            filtervals = [argv, ]
+        else:
+            raise TypeError(f'argv: {type(argv)}={repr(argv)}')
+        filtervals = [(fv, None)[fv is None or fv == 'none']
+                      for fv in filtervals]
+        logger.debug(f'filtervals: {repr(filtervals)}')
+        return filtervals
+
     def _filter_list_title(self, alist, filtervals):
         result = set(alist)
         for fv in filtervals:
             result = result.intersection(self.indexes['title'][fv])
         return list(result)
 
-    def _format_list(self, alist, attributes=['title', 'due'], sort=['due', 'title']):
-        if isinstance(sort, list):
-            if sort:
-                for sk in sort:
-                    if sk not in attributes:
-                        raise ValueError(
-                            f'sort key "{sk}" not in attributes ({attributes})')
-                alist.sort(key=lambda a: [getattr(a, sk)
-                           for sk in sort if getattr(a, sk) is not None])
-        elif sort is None:
+    def _mask(self, idxname, argv):
+        """ Build a columnar mask for one predicate, or None if it needs the dict indexes. """
+        store = self.store
+        if argv == 'any':
+            return store.mask_all()
+        if idxname == 'not_before':
+            return store.mask_not_before(self._not_before_bound(argv)[1])
+        elif idxname in ['due', 'overdue']:
+            bounds = self._date_bounds(idxname, argv)
+            if bounds is None:
+                return store.mask_due_none()
+            start, end = bounds
+            if idxname == 'due':
+                mask = store.mask_due(day_ordinal(start), day_ordinal(end))
+                upcoming = self.occurrences.between(start, end, self._today())
+                if upcoming:
+                    mask |= store.mask_of(upcoming)
+                return mask
+            return store.mask_overdue(day_ordinal(end))
+        elif idxname in ['complete', 'project', 'interval', 'tags']:
+            mask = store.mask_all()
+            for fv in self._filter_values(argv):
+                if idxname == 'interval':
+                    mask &= store.mask_interval(fv)
+                elif idxname == 'tags':
+                    mask &= store.mask_tag(fv)
+                else:
+                    mask &= store.mask_bool(idxname, fv)
+            return mask
+        return None
+
+    def _not_before_bound(self, argv):
+        """ Resolve a not_before filter argument to the latest visible time (ISO 8601, epoch). """
+        if isinstance(argv, str):
+            val = argv
+        elif isinstance(argv, list):
+            if len(argv) > 1:
+                raise ValueError(
+                    f'Only 1 value is supported for filtering by not_before. Got {len(argv)} = {repr(argv)}.')
+            else:
+                val = argv[0]
+        try:
+            days = relative_days[val]
+        except KeyError:
             pass
         else:
-            raise TypeError(f'sort: {type(sort)} = {repr(sort)}')
+            # "today" is the current moment, "tomorrow" the same time a day later, as in maya
+            when = time() + days * 86400
+            return (iso8601(when), when)
+        self._today()  # a rollover forgets the bounds
+        key = ('not_before', val)
+        try:
+            return self.bounds[key]
+        except KeyError:
+            pass
+        start_dt, end_dt = self._traced(
+            f'comprehend_date {repr(val)}', None, None, comprehend_date, val, count=None)
+        bound = (start_dt.iso8601(), start_dt.epoch)
+        if quick_datestamp(val) is not None:
+            # only dates are fixed; phrases like "in 3 days" move with the clock
+            self._remember_bounds(key, bound)
+        return bound
+
+    def _format_list(self, alist, attributes=['title', 'due'], sort=['due', 'title']):
+        self._sort_list(alist, sort)
+        return list(self._format_rows(alist, attributes))
 
-        out_list = list()
-        for i, a in enumerate(alist):
+    def _format_rows(self, alist, attributes=['title', 'due'], start=0):
+        """ Format one numbered row per activity, lazily, numbering from start. """
+        for i, a in enumerate(alist[start:], start=start):
             serial = f'{i}:'
             if a.project:
                 serial += f' 🧩'
@@ -716,16 +1485,280 @@ class Manager:
                         serial += f' title:"{attrval}"'
                 else:
                     serial += f' {attrname}:{attrval}'
-            out_list.append(serial)
-        return out_list
+            yield serial
+
+    def _paginate(self, kwargs):
+        """ Remove limit/offset/page from kwargs and return (offset, limit); limit None is all. """
+        values = dict()
+        for k in ['limit', 'offset', 'page']:
+            try:
+                v = kwargs.pop(k)
+            except KeyError:
+                continue
+            try:
+                values[k] = int(v)
+            except (TypeError, ValueError):
+                raise UsageError(f'{k} must be a whole number, not {repr(v)}.')
+            if values[k] < 0 or (k != 'offset' and values[k] == 0):
+                raise UsageError(f'{k} must be positive, not {values[k]}.')
+        try:
+            limit = values['limit']
+        except KeyError:
+            limit = None
+        try:
+            page = values['page']
+        except KeyError:
+            try:
+                offset = values['offset']
+            except KeyError:
+                offset = 0
+        else:
+            if limit is None:
+                limit = PAGE_SIZE
+            offset = (page - 1) * limit
+        if offset and limit is None:
+            raise UsageError('offset requires limit.')
+        return (offset, limit)
+
+    def _present_list(self, alist, kwargs, offset=0, limit=None):
+        """
+        Order a filtered list, keep the first offset+limit as the numbered context,
+        and return the rows from offset on (a generator of rows if self.stream).
+        """
+        try:
+            sortkeys = kwargs['sort']
+        except KeyError:
+            sortkeys = ['due', 'title']
+        else:
+            if isinstance(sortkeys, str):
+                sortkeys = [sortkeys, ]
+        total = len(alist)
+        with self.metrics.time('manager.sort'):
+            if limit is None:
+                self._sort_list(alist, sortkeys)
+            else:
+                alist = self._sort_list(alist, sortkeys, offset + limit)
+        self.current = alist
+        rows = self._format_rows(alist, start=offset)
+        if limit is not None and offset + limit < total:
+            page = offset // limit + 2
+            footer = (
+                f'({offset}-{offset + limit - 1} of {total} shown; '
+                f'more with offset:{offset + limit} limit:{limit} or page:{page})')
+            rows = chain(rows, [footer])
+        if self.stream:
+            return rows
+        with self.metrics.time('manager.format'):
+            return '\n'.join(rows)
+
+    def _sort_list(self, alist, sort, n=None):
+        """
+        Sort alist in place using the precomputed sort keys; "-field" sorts descending and
+        missing values always come last. With n, return only the first n, selected with a
+        heap where possible.
+        """
+        if sort is None or not sort:
+            return alist[0:n]
+        if not isinstance(sort, list):
+            raise TypeError(f'sort: {type(sort)} = {repr(sort)}')
+        fields = list()
+        for sk in sort:
+            descending = sk.startswith('-')
+            field = sk.lstrip('-')
+            try:
+                fields.append((SORT_POSITIONS[field], descending))
+            except KeyError:
+                raise UsageError(
+                    f'Cannot sort by "{field}". Supported sort fields: {", ".join(SORT_FIELDS)}.')
+        keys = self.sort_keys
+        if not any(descending for pos, descending in fields):
+            positions = [pos for pos, descending in fields]
+            if positions == list(range(len(positions))):
+                # a prefix of the stored tuple: compare it whole (later fields break ties)
+                key = keys.__getitem__
+            else:
+                getter = itemgetter(*positions)
+
+                def key(a):
+                    return getter(keys[a])
+            if n is None:
+                alist.sort(key=key)
+                return alist
+            return heapq.nsmallest(n, alist, key=key)
+        # mixed directions: break ties by the whole stored tuple, then make stable
+        # passes from the least significant field
+        alist.sort(key=keys.__getitem__)
+        for pos, descending in reversed(fields):
+            if descending:
+                # (present, value) reversed keeps missing values last
+                alist.sort(key=lambda a: (1 - keys[a][pos][0], keys[a][pos][1]), reverse=True)
+            else:
+                alist.sort(key=lambda a: keys[a][pos])
+        return alist[0:n]
 
+    @timed('manager.filter')
     def _get_list(self, **kwargs):
+        """ Filter activities, answering repeated queries from the query cache. """
+        if kwargs:
+            or_list, not_before_today = self._normalize_list_kwargs(kwargs)
+        else:
+            or_list, not_before_today = list(), True
+        key = self._query_key(kwargs, not_before_today)
+        blist = self.query_cache.get(key, self.generations)
+        if blist is not None:
+            return blist
+        blist = self._run_query(kwargs, or_list, not_before_today)
+        depends_on, expires = self._query_dependencies(kwargs, not_before_today)
+        self.query_cache.put(key, depends_on, self.generations, blist, expires)
+        return blist
+
+    def _query_key(self, kwargs, not_before_today):
+        """ Key the query cache on normalized kwargs and the day (relative dates move). """
+        from meek.cache import freeze
+        return (
+            self._today(), not_before_today,
+            tuple(sorted((k, freeze(v)) for k, v in kwargs.items() if k != 'sort')))
+
+    def _query_dependencies(self, kwargs, not_before_today):
+        """ Name the generations a query's result depends on, and when it expires regardless. """
+        depends_on = {'activities'}  # matches on missing values (e.g., no not_before) do
+        expires = inf
+        nb = None
+        if not_before_today:
+            nb = 'today'
+        for k, argv in kwargs.items():
+            if k in ['sort', 'or']:
+                continue
+            elif k == 'stalled':
+                depends_on.add('all')  # depends on tasks, which are not indexed
+            elif k == 'overdue':
+                depends_on.add('due')
+            elif k == 'due':
+                # upcoming occurrences depend on the rule and stop once complete
+                depends_on.update(['due', 'interval', 'complete'])
+            elif k == 'not_before':
+                nb = argv
+            elif k in self.generations:
+                depends_on.add(k)
+            else:
+                depends_on.add('all')
+        if nb is not None:
+            # hidden activities surface as time passes, not just when something changes
+            depends_on.add('not_before')
+            start = self._not_before_bound(nb)[0]
+            later = [k for k in self.indexes['not_before'].keys() if k > start]
+            if later:
+                expires = min([not_before_epoch(k) for k in later])
+        return (sorted(depends_on), expires)
+
+    def _run_query(self, kwargs, or_list, not_before_today):
         alist = list(self.activities.values())
         blist = copy(alist)
         logger.debug(f'_get_list:kwargs\n{pformat(kwargs, indent=4)}')
         logger.debug(f'_get_list:len(blist): {len(blist)}')
-        if not kwargs:
-            return self._filter_list_not_before(blist, 'today')
+        if self.store is not None:
+            return self._get_list_masked(kwargs, or_list, not_before_today)
+        if not_before_today:
+            blist = self._traced(
+                "not_before='today'", ('not_before', 'today'), len(blist),
+                self._filter_list_not_before, blist, 'today')
+        logger.debug(f'_get_list:len(blist) after filter not before: {len(blist)}')
+        for k, argv in kwargs.items():
+            if k in ['sort', 'or'] or k in or_list:
+                continue
+            logger.debug(f'filtering with k={k} and argv={argv}')
+            blist = self._traced(
+                f'{k}={repr(argv)}', (k, argv), len(blist), self._filter_list, blist, k, argv)
+            logger.debug(f'_get_list:blist after filtration: {pformat(blist, indent=4)}')
+
+        if or_list:
+            or_activities = dict()
+            or_activities_set = set()
+            for k in or_list:
+                or_activities[k] = self._traced(
+                    f'or {k}={repr(kwargs[k])}', (k, kwargs[k]), len(alist),
+                    self._filter_list, alist, k, kwargs[k])  # sic
+                or_activities_set = or_activities_set.union(or_activities[k])
+            blist = self._traced(
+                'or: intersect', None, len(blist),
+                lambda: list(or_activities_set.intersection(blist)))
+        return blist
+
+    def _traced(self, step, index, n_in, func, *args, count=len):
+        """
+        Return func(*args). While tracing, also record the step, the index it uses (from
+        index, an (idxname, argv) pair), rows in and out (count(result)), and its duration.
+        """
+        trace = self.trace
+        if trace is None:
+            return func(*args)
+        record = {'step': step, 'index': None, 'in': n_in, 'out': None, 'depth': self.trace_depth}
+        if index is not None:
+            record['index'] = self._index_plan(*index)
+        trace.append(record)
+        self.trace_depth += 1
+        start = perf_counter()
+        try:
+            result = func(*args)
+        finally:
+            record['seconds'] = perf_counter() - start
+            self.trace_depth -= 1
+        if count is not None:
+            record['out'] = count(result)
+        return result
+
+    def _index_plan(self, idxname, argv):
+        """ Describe how a filter finds its matches (for explain). """
+        if argv == 'any':
+            return 'none (matches all)'
+        if self.store is not None and idxname in MASKED:
+            return f'{idxname} column mask'
+        if idxname == 'not_before':
+            if argv in ['', 'today', ['today']]:
+                return 'hidden set'
+            return 'hidden set, or not_before key range scan + unset scan for past bounds'
+        elif idxname == 'stalled':
+            return 'none (scans tasks)'
+        elif idxname in ['due', 'overdue']:
+            if argv is None or (isinstance(argv, str) and argv.lower() == 'none'):
+                return 'none (scans for unset due)'
+            val = argv[0] if isinstance(argv, list) else argv
+            quick = quick_datestamp(val or 'today')
+            if idxname == 'overdue':
+                if quick is not None and quick == self.today:
+                    return 'overdue bucket'
+                return 'due key range scan'
+            if quick is not None:
+                return 'due key lookup + occurrence index'
+            bounds = self.bounds.get(val)
+            if bounds is not None and self.date_buckets.lookup(*bounds) is not None:
+                return 'due bucket + occurrence index'
+            return 'due key range scan + occurrence index'
+        elif idxname not in self.indexes:
+            return 'unsupported'
+        if None in self._filter_values(argv):
+            return f'{idxname} key lookup + unset scan'
+        return f'{idxname} key lookup'
+
+    def _current_kwargs(self, kwargs):
+        """ Apply the defaults of the "current" listing to kwargs. """
+        try:
+            kwargs['overdue']
+        except KeyError:
+            try:
+                kwargs['due']
+            except KeyError:
+                kwargs['overdue'] = 'this week'
+        try:
+            kwargs['interval']
+        except KeyError:
+            kwargs['interval'] = None
+        kwargs['tags'] = 'active'
+        kwargs['complete'] = False
+        kwargs['or'] = ['overdue', 'tags']
+
+    def _normalize_list_kwargs(self, kwargs):
+        """ Apply listing defaults to kwargs in place; return (or_list, not_before_today). """
         try:
             c = kwargs['complete']
         except KeyError:
@@ -748,78 +1781,168 @@ class Manager:
                 raise TypeError(
                     f'Unexpected type for "complete": {type(c)} = "{repr(c)}".'
                 )
+        not_before_today = False
         try:
             nb = kwargs['not_before']
         except KeyError:
-            blist = self._filter_list_not_before(blist, 'today')
+            not_before_today = True
         else:
             if nb in ['any', 'all']:
                 kwargs.pop('not_before')
-        logger.debug(f'_get_list:len(blist) after filter not before: {len(blist)}')
 
         try:
             or_list = kwargs['or']
         except KeyError:
             or_list = list()
+        return (or_list, not_before_today)
+
+    def _get_list_masked(self, kwargs, or_list, not_before_today):
+        """ Evaluate _get_list predicates as NumPy masks over the columnar store. """
+        store = self.store
+        mask = store.mask_all()
+        if not_before_today:
+            mask &= self._traced(
+                "not_before='today'", ('not_before', 'today'), None, self._mask, 'not_before',
+                'today', count=store.count)
+        deferred = list()
         for k, argv in kwargs.items():
             if k in ['sort', 'or'] or k in or_list:
                 continue
-            logger.debug(f'filtering with k={k} and argv={argv}')
-            blist = self._filter_list(blist, k, argv)
-            logger.debug(f'_get_list:blist after filtration: {pformat(blist, indent=4)}')
-
+            if k in MASKED:
+                m = self._traced(
+                    f'{k}={repr(argv)}', (k, argv), None, self._mask, k, argv, count=store.count)
+            else:
+                m = self._mask(k, argv)
+            if m is None:
+                deferred.append((k, argv))
+            else:
+                mask &= m
         if or_list:
-            or_activities = dict()
-            or_activities_set = set()
+            or_mask = store.mask_none()
             for k in or_list:
-                or_activities[k] = self._filter_list(
-                    alist, k, kwargs[k])  # sic
-                or_activities_set = or_activities_set.union(or_activities[k])
-            blist = list(or_activities_set.intersection(blist))
+                step = f'or {k}={repr(kwargs[k])}'
+                m = None
+                if k in MASKED:
+                    m = self._traced(step, (k, kwargs[k]), None, self._mask, k, kwargs[k], count=store.count)
+                if m is None:
+                    m = store.mask_of(self._traced(
+                        step, (k, kwargs[k]), len(self.activities), self._filter_list,
+                        list(self.activities.values()), k, kwargs[k]))
+                or_mask |= m
+            mask &= or_mask
+        blist = self._traced('select', None, None, store.select, mask)
+        # predicates over words, titles, etc. still use the dict indexes
+        for k, argv in deferred:
+            blist = self._traced(
+                f'{k}={repr(argv)}', (k, argv), len(blist), self._filter_list, blist, k, argv)
         return blist
 
+    @timed('manager.index')
     def _index_activity(self, activity):
+        generations = self.generations
         try:
             self.reverse_index[activity.id]
         except KeyError:
             self.reverse_index[activity.id] = {}
+            generations['activities'] += 1
         finally:
             ridx = self.reverse_index[activity.id]
+        previous = dict(ridx)  # the key lists are replaced below, not mutated
         for idxk, idx in self.indexes.items():
-            try:
-                ridx[idxk]
-            except KeyError:
-                ridx[idxk] = list()
-            else:
-                for val in ridx[idxk]:
-                    idx[val].remove(activity)
-                    if len(idx[val]) == 0:
-                        idx.pop(val)
-                ridx[idxk] = list()
-            finally:
-                ridx_sub = ridx[idxk]
             try:
                 v = getattr(activity, idxk)
             except AttributeError:
                 logger.error(f'indexable attribute not found: {idxk}')
+                v = None
+            if v is None:
+                vals = []
+            elif isinstance(v, str):
+                vals = [v.lower(), ]
+            elif isinstance(v, (list, set)):
+                vals = list(dict.fromkeys([val.lower() for val in v]))
+            elif isinstance(v, bool):
+                vals = [v, ]
+            elif is_mayadt(v):
+                vals = [v.iso8601(), ]
             else:
-                if v is None:
+                raise TypeError(f'v: {type(v)}={repr(v)}')
+            try:
+                old = ridx[idxk]
+            except KeyError:
+                old = list()
+            ridx[idxk] = vals
+            if old == vals:
+                continue
+            # only the keys that changed, so the activity is not sought in long lists for nothing
+            for val in old:
+                if val not in vals:
+                    idx[val].remove(activity)
+                    if len(idx[val]) == 0:
+                        self._drop_key(idxk, val)
+            for v in vals:
+                if v in old:
                     continue
-                elif isinstance(v, str):
-                    vals = [v.lower(), ]
-                elif isinstance(v, (list, set)):
-                    vals = [val.lower() for val in v]
-                elif isinstance(v, bool):
-                    vals = [v, ]
-                elif isinstance(v, maya.MayaDT):
-                    vals = [v.iso8601(), ]
-                else:
-                    raise TypeError(f'v: {type(v)}={repr(v)}')
-                for v in vals:
+                try:
+                    idx[v]
+                except KeyError:
+                    idx[v] = list()
                     try:
-                        idx[v]
+                        self.completions[idxk].add(v)
                     except KeyError:
-                        idx[v] = list()
-                    finally:
-                        idx[v].append(activity)
-                        ridx_sub.append(v)
+                        pass
+                finally:
+                    idx[v].append(activity)
+        for idxk in self.indexes.keys():
+            try:
+                changed = previous[idxk] != ridx[idxk]
+            except KeyError:
+                changed = len(ridx[idxk]) > 0
+            if changed:
+                generations[idxk] += 1
+        generations['all'] += 1
+        self.sort_keys[activity] = sort_key(activity)
+        if self.store is not None:
+            self.store.update(activity)
+        self.occurrences.update(activity)
+        self.date_buckets.update(activity)
+        epoch = not_before_epoch(activity.not_before)
+        if epoch > time():
+            self.hidden[activity] = epoch
+        else:
+            self.hidden.pop(activity, None)
+        if self.reminders is not None:
+            self.reminders.update(activity)
+        self.views.update(activity)
+
+    def _unindex_activity(self, activity):
+        try:
+            ridx = self.reverse_index.pop(activity.id)
+        except KeyError:
+            return
+        self.sort_keys.pop(activity)
+        self.views.discard(activity)
+        self.occurrences.discard(activity)
+        self.date_buckets.discard(activity)
+        self.hidden.pop(activity, None)
+        if self.reminders is not None:
+            self.reminders.discard(activity)
+        self.generations['activities'] += 1
+        self.generations['all'] += 1
+        for idxk, vals in ridx.items():
+            if vals:
+                self.generations[idxk] += 1
+            idx = self.indexes[idxk]
+            for val in vals:
+                idx[val].remove(activity)
+                if len(idx[val]) == 0:
+                    self._drop_key(idxk, val)
+        if self.store is not None:
+            self.store.remove(activity)
+
+    def _drop_key(self, idxk, val):
+        """Remove an emptied key from an index (and from its completions)."""
+        self.indexes[idxk].pop(val)
+        try:
+            self.completions[idxk].discard(val)
+        except KeyError:
+            pass
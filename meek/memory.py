@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Approximate memory accounting for a Manager, sampling where stores are large
+"""
+
+from collections import deque
+import heapq
+from meek.activity import Activity
+from meek.dates import is_mayadt
+import random
+from sys import getsizeof
+from types import BuiltinFunctionType, FunctionType, MethodType, ModuleType
+
+SAMPLE = 1000  # items measured per structure; larger structures are scaled up
+TOP = 10
+ATOMS = (str, bytes, int, float, complex, bool, type(None))
+SKIP = (type, ModuleType, FunctionType, BuiltinFunctionType, MethodType)
+
+
+def deep_sizeof(obj, seen: set = None, stop: tuple = (Activity,)) -> int:
+    """
+    Approximate the bytes reachable from obj, counting each object once (per seen set).
+    Instances of stop are references owned elsewhere, so they are not counted or entered.
+    """
+    if seen is None:
+        seen = set()
+    size = 0
+    stack = [obj]
+    while stack:
+        o = stack.pop()
+        i = id(o)
+        if i in seen:
+            continue
+        seen.add(i)
+        if isinstance(o, stop) or isinstance(o, SKIP):
+            continue
+        size += getsizeof(o)
+        if isinstance(o, ATOMS):
+            continue
+        if isinstance(o, dict):
+            stack.extend(o.keys())
+            stack.extend(o.values())
+        elif isinstance(o, (list, tuple, set, frozenset, deque)):
+            stack.extend(o)
+        else:
+            try:
+                stack.append(vars(o))
+            except TypeError:
+                pass
+            for cls in type(o).__mro__:
+                slots = cls.__dict__.get('__slots__', ())
+                if isinstance(slots, str):
+                    slots = (slots, )
+                for slot in slots:
+                    try:
+                        stack.append(getattr(o, slot))
+                    except AttributeError:
+                        pass
+    return size
+
+
+def sample_of(items: list, k: int, seed: int = 0) -> list:
+    if len(items) <= k:
+        return items
+    return random.Random(seed).sample(items, k)
+
+
+def mapping_sizeof(mapping: dict, k: int = SAMPLE, stop: tuple = (Activity,)) -> int:
+    """ Deep size of a dict, estimated from k sampled items when it has more than that. """
+    if len(mapping) <= k:
+        return deep_sizeof(mapping, stop=stop)
+    keys = sample_of(list(mapping.keys()), k)
+    seen = set()
+    items = sum([deep_sizeof(key, seen, stop) + deep_sizeof(mapping[key], seen, stop) for key in keys])
+    return getsizeof(mapping) + items * len(mapping) // k
+
+
+def history_length(activity) -> int:
+    """ Events held in memory: the hot ring plus those awaiting the archive. """
+    return len(activity._history or ()) + len(activity._history_spill or ())
+
+
+class Footprint:
+    """ Sizes of a Manager's structures, in bytes, with history and the heaviest activities. """
+
+    def __init__(self, manager, sample: int = SAMPLE, top: int = TOP):
+        self.n = len(manager.activities)
+        self.sample = min(sample, self.n)
+        self.sizes = dict()
+        self._measure_activities(manager, sample)
+        for idxname, idx in manager.indexes.items():
+            self.sizes[f'indexes.{idxname}'] = mapping_sizeof(idx, sample)
+        self.sizes['reverse_index'] = mapping_sizeof(manager.reverse_index, sample)
+        self.sizes['sort_keys'] = mapping_sizeof(manager.sort_keys, sample)
+        self.sizes['previous'] = deep_sizeof(manager.previous)
+        stop = (Activity, type(manager))
+        self.sizes['views'] = deep_sizeof(manager.views.views, stop=stop)
+        self.sizes['query_cache'] = deep_sizeof(manager.query_cache.entries, stop=stop)
+        self.sizes['completions'] = deep_sizeof(manager.completions, stop=stop)
+        if manager.store is not None:
+            self.sizes['columnar'] = deep_sizeof(manager.store, stop=stop)
+        self.top = [
+            (history_length(a), deep_sizeof([a._history, a._history_spill]), a)
+            for a in heapq.nlargest(top, manager.activities.values(), key=history_length)]
+
+    def _measure_activities(self, manager, sample):
+        """
+        Split the activities' size into history, serialization caches, MayaDT values and
+        the rest, measuring a sample in that order so that each part is counted once.
+        """
+        activities = list(manager.activities.values())
+        chosen = sample_of(activities, sample)
+        seen = set()
+        parts = {'history': 0, 'caches': 0, 'mayadt': 0, 'core': 0}
+        for a in chosen:
+            for v in (a._history, a._history_spill, a._history_summary):
+                parts['history'] += deep_sizeof(v, seen)
+            for v in (a._cache, a._cache_json):
+                parts['caches'] += deep_sizeof(v, seen)
+            for v in (a._due, a._not_before):
+                if is_mayadt(v):
+                    parts['mayadt'] += deep_sizeof(v, seen)
+            parts['core'] += deep_sizeof(a, seen, stop=())
+        scale = len(activities) / len(chosen) if chosen else 0
+        keys = list(manager.activities.keys())
+        self.sizes['activities'] = int(
+            getsizeof(manager.activities) + deep_sizeof(sample_of(keys, sample)) * scale
+            + sum(parts.values()) * scale)
+        for k, v in parts.items():
+            self.sizes[f'activities.{k}'] = int(v * scale)
+        self.events = sum([history_length(a) for a in activities])
+        self.mayadts = sum([is_mayadt(a._due) + is_mayadt(a._not_before) for a in activities])
+
+    @property
+    def total(self) -> int:
+        return sum([v for k, v in self.sizes.items() if '.' not in k or k.startswith('indexes.')])
+
+    def report(self) -> str:
+        n = self.n
+        lines = [
+            f'memory: approximate deep sizes of {n} activities '
+            f'(sampled {self.sample} per structure; shared objects count toward each)']
+        width = max([len(k) for k in self.sizes.keys()] + [len('total')])
+        lines.append(f'{"structure":<{width}}  {"size":>10}  {"per activity":>12}')
+        rows = list(self.sizes.items()) + [('total', self.total)]
+        for k, v in rows:
+            name = k
+            if k.startswith('activities.'):
+                name = '  ' + k.split('.', 1)[1]
+            per = format_bytes(v / n) if n else '-'
+            lines.append(f'{name:<{width}}  {format_bytes(v):>10}  {per:>12}')
+        lines.append(f'history events in memory: {self.events}; MayaDT values: {self.mayadts}')
+        if self.top and self.top[0][0] > 0:
+            lines.append(f'largest histories:')
+            for events, size, a in self.top:
+                if events == 0:
+                    break
+                lines.append(f'{events:>6} events  {format_bytes(size):>10}  {a.title}')
+        return '\n'.join(lines)
+
+
+def format_bytes(n: float) -> str:
+    for unit in ['B', 'KiB', 'MiB']:
+        if abs(n) < 1024:
+            if unit == 'B':
+                return f'{n:.0f} {unit}'
+            return f'{n:.1f} {unit}'
+        n /= 1024
+    return f'{n:.1f} GiB'
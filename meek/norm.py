@@ -4,8 +4,8 @@
 Text normalization
 """
 
-from textnorm import normalize_space, normalize_unicode
-
 
 def norm(s: str) -> str:
+    # textnorm is imported on first use to keep startup fast
+    from textnorm import normalize_space, normalize_unicode
     return normalize_space(normalize_unicode(s))
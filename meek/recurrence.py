@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recurrence rules (an RRULE subset) and a sliding index of upcoming occurrences
+"""
+
+from calendar import monthrange
+from datetime import date, timedelta
+from functools import lru_cache
+from itertools import islice
+import logging
+import re
+import threading
+
+logger = logging.getLogger(__name__)
+FREQUENCIES = ['DAILY', 'WEEKLY', 'MONTHLY', 'YEARLY']
+WEEKDAYS = ['MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU']
+# the named intervals an Activity has always accepted, as rules
+NAMED = {
+    'day': 'FREQ=DAILY',
+    'workday': 'FREQ=DAILY;BYDAY=MO,TU,WE,TH,FR',
+    'week': 'FREQ=WEEKLY',
+    'biweekly': 'FREQ=WEEKLY;INTERVAL=2',
+    'month': 'FREQ=MONTHLY',
+    'quarter': 'FREQ=MONTHLY;INTERVAL=3',
+    'year': 'FREQ=YEARLY'
+}
+HORIZON = 92  # days of upcoming occurrences to index ahead of today
+EMPTY_LIMIT = 1000  # periods without an occurrence before a rule is given up on
+rx_byday = re.compile(r'^(?P<n>[+-]?\d{1,2})?(?P<weekday>MO|TU|WE|TH|FR|SA|SU)$')
+
+
+def add_months(d: date, months: int) -> date:
+    """ Move d by whole months, keeping its day where the month allows (else its last day). """
+    m = d.month - 1 + months
+    year = d.year + m // 12
+    month = m % 12 + 1
+    return date(year, month, min(d.day, monthrange(year, month)[1]))
+
+
+class Rule:
+    """ A recurrence rule: FREQ, INTERVAL, BYMONTH, BYMONTHDAY, BYDAY and BYSETPOS. """
+
+    __slots__ = ('freq', 'interval', 'bymonth', 'bymonthday', 'byday', 'bysetpos', 'text')
+
+    def __init__(self, text: str):
+        self.freq = None
+        self.interval = 1
+        self.bymonth = ()
+        self.bymonthday = ()
+        self.byday = ()  # (ordinal or 0, weekday number) pairs
+        self.bysetpos = ()
+        for part in text.upper().strip().rstrip(';').split(';'):
+            try:
+                k, v = part.split('=')
+            except ValueError:
+                raise ValueError(f'Expected KEY=VALUE, not {repr(part)}.')
+            if k == 'FREQ':
+                if v not in FREQUENCIES:
+                    raise ValueError(f'Unsupported FREQ {repr(v)}. Expected one of {", ".join(FREQUENCIES)}.')
+                self.freq = v
+            elif k == 'INTERVAL':
+                self.interval = self._integers(k, v, 1, 1000)[0]
+            elif k == 'BYMONTH':
+                self.bymonth = self._integers(k, v, 1, 12)
+            elif k == 'BYMONTHDAY':
+                self.bymonthday = self._integers(k, v, 1, 31, signed=True)
+            elif k == 'BYSETPOS':
+                self.bysetpos = self._integers(k, v, 1, 366, signed=True)
+            elif k == 'BYDAY':
+                byday = list()
+                for d in v.split(','):
+                    m = rx_byday.match(d)
+                    if m is None:
+                        raise ValueError(f'Unexpected BYDAY value {repr(d)}.')
+                    n = int(m.group('n') or 0)
+                    if abs(n) > 53:
+                        raise ValueError(f'BYDAY ordinal out of range: {repr(d)}.')
+                    byday.append((n, WEEKDAYS.index(m.group('weekday'))))
+                self.byday = tuple(byday)
+            else:
+                raise ValueError(f'Unsupported rule part {repr(k)}.')
+        if self.freq is None:
+            raise ValueError('A rule needs a FREQ.')
+        if self.freq in ['DAILY', 'WEEKLY'] and any(n for n, wd in self.byday):
+            raise ValueError('BYDAY ordinals (e.g., "2TU") need FREQ=MONTHLY or FREQ=YEARLY.')
+        if self.freq == 'YEARLY' and not self.bymonth and any(n for n, wd in self.byday):
+            raise ValueError('Yearly BYDAY ordinals count within months, so they need BYMONTH.')
+        self.text = self._canonical()
+
+    @staticmethod
+    def _integers(k, v, low, high, signed=False):
+        try:
+            values = tuple(int(i) for i in v.split(','))
+        except ValueError:
+            raise ValueError(f'Expected integers for {k}, not {repr(v)}.')
+        for i in values:
+            if not (low <= abs(i) <= high) or (i < 0 and not signed):
+                raise ValueError(f'{k} value {i} is out of range.')
+        return values
+
+    def _canonical(self):
+        parts = [f'FREQ={self.freq}']
+        if self.interval != 1:
+            parts.append(f'INTERVAL={self.interval}')
+        for k in ['bymonth', 'bymonthday', 'bysetpos']:
+            values = getattr(self, k)
+            if values:
+                parts.append(f'{k.upper()}={",".join([str(i) for i in values])}')
+        if self.byday:
+            days = [f'{n or ""}{WEEKDAYS[wd]}' for n, wd in self.byday]
+            parts.append(f'BYDAY={",".join(days)}')
+        return ';'.join(parts)
+
+    def __repr__(self):
+        return f'Rule("{self.text}")'
+
+    @property
+    def simple(self) -> bool:
+        """ True if every occurrence is a whole number of steps from the anchor. """
+        return not (self.bymonth or self.bymonthday or self.byday or self.bysetpos)
+
+    def occurrences(self, anchor: date):
+        """ Generate the rule's dates on or after anchor, in order, with anchor as DTSTART. """
+        if self.simple:
+            k = 0
+            while True:
+                yield self._step(anchor, k * self.interval)
+                k += 1
+        empty = 0
+        period = 0
+        while empty < EMPTY_LIMIT:
+            found = False
+            for d in self._expand(anchor, period * self.interval):
+                if d >= anchor:
+                    found = True
+                    yield d
+            empty = 0 if found else empty + 1
+            period += 1
+        logger.warning(f'{self.text}: no occurrences in {EMPTY_LIMIT} periods; giving up')
+
+    def after(self, when: date, anchor: date = None) -> date:
+        """ The first occurrence strictly after when (None if the rule has none). """
+        if anchor is None:
+            anchor = when
+        for d in self.occurrences(anchor):
+            if d > when:
+                return d
+        return None
+
+    def _step(self, anchor: date, n: int) -> date:
+        if self.freq == 'DAILY':
+            return anchor + timedelta(days=n)
+        elif self.freq == 'WEEKLY':
+            return anchor + timedelta(weeks=n)
+        elif self.freq == 'MONTHLY':
+            return add_months(anchor, n)
+        return add_months(anchor, 12 * n)
+
+    def _expand(self, anchor: date, n: int) -> list:
+        """ The rule's dates in the nth period counting from the anchor's, sorted. """
+        if self.freq == 'DAILY':
+            days = [anchor + timedelta(days=n)]
+        elif self.freq == 'WEEKLY':
+            monday = anchor - timedelta(days=anchor.weekday()) + timedelta(weeks=n)
+            if self.byday:
+                days = [monday + timedelta(days=wd) for wd in sorted(set(wd for _, wd in self.byday))]
+            else:
+                days = [monday + timedelta(days=anchor.weekday())]
+        elif self.freq == 'MONTHLY':
+            first = add_months(anchor.replace(day=1), n)
+            days = self._month(first.year, first.month, anchor)
+        else:
+            year = anchor.year + n
+            months = self.bymonth
+            if not months:
+                months = range(1, 13) if self.bymonthday or self.byday else (anchor.month, )
+            days = list()
+            for month in months:
+                days.extend(self._month(year, month, anchor))
+        if self.bymonth:
+            days = [d for d in days if d.month in self.bymonth]
+        if self.freq in ['DAILY', 'WEEKLY']:
+            if self.byday:
+                weekdays = set(wd for _, wd in self.byday)
+                days = [d for d in days if d.weekday() in weekdays]
+            if self.bymonthday:
+                days = [d for d in days if self._monthday(d)]
+        days = sorted(set(days))
+        if self.bysetpos:
+            chosen = list()
+            for pos in self.bysetpos:
+                try:
+                    chosen.append(days[pos - 1 if pos > 0 else pos])
+                except IndexError:
+                    pass
+            days = sorted(set(chosen))
+        return days
+
+    def _month(self, year: int, month: int, anchor: date) -> list:
+        """ The days of one month that satisfy BYMONTHDAY and BYDAY (else the anchor's day). """
+        length = monthrange(year, month)[1]
+        if not (self.bymonthday or self.byday):
+            return [date(year, month, min(anchor.day, length))]
+        candidates = None
+        if self.bymonthday:
+            candidates = set()
+            for md in self.bymonthday:
+                day = md if md > 0 else length + md + 1
+                if 1 <= day <= length:
+                    candidates.add(date(year, month, day))
+        if self.byday:
+            matched = set()
+            for n, wd in self.byday:
+                first = (wd - date(year, month, 1).weekday()) % 7 + 1
+                days = [date(year, month, d) for d in range(first, length + 1, 7)]
+                if n == 0:
+                    matched.update(days)
+                else:
+                    try:
+                        matched.add(days[n - 1 if n > 0 else n])
+                    except IndexError:
+                        pass
+            candidates = matched if candidates is None else candidates & matched
+        return sorted(candidates)
+
+    def _monthday(self, d: date) -> bool:
+        length = monthrange(d.year, d.month)[1]
+        return any([(md if md > 0 else length + md + 1) == d.day for md in self.bymonthday])
+
+
+@lru_cache(maxsize=256)
+def parse_rule(interval: str) -> Rule:
+    """ Interpret an interval: one of the named intervals or an RRULE like FREQ=MONTHLY;BYDAY=-1FR. """
+    try:
+        text = NAMED[interval.lower()]
+    except KeyError:
+        text = interval
+    return Rule(text)
+
+
+def next_due(interval: str, today: str) -> str:
+    """ The due date (ISO) for a recurring activity completed today (ISO). """
+    d = parse_rule(interval).after(date.fromisoformat(today))
+    if d is None:
+        return None
+    return d.isoformat()
+
+
+def upcoming(interval: str, due: str, count: int) -> list:
+    """ The next count occurrences (ISO dates) after an activity's current due date. """
+    start = date.fromisoformat(due[0:10])
+    stream = (d for d in parse_rule(interval).occurrences(start) if d > start)
+    return [d.isoformat() for d in islice(stream, count)]
+
+
+class OccurrenceIndex:
+    """
+    The upcoming occurrences (after the current due date) of every recurring, unfinished
+    activity, indexed by date from today through a horizon that slides forward with the
+    date and extends on demand. Activities are expanded lazily, when first queried, so
+    queries change the index too; a lock lets concurrent readers (e.g., the threads of
+    the asyncio server under its shared read lock) use it safely.
+    """
+
+    def __init__(self, horizon: int = HORIZON):
+        self.horizon = horizon
+        self.start = None  # first and last ISO dates covered
+        self.end = None
+        self.days = dict()  # ISO date -> list of activities
+        self.keys = dict()  # activity -> ISO dates under which it is indexed
+        self.streams = dict()  # activity -> (generator of later dates, next date not yet indexed)
+        self.pending = dict()  # insertion-ordered set of activities to (re)expand
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        with self.lock:
+            return sum([len(v) for v in self.days.values()])
+
+    def update(self, activity):
+        """ Note that an activity changed; it is re-expanded on the next query. """
+        with self.lock:
+            self.pending[activity] = True
+
+    def discard(self, activity):
+        with self.lock:
+            self.pending.pop(activity, None)
+            self._remove(activity)
+
+    def clear(self):
+        with self.lock:
+            self.start = self.end = None
+            self.days.clear()
+            self.keys.clear()
+            self.streams.clear()
+            self.pending.clear()
+
+    def between(self, start: str, end: str, today: str) -> list:
+        """ Activities with an upcoming occurrence from start through end (ISO dates). """
+        with self.lock:
+            self._cover(today, end)
+            found = dict()
+            for day, activities in self.days.items():
+                if start <= day <= end:
+                    for a in activities:
+                        found[a] = True
+        return list(found)
+
+    def occurs(self, activity, start: str, end: str, today: str) -> bool:
+        """ Whether one activity has an upcoming occurrence from start through end. """
+        with self.lock:
+            self._cover(today, end)
+            return any([start <= day <= end for day in self.keys.get(activity, ())])
+
+    def schedule(self, start: str, end: str, today: str) -> list:
+        """ (ISO date, activity) pairs for the upcoming occurrences from start through end. """
+        with self.lock:
+            self._cover(today, end)
+            return [
+                (day, a) for day in sorted(self.days.keys()) if start <= day <= end
+                for a in self.days[day]]
+
+    def by_day(self, start: str, end: str, today: str) -> dict:
+        """ ISO date -> the activities with an occurrence that day, from start through end. """
+        with self.lock:
+            self._cover(today, end)
+            return {day: list(activities) for day, activities in self.days.items() if start <= day <= end}
+
+    def roll(self, today: str):
+        """ Slide an expanded window forward to today, dropping past days and filling new ones. """
+        with self.lock:
+            if self.end is not None:
+                self._cover(today, self.end)
+
+    def dates(self, activity, today: str) -> list:
+        """ The indexed upcoming dates of one activity. """
+        with self.lock:
+            self._cover(today, self.end or today)
+            return list(self.keys.get(activity, ()))
+
+    def _cover(self, today: str, end: str):
+        """ Slide the window to start today and reach at least end (or the horizon); hold the lock. """
+        horizon = (date.fromisoformat(today) + timedelta(days=self.horizon)).isoformat()
+        end = max(end, horizon)
+        if self.start != today:
+            for day in [d for d in self.days.keys() if d < today]:
+                for a in self.days.pop(day):
+                    self.keys[a].remove(day)
+            self.start = today
+        if self.end is None or end > self.end:
+            self.end = end
+            for a in list(self.streams.keys()):
+                self._fill(a)
+        for a in list(self.pending.keys()):
+            self._remove(a)
+            self._expand(a, today)
+        self.pending.clear()
+
+    def _expand(self, activity, today: str):
+        if activity.interval is None or activity.due is None or activity.complete:
+            return
+        due = activity.due[0:10]
+        try:
+            rule = parse_rule(activity.interval)
+        except ValueError as err:
+            logger.warning(f'{repr(activity)}: interval {repr(activity.interval)}: {err}')
+            return
+        start = date.fromisoformat(due)
+        floor = max(due, today)
+        stream = (d.isoformat() for d in rule.occurrences(start))
+        stream = (d for d in stream if d > due and d >= floor)
+        self.keys[activity] = list()
+        self.streams[activity] = (stream, next(stream, None))
+        self._fill(activity)
+
+    def _fill(self, activity):
+        stream, pending = self.streams[activity]
+        keys = self.keys[activity]
+        while pending is not None and pending <= self.end:
+            try:
+                self.days[pending].append(activity)
+            except KeyError:
+                self.days[pending] = [activity]
+            keys.append(pending)
+            pending = next(stream, None)
+        self.streams[activity] = (stream, pending)
+
+    def _remove(self, activity):
+        self.streams.pop(activity, None)
+        for day in self.keys.pop(activity, ()):
+            activities = self.days[day]
+            activities.remove(activity)
+            if not activities:
+                del self.days[day]
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local reminders when activities fall due or come out from under not_before
+"""
+
+import heapq
+from itertools import count
+import logging
+from meek.dates import iso8601, not_before_epoch
+import os
+from pathlib import Path
+import shlex
+import subprocess
+import sys
+import threading
+from time import time
+
+logger = logging.getLogger(__name__)
+KINDS = ['due', 'not_before']
+COMMAND_TIMEOUT = 30.0  # seconds a reminder command may run
+MAX_SLEEP = 3600.0  # wake at least this often, in case the clock jumps (e.g., after a suspend)
+COMPACT_MIN = 1024  # stale heap entries tolerated before the heap is rebuilt
+
+
+class Reminder:
+    """ One arrival: when (epoch seconds), kind ("due" or "not_before") and the activity. """
+
+    __slots__ = ('when', 'kind', 'activity')
+
+    def __init__(self, when: float, kind: str, activity):
+        self.when = when
+        self.kind = kind
+        self.activity = activity
+
+    def message(self) -> str:
+        return f'{iso8601(self.when)} {self.kind}: {self.activity.title}'
+
+
+def triggers(activity) -> list:
+    """ (kind, epoch seconds or None) for each kind of reminder; finished activities have none. """
+    if activity.complete:
+        return [(kind, None) for kind in KINDS]
+    result = list()
+    for kind in KINDS:
+        value = getattr(activity, kind)
+        result.append((kind, None if value is None else not_before_epoch(value)))
+    return result
+
+
+class Reminders:
+    """
+    Upcoming reminder times in a min-heap, with entries replaced in O(log n) as activities
+    change, and one thread that sleeps until the earliest and delivers it to the sink.
+    """
+
+    def __init__(self, sink=None, clock=time):
+        self.sink = sink or StreamSink()  # any callable taking a Reminder
+        self.clock = clock
+        self.heap = list()  # [when, sequence, activity, kind]; activity None when superseded
+        self.entries = dict()  # (activity, kind) -> live heap entry
+        self.sequence = count()  # breaks ties, so activities are never compared
+        self.cond = threading.Condition()
+        self.thread = None
+        self.stopping = False
+
+    def __len__(self):
+        return len(self.entries)
+
+    def update(self, activity):
+        """ Schedule, reschedule or cancel the reminders for an activity. """
+        with self.cond:
+            earliest = self._next()
+            now = self.clock()
+            for kind, when in triggers(activity):
+                key = (activity, kind)
+                entry = self.entries.get(key)
+                if entry is not None:
+                    if entry[0] == when:
+                        continue
+                    entry[2] = None
+                    del self.entries[key]
+                if when is not None and when > now:
+                    entry = [when, next(self.sequence), activity, kind]
+                    self.entries[key] = entry
+                    heapq.heappush(self.heap, entry)
+                    if earliest is None or when < earliest:
+                        self.cond.notify()
+            self._compact()
+
+    def discard(self, activity):
+        with self.cond:
+            for kind in KINDS:
+                entry = self.entries.pop((activity, kind), None)
+                if entry is not None:
+                    entry[2] = None
+            self._compact()
+
+    def clear(self):
+        with self.cond:
+            self.heap = list()
+            self.entries = dict()
+
+    def reset(self, activities):
+        """ Schedule reminders for activities from scratch, in one heapify. """
+        with self.cond:
+            now = self.clock()
+            self.heap = list()
+            self.entries = dict()
+            for a in activities:
+                for kind, when in triggers(a):
+                    if when is not None and when > now:
+                        entry = [when, next(self.sequence), a, kind]
+                        self.entries[(a, kind)] = entry
+                        self.heap.append(entry)
+            heapq.heapify(self.heap)
+            self.cond.notify()
+
+    def upcoming(self, n: int) -> list:
+        """ The next n reminders, earliest first. """
+        with self.cond:
+            entries = heapq.nsmallest(n, self.entries.values())
+        return [Reminder(when, kind, a) for when, seq, a, kind in entries]
+
+    def next_time(self):
+        """ Epoch seconds of the earliest reminder, or None. """
+        with self.cond:
+            return self._next()
+
+    def fire(self, now: float = None) -> list:
+        """ Deliver (and return) every reminder whose time has come, earliest first. """
+        due = list()
+        with self.cond:
+            if now is None:
+                now = self.clock()
+            while self._next() is not None and self.heap[0][0] <= now:
+                when, seq, a, kind = heapq.heappop(self.heap)
+                del self.entries[(a, kind)]
+                due.append(Reminder(when, kind, a))
+        for reminder in due:
+            try:
+                self.sink(reminder)
+            except Exception as err:
+                logger.error(f'Reminder "{reminder.message()}" failed: {type(err).__name__}: {err}')
+        return due
+
+    def start(self):
+        """ Deliver reminders from a daemon thread until stop(). """
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name='meek-reminders', daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        with self.cond:
+            self.stopping = True
+            self.cond.notify()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while True:
+            with self.cond:
+                if self.stopping:
+                    return
+                when = self._next()
+                if when is None:
+                    self.cond.wait(MAX_SLEEP)
+                    continue
+                wait = when - self.clock()
+                if wait > 0:
+                    # woken early by an earlier reminder or stop(); either way, look again
+                    self.cond.wait(min(wait, MAX_SLEEP))
+                    continue
+            self.fire()
+
+    def _next(self):
+        """ The earliest live time, discarding superseded entries from the top of the heap. """
+        heap = self.heap
+        while heap and heap[0][2] is None:
+            heapq.heappop(heap)
+        return heap[0][0] if heap else None
+
+    def _compact(self):
+        if len(self.heap) > 2 * len(self.entries) + COMPACT_MIN:
+            self.heap = [e for e in self.heap if e[2] is not None]
+            heapq.heapify(self.heap)
+
+
+class StreamSink:
+    """ Print each reminder on a line to a stream (standard output by default). """
+
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, reminder: Reminder):
+        print(reminder.message(), file=self.stream or sys.stdout, flush=True)
+
+
+class FifoSink:
+    """ Write each reminder as a line to a named pipe; with no reader, the reminder is logged. """
+
+    def __init__(self, path):
+        self.path = Path(path).expanduser()
+
+    def __call__(self, reminder: Reminder):
+        try:
+            fd = os.open(self.path, os.O_WRONLY | os.O_NONBLOCK)
+        except OSError as err:
+            logger.warning(f'Nothing is reading {self.path} ({err}); missed: {reminder.message()}')
+            return
+        try:
+            os.write(fd, (reminder.message() + '\n').encode('utf-8'))
+        finally:
+            os.close(fd)
+
+
+class CommandSink:
+    """
+    Run a local command for each reminder, with the message as its last argument and
+    MEEK_KIND, MEEK_TITLE, MEEK_ID and MEEK_WHEN in its environment.
+    """
+
+    def __init__(self, command):
+        self.argv = shlex.split(command) if isinstance(command, str) else list(command)
+
+    def __call__(self, reminder: Reminder):
+        a = reminder.activity
+        env = dict(
+            os.environ, MEEK_KIND=reminder.kind, MEEK_TITLE=a.title, MEEK_ID=a.id.hex,
+            MEEK_WHEN=iso8601(reminder.when))
+        try:
+            subprocess.run(
+                self.argv + [reminder.message()], env=env, timeout=COMMAND_TIMEOUT,
+                stdin=subprocess.DEVNULL, check=True)
+        except (OSError, subprocess.SubprocessError) as err:
+            logger.error(f'Reminder command {shlex.join(self.argv)} failed: {err}')
+
+
+def sink_for(spec: str):
+    """ A sink from "-" (standard output), "fifo:PATH" or "command:COMMAND". """
+    if spec in ['-', 'stdout']:
+        return StreamSink()
+    kind, sep, rest = spec.partition(':')
+    if sep and rest:
+        if kind == 'fifo':
+            return FifoSink(rest)
+        elif kind == 'command':
+            return CommandSink(rest)
+    raise ValueError(f'Expected "-", "fifo:PATH" or "command:COMMAND" for reminders, not {repr(spec)}.')
@@ -0,0 +1,74 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Day-rollover support: when the day next changes, and due-date buckets relative to a day
+"""
+
+from datetime import datetime, timedelta, timezone
+from meek.dates import local_zone, period_bounds
+
+
+def next_midnight(now: float) -> float:
+    """
+    Epoch seconds of the first midnight after now, UTC or local, whichever comes first:
+    stored dates turn over at UTC midnight and descriptive ones ("this week") at local.
+    """
+    times = list()
+    for tz in [timezone.utc, local_zone()]:
+        day = datetime.fromtimestamp(now, tz).date() + timedelta(days=1)
+        times.append(datetime(day.year, day.month, day.day, tzinfo=tz).timestamp())
+    return min(times)
+
+
+def bucket_spans(today) -> dict:
+    """ Named (start, end) ISO date spans relative to today; start None is open-ended. """
+    week = period_bounds('this week', today)
+    return {
+        'overdue': (None, today.isoformat()),
+        'today': (today.isoformat(), today.isoformat()),
+        'this week': (week[0].isoformat(), week[1].isoformat())
+    }
+
+
+class DateBuckets:
+    """ Sets of activities whose due dates fall within spans fixed relative to one day. """
+
+    def __init__(self):
+        self.spans = dict()  # (start, end) -> set of activities
+        self.names = dict()  # name -> (start, end)
+
+    def reset(self, spans: dict, activities):
+        """ Replace the spans and refill them from activities, swapping the new sets in whole. """
+        buckets = {span: set() for span in spans.values()}
+        for a in activities:
+            due = a.due
+            if due is None:
+                continue
+            for (start, end), members in buckets.items():
+                if due <= end and (start is None or start <= due):
+                    members.add(a)
+        self.names = dict(spans)
+        self.spans = buckets
+
+    def clear(self):
+        for members in self.spans.values():
+            members.clear()
+
+    def update(self, activity):
+        due = activity.due
+        for (start, end), members in self.spans.items():
+            if due is not None and due <= end and (start is None or start <= due):
+                members.add(activity)
+            else:
+                members.discard(activity)
+
+    def discard(self, activity):
+        for members in self.spans.values():
+            members.discard(activity)
+
+    def lookup(self, start: str, end: str):
+        """ The set of activities due from start (None for any time) through end, if bucketed. """
+        try:
+            return self.spans[(start, end)]
+        except KeyError:
+            return None
@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Keyword rules that tag and schedule activities by what their titles say
+"""
+
+from collections import deque
+import json
+import logging
+import re
+
+logger = logging.getLogger(__name__)
+TRIGGERS = ['word', 'phrase', 'regex']
+FIELDS = ['due', 'interval', 'not_before', 'tags']
+FILL = ['due', 'not_before']  # only set on activities that have none
+DEFAULT_RULES = [
+    {'word': 'annually', 'set': {'due': 'today', 'interval': 'year'}},
+    {'word': 'daily', 'set': {'due': 'today', 'interval': 'day'}},
+    {'word': 'medicate', 'set': {'tags': 'health'}},
+    {'word': 'medicated', 'set': {'tags': 'health'}},
+    {'word': 'medicine', 'set': {'tags': 'health'}},
+    {'word': 'meds', 'set': {'tags': 'health'}},
+    {'word': 'monthly', 'set': {'due': 'today', 'interval': 'month'}},
+    {'word': 'quarterly', 'set': {'due': 'today', 'interval': 'quarter'}},
+    {'word': 'weekly', 'set': {'due': 'today', 'interval': 'week'}},
+    {'word': 'yearly', 'set': {'due': 'today', 'interval': 'year'}},
+]
+
+
+class Rule:
+    """ A trigger (a word, phrase, or regular expression) and the fields it sets. """
+
+    __slots__ = ('kind', 'pattern', 'changes')
+
+    def __init__(self, kind: str, pattern: str, changes: dict):
+        self.kind = kind
+        self.pattern = pattern
+        self.changes = changes
+
+    def __str__(self):
+        changes = ' '.join([
+            f'{k}:{",".join(v) if isinstance(v, list) else v}' for k, v in self.changes.items()])
+        return f'{self.kind} {json.dumps(self.pattern, ensure_ascii=False)}: {changes}'
+
+    def asdict(self) -> dict:
+        return {self.kind: self.pattern, 'set': self.changes}
+
+
+def parse_rules(data: list) -> list:
+    """ Rules from dicts like {"word": "daily", "set": {"due": "today", "interval": "day"}}. """
+    if not isinstance(data, list):
+        raise ValueError(f'Expected a list of rules, not {type(data).__name__}.')
+    rules = list()
+    for n, d in enumerate(data, start=1):
+        try:
+            changes = d['set']
+        except (KeyError, TypeError):
+            raise ValueError(f'Rule {n} has no "set" of changes to make.')
+        kinds = [k for k in TRIGGERS if k in d]
+        if len(kinds) != 1:
+            raise ValueError(f'Rule {n} needs exactly one of {", ".join(TRIGGERS)}.')
+        kind = kinds[0]
+        pattern = d[kind]
+        if not isinstance(pattern, str) or not pattern.strip():
+            raise ValueError(f'Rule {n} has an empty {kind}.')
+        if kind == 'word':
+            pattern = pattern.strip().lower()
+            if len(pattern.split()) > 1:
+                raise ValueError(f'Rule {n}: {repr(pattern)} is more than one word; use "phrase".')
+        elif kind == 'phrase':
+            pattern = ' '.join(pattern.lower().split())
+        else:
+            try:
+                re.compile(pattern)
+            except re.error as err:
+                raise ValueError(f'Rule {n}: bad regular expression {repr(pattern)}: {err}')
+        if not isinstance(changes, dict) or not changes:
+            raise ValueError(f'Rule {n} has no changes to make.')
+        unknown = [k for k in changes.keys() if k not in FIELDS]
+        if unknown:
+            raise ValueError(
+                f'Rule {n} cannot set {", ".join(unknown)}. Expected any of {", ".join(FIELDS)}.')
+        rules.append(Rule(kind, pattern, dict(changes)))
+    return rules
+
+
+def load_rules(path) -> list:
+    with open(path, 'r', encoding='utf-8') as f:
+        return parse_rules(json.load(f))
+
+
+class PhraseAutomaton:
+    """ Aho-Corasick automaton: every occurrence of many phrases in one pass over a text. """
+
+    def __init__(self, phrases: list):
+        self.lengths = [len(p) for p in phrases]
+        self.goto = [dict()]  # node -> {character: node}
+        self.fail = [0]
+        self.out = [list()]  # node -> numbers of the phrases ending there
+        for i, phrase in enumerate(phrases):
+            node = 0
+            for c in phrase:
+                try:
+                    node = self.goto[node][c]
+                except KeyError:
+                    self.goto.append(dict())
+                    self.fail.append(0)
+                    self.out.append(list())
+                    self.goto[node][c] = node = len(self.goto) - 1
+            self.out[node].append(i)
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for c, child in self.goto[node].items():
+                queue.append(child)
+                f = self.fail[node]
+                while f and c not in self.goto[f]:
+                    f = self.fail[f]
+                target = self.goto[f].get(c, 0)
+                self.fail[child] = 0 if target == child else target
+                self.out[child] = self.out[child] + self.out[self.fail[child]]
+
+    def search(self, text: str):
+        """ Yield (start, end, phrase number) for each occurrence. """
+        goto, fail, out, lengths = self.goto, self.fail, self.out, self.lengths
+        node = 0
+        for end, c in enumerate(text, start=1):
+            while node and c not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(c, 0)
+            for i in out[node]:
+                yield (end - lengths[i], end, i)
+
+
+class RuleSet:
+    """
+    Rules compiled once for matching against activities: words in a hash table and phrases
+    in an Aho-Corasick automaton, so that they cost time in proportion to the text rather
+    than the number of rules. Regular expressions are compiled once but tried one by one.
+    """
+
+    def __init__(self, rules: list):
+        self.rules = list(rules)
+        self.words = dict()  # word -> rule numbers
+        phrases = dict()  # phrase -> rule numbers
+        for n, rule in enumerate(self.rules):
+            if rule.kind == 'word':
+                self.words.setdefault(rule.pattern, list()).append(n)
+            elif rule.kind == 'phrase':
+                phrases.setdefault(rule.pattern, list()).append(n)
+        self.phrases = list(phrases.values())
+        self.automaton = PhraseAutomaton(list(phrases.keys())) if phrases else None
+        self.regexes = [(n, re.compile(r.pattern)) for n, r in enumerate(self.rules) if r.kind == 'regex']
+
+    def __len__(self):
+        return len(self.rules)
+
+    def match(self, activity) -> list:
+        """ Numbers of the rules whose triggers appear in the activity's title or tags, in order. """
+        text = activity.title or ''
+        if activity.tags:
+            text = ' '.join([text] + sorted(activity.tags))
+        folded = ' '.join(text.lower().split())
+        found = set()
+        words = self.words
+        if words:
+            for w in folded.split(' '):
+                try:
+                    found.update(words[w])
+                except KeyError:
+                    pass
+        if self.automaton is not None:
+            for start, end, i in self.automaton.search(folded):
+                # whole words only
+                if (start == 0 or folded[start - 1] == ' ') and (end == len(folded) or folded[end] == ' '):
+                    found.update(self.phrases[i])
+        for n, regex in self.regexes:
+            if regex.search(text):
+                found.add(n)
+        return sorted(found)
+
+    def changes(self, activity) -> dict:
+        """
+        What the matching rules would change: due and not_before only where unset (the first
+        rule wins), interval from the last rule, and any tags the activity lacks.
+        """
+        changes = dict()
+        tags = list()
+        have = activity.tags or set()
+        for n in self.match(activity):
+            for k, v in self.rules[n].changes.items():
+                if k == 'tags':
+                    for tag in ([v] if isinstance(v, str) else v):
+                        if tag not in have and tag not in tags:
+                            tags.append(tag)
+                elif k in FILL:
+                    if getattr(activity, k) is None and k not in changes:
+                        changes[k] = v
+                elif getattr(activity, k) != v:
+                    changes[k] = v
+        if tags:
+            changes['tags'] = tags
+        return changes
+
+    def apply(self, activity) -> dict:
+        """ Make the changes the rules call for; return them. """
+        changes = self.changes(activity)
+        for k, v in changes.items():
+            setattr(activity, k, v)
+        return changes
+
+    def describe(self) -> str:
+        if not self.rules:
+            return 'No rules.'
+        return '\n'.join([f'{n}: {rule}' for n, rule in enumerate(self.rules)])
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run meek commands non-interactively (command files, pipes, one-shot)
+"""
+
+import json
+import logging
+from meek.interpreter import Interpreter, WHERE_DEFAULT
+from pathlib import Path
+import sys
+
+logger = logging.getLogger(__name__)
+
+EXIT_OK = 0
+EXIT_USAGE = 1
+EXIT_FAILURE = 2
+
+
+def load_store(interpreter: Interpreter, where: Path) -> bool:
+    """Load the store at where, if there is one; return whether it existed."""
+    exists = (where / 'activities').is_dir()
+    if exists:
+        logger.info(interpreter.parse(['load', str(where)]))
+    return exists
+
+
+def save_store(interpreter: Interpreter, where: Path, exists: bool):
+    """Save to where if anything changed (and there is something to save)."""
+    if interpreter.modified and (exists or interpreter.manager.activities):
+        result = interpreter.parse(['save', str(where), 'force:true'])
+        logger.info(result)
+        return result
+
+
+def run_command(interpreter: Interpreter, line: str) -> dict:
+    """
+    Execute one command line and describe the outcome as a JSON-ready record.
+    SystemExit (from "quit") is left for the caller to handle.
+    """
+    errors = len(interpreter.errors)
+    output = ''
+    error = None
+    unexpected = False
+    try:
+        output = interpreter.execute(line)
+    except SystemExit:
+        raise
+    except Exception as err:
+        error = f'{err.__class__.__name__}: {err}'
+        unexpected = True
+    else:
+        if len(interpreter.errors) > errors:
+            error = '; '.join(interpreter.errors[errors:])
+    return {
+        'command': line,
+        'ok': error is None,
+        'output': output,
+        'error': error,
+        'unexpected': unexpected,
+        'context': [a.id.hex for a in interpreter.manager.current]
+    }
+
+
+def run_script(
+        lines, where=WHERE_DEFAULT, engine: str = 'dict', as_json: bool = False, out=None,
+        save: bool = True) -> int:
+    """
+    Load the store once, run each command line through the interpreter, then save if
+    anything changed. Return a process exit code: EXIT_USAGE if any command failed.
+    """
+    if out is None:
+        out = sys.stdout
+    where = Path(where).expanduser().resolve()
+    i = Interpreter(engine=engine)
+    i.echo_errors = not as_json
+    exists = load_store(i, where)
+    status = EXIT_OK
+    for n, line in enumerate(lines, start=1):
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        try:
+            record = run_command(i, line)
+        except SystemExit:
+            break  # "quit" ends the script; saving still happens below
+        if not record['ok']:
+            status = EXIT_USAGE
+            logger.debug(f'line {n}: {record["error"]}')
+        if as_json:
+            out.write(json.dumps(record, ensure_ascii=False) + '\n')
+        else:
+            if record['output']:
+                out.write(f'{record["output"]}\n')
+            if record['unexpected']:
+                out.write(f'Error: {record["error"]}\n')
+    if save:
+        try:
+            save_store(i, where, exists)
+        except OSError as err:
+            logger.error(f'Failed to save to {where}: {err}')
+            return EXIT_FAILURE
+    return status
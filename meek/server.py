@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Long-running meek server: one interpreter and store, reached over a Unix domain socket
+"""
+
+import json
+import logging
+from meek.client import SOCKET_DEFAULT
+from meek.interpreter import Interpreter, WHERE_DEFAULT
+from meek.reminders import Reminders, sink_for
+from meek.script import load_store, run_command, save_store
+import os
+from pathlib import Path
+import socket
+import socketserver
+from time import time
+
+logger = logging.getLogger(__name__)
+IDLE_DEFAULT = 30.0  # seconds without a request before unsaved changes are written
+CONNECTION_TIMEOUT = 30.0  # seconds a connection may sit silent before it is dropped
+
+
+def error_record(command, error: str) -> dict:
+    return {
+        'command': command,
+        'ok': False,
+        'output': '',
+        'error': error,
+        'unexpected': False,
+        'context': []
+    }
+
+
+def claim_socket(path: Path, where: Path):
+    """Remove a stale socket file, but refuse to displace a live server."""
+    if where in path.resolve().parents:
+        # a full save moves everything in the store aside, sockets included
+        raise ValueError(f'Socket {path} must not be inside the store at {where}')
+    if not path.exists():
+        return
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+        try:
+            s.connect(str(path))
+        except OSError:
+            logger.debug(f'removing stale socket {path}')
+            path.unlink()
+        else:
+            raise RuntimeError(f'A meek server is already listening at {path}')
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """Read JSON-lines requests ({"command": "..."}) and answer each with one record."""
+
+    def setup(self):
+        # requests are served one connection at a time, so a silent client must not hold the server
+        self.timeout = self.server.connection_timeout
+        super().setup()
+
+    def handle(self):
+        try:
+            self.answer()
+        except socket.timeout:
+            logger.warning(f'Dropped a connection silent for {self.timeout} seconds.')
+
+    def answer(self):
+        for raw in self.rfile:
+            try:
+                command = json.loads(raw)['command']
+            except (ValueError, KeyError, TypeError) as err:
+                record = error_record(None, f'Bad request: {err}')
+            else:
+                record = self.server.execute(command)
+            self.wfile.write(json.dumps(record, ensure_ascii=False).encode('utf-8') + b'\n')
+            self.wfile.flush()
+            if self.server.stopping:
+                break
+
+
+class Server(socketserver.UnixStreamServer):
+    """Serve one Interpreter; requests are handled one at a time, in arrival order."""
+
+    def __init__(
+            self, path=SOCKET_DEFAULT, where=WHERE_DEFAULT, engine: str = 'dict',
+            idle: float = IDLE_DEFAULT, stats_file=None, remind: str = None,
+            connection_timeout: float = CONNECTION_TIMEOUT):
+        sink = sink_for(remind) if remind else None  # a bad spec fails before claiming the socket
+        self.path = Path(path)
+        self.stats_file = stats_file
+        self.where = Path(where).expanduser().resolve()
+        claim_socket(self.path, self.where)
+        self.interpreter = Interpreter(engine=engine)
+        self.interpreter.echo_errors = False
+        self.exists = load_store(self.interpreter, self.where)
+        self.reminders = None
+        if sink is not None:
+            # sent from their own thread, as each time arrives
+            self.reminders = Reminders(sink)
+            self.interpreter.manager.remind(self.reminders)
+        self.timeout = idle
+        self.connection_timeout = connection_timeout
+        self.stopping = False
+        super().__init__(str(self.path), RequestHandler)
+        os.chmod(self.path, 0o600)
+
+    def execute(self, command: str) -> dict:
+        """Run one command line, with server-level handling of "shutdown" and "quit"."""
+        if command.strip() == 'shutdown':
+            self.stopping = True
+            return {
+                'command': command,
+                'ok': True,
+                'output': self.autosave() or 'Server stopping.',
+                'error': None,
+                'unexpected': False,
+                'context': []
+            }
+        try:
+            return run_command(self.interpreter, command)
+        except SystemExit:
+            return error_record(command, 'The server keeps running; use "shutdown" to stop it.')
+
+    def autosave(self):
+        """Save unsaved changes, if any."""
+        try:
+            result = save_store(self.interpreter, self.where, self.exists)
+        except OSError as err:
+            logger.error(f'Autosave to {self.where} failed: {err}')
+            return f'Autosave failed: {err}'
+        if result is not None:
+            self.exists = True
+        return result
+
+    def handle_timeout(self):
+        self.autosave()
+        self.dump_stats()
+        self.rollover()
+
+    def rollover(self):
+        """Advance date-relative state if the day has changed, so that no request has to."""
+        manager = self.interpreter.manager
+        if time() >= manager.rollover_at:
+            logger.info(manager.rollover())
+
+    def dump_stats(self):
+        """Append the interpreter's statistics to the stats file, if there is one."""
+        if self.stats_file is None:
+            return
+        manager = self.interpreter.manager
+        try:
+            manager.metrics.dump(self.stats_file, manager.gauges())
+        except OSError as err:
+            logger.error(f'Writing statistics to {self.stats_file} failed: {err}')
+
+    def serve(self):
+        """Handle requests until "shutdown"; autosave when idle and on the way out."""
+        logger.info(f'Serving {self.where} at {self.path}')
+        if self.reminders is not None:
+            self.reminders.start()
+        try:
+            while not self.stopping:
+                self.handle_request()
+        finally:
+            self.autosave()
+            self.dump_stats()
+            if self.reminders is not None:
+                self.reminders.stop()
+            self.server_close()
+
+    def server_close(self):
+        super().server_close()
+        self.path.unlink(missing_ok=True)
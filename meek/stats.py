@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Low-overhead latency histograms and counters
+"""
+
+from functools import wraps
+from math import log2
+import threading
+from time import perf_counter_ns, time
+
+SUB_BUCKETS = 4  # buckets per doubling, so quantiles are within about 19%
+
+
+class Histogram:
+    """ Log-bucketed histogram of durations in nanoseconds. """
+
+    __slots__ = ('count', 'total', 'max', 'buckets')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self.buckets = dict()
+
+    def record(self, ns: int):
+        self.count += 1
+        self.total += ns
+        if ns > self.max:
+            self.max = ns
+        b = int(log2(ns) * SUB_BUCKETS) if ns > 1 else 0
+        try:
+            self.buckets[b] += 1
+        except KeyError:
+            self.buckets[b] = 1
+
+    def quantile(self, q: float) -> float:
+        """ Estimate the q-quantile (upper bound of its bucket, never above the max). """
+        if self.count == 0:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for b in sorted(self.buckets.keys()):
+            seen += self.buckets[b]
+            if seen >= rank:
+                return min(2 ** ((b + 1) / SUB_BUCKETS), self.max)
+        return float(self.max)
+
+    def summary(self) -> dict:
+        """ Count and milliseconds for mean, p50, p95, p99 and max. """
+        ms = 1e-6
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count * ms if self.count else 0.0,
+            'p50_ms': self.quantile(0.50) * ms,
+            'p95_ms': self.quantile(0.95) * ms,
+            'p99_ms': self.quantile(0.99) * ms,
+            'max_ms': self.max * ms
+        }
+
+
+class Timer:
+    """ Context manager that records its duration into a histogram. """
+
+    __slots__ = ('metrics', 'name', 'start')
+
+    def __init__(self, metrics, name):
+        self.metrics = metrics
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc):
+        self.metrics.record(self.name, perf_counter_ns() - self.start)
+        return False
+
+
+class NullTimer:
+    """ Stand-in for Timer when instrumentation is disabled. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+NULL_TIMER = NullTimer()
+
+
+class Metrics:
+    """ Named histograms and counters that can be switched off. """
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.histograms = dict()
+        self.counters = dict()
+        # server readers record from several threads at once
+        self.lock = threading.Lock()
+
+    def record(self, name: str, ns: int):
+        with self.lock:
+            try:
+                h = self.histograms[name]
+            except KeyError:
+                h = self.histograms[name] = Histogram()
+            h.record(ns)
+
+    def count(self, name: str, n: int = 1):
+        if self.enabled:
+            with self.lock:
+                try:
+                    self.counters[name] += n
+                except KeyError:
+                    self.counters[name] = n
+
+    def time(self, name: str):
+        """ Return a context manager timing its block under name. """
+        if self.enabled:
+            return Timer(self, name)
+        return NULL_TIMER
+
+    def reset(self):
+        with self.lock:
+            self.histograms = dict()
+            self.counters = dict()
+
+    def records(self, gauges: dict = None) -> list:
+        """ Describe every metric as a JSON-ready dict. """
+        records = list()
+        with self.lock:
+            for name in sorted(self.histograms.keys()):
+                records.append(dict(name=name, type='histogram', **self.histograms[name].summary()))
+            for name in sorted(self.counters.keys()):
+                records.append({'name': name, 'type': 'counter', 'value': self.counters[name]})
+        if gauges is not None:
+            for name in sorted(gauges.keys()):
+                records.append({'name': name, 'type': 'gauge', 'value': gauges[name]})
+        return records
+
+    def report(self, gauges: dict = None) -> str:
+        """ Format the metrics as a table. """
+        lines = list()
+        records = self.records(gauges)
+        timings = [r for r in records if r['type'] == 'histogram']
+        if timings:
+            width = max([len(r['name']) for r in timings])
+            lines.append(
+                f'{"timing (ms)":<{width}} {"count":>7} {"p50":>8} {"p95":>8} {"p99":>8} {"max":>8}')
+            for r in timings:
+                lines.append(
+                    f'{r["name"]:<{width}} {r["count"]:>7} {r["p50_ms"]:>8.3f} '
+                    f'{r["p95_ms"]:>8.3f} {r["p99_ms"]:>8.3f} {r["max_ms"]:>8.3f}')
+        values = [r for r in records if r['type'] != 'histogram']
+        if values:
+            width = max([len(r['name']) for r in values])
+            for r in values:
+                value = r['value']
+                if isinstance(value, float):
+                    value = f'{value:.3f}'
+                lines.append(f'{r["name"]:<{width}} {value}')
+        if not self.enabled:
+            lines.append('(instrumentation is off; use "stats on" to enable it)')
+        return '\n'.join(lines)
+
+    def dump(self, path, gauges: dict = None) -> int:
+        """ Append the metrics to path as JSON lines stamped with the time; return the count. """
+        import json
+        now = time()
+        records = self.records(gauges)
+        with open(path, 'a', encoding='utf-8') as f:
+            for r in records:
+                r['time'] = now
+                f.write(json.dumps(r) + '\n')
+        return len(records)
+
+
+def timed(name: str):
+    """ Decorate a method of an object with a "metrics" attribute to time its calls. """
+    def decorator(func):
+        @wraps(func)
+        def wrapper(self, *args, **kwargs):
+            metrics = self.metrics
+            if not metrics.enabled:
+                return func(self, *args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return func(self, *args, **kwargs)
+            finally:
+                metrics.record(name, perf_counter_ns() - start)
+        return wrapper
+    return decorator
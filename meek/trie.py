@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Prefix trie for fast completion of index keys
+"""
+
+END = ''  # child keys are single characters, so '' can mark the end of a word
+
+
+class PrefixTrie:
+    """A set of strings that can list its members starting with a given prefix."""
+
+    __slots__ = ('root', 'size')
+
+    def __init__(self, words=None):
+        self.root = dict()
+        self.size = 0
+        if words is not None:
+            for w in words:
+                self.add(w)
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, word):
+        node = self._find(word)
+        return node is not None and END in node
+
+    def __iter__(self):
+        return iter(self.complete(''))
+
+    def add(self, word: str) -> bool:
+        """Add a word; return False if it was already present."""
+        node = self.root
+        for c in word:
+            try:
+                node = node[c]
+            except KeyError:
+                node[c] = child = dict()
+                node = child
+        if END in node:
+            return False
+        node[END] = True
+        self.size += 1
+        return True
+
+    def discard(self, word: str) -> bool:
+        """Remove a word if present (pruning emptied branches); return whether it was."""
+        path = [self.root]
+        for c in word:
+            try:
+                path.append(path[-1][c])
+            except KeyError:
+                return False
+        node = path[-1]
+        if END not in node:
+            return False
+        del node[END]
+        self.size -= 1
+        for c, parent in zip(reversed(word), reversed(path[:-1])):
+            if parent[c]:
+                break
+            del parent[c]
+        return True
+
+    def clear(self):
+        self.root = dict()
+        self.size = 0
+
+    def complete(self, prefix: str, limit: int = None) -> list:
+        """Return members starting with prefix, in sorted order, at most limit of them."""
+        node = self._find(prefix)
+        if node is None:
+            return []
+        results = list()
+        stack = [(prefix, node)]
+        while stack:
+            word, node = stack.pop()
+            if END in node:
+                results.append(word)
+                if limit is not None and len(results) >= limit:
+                    break
+            # push in reverse so the smallest child is visited first
+            for c in sorted((c for c in node if c != END), reverse=True):
+                stack.append((word + c, node[c]))
+        return results
+
+    def _find(self, prefix: str):
+        node = self.root
+        for c in prefix:
+            try:
+                node = node[c]
+            except KeyError:
+                return None
+        return node
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saved views: named listings whose results are maintained incrementally
+"""
+
+import logging
+from math import inf
+from meek.dates import not_before_epoch
+from time import time
+
+logger = logging.getLogger(__name__)
+DATE_FIELDS = ('due', 'not_before', 'overdue')
+
+
+def is_true(value) -> bool:
+    """ Interpret a boolean filter argument given as a bool or a word. """
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ['true', 't', 'yes', 'y']
+
+
+class View:
+    """ A saved listing: its definition, compiled predicate, and current members. """
+
+    __slots__ = (
+        'name', 'command', 'base', 'kwargs', 'clauses', 'or_clauses', 'relative', 'day',
+        'horizon', 'expires', 'members')
+
+    def __init__(self, name: str, command: str, base: str, kwargs: dict):
+        self.name = name
+        self.command = command
+        self.base = base  # which listing the view materializes: "list" or "current"
+        self.kwargs = kwargs
+        self.clauses = None
+        self.or_clauses = None
+        self.relative = False  # depends on today's date or the current time
+        self.day = None  # the date the predicate was compiled on
+        self.horizon = None  # epoch bound of a not_before clause
+        self.expires = inf  # when the next hidden activity becomes visible
+        self.members = None  # None until first materialized
+
+    def asdict(self):
+        return {
+            'name': self.name,
+            'command': self.command,
+            'base': self.base,
+            'kwargs': self.kwargs
+        }
+
+
+class Views:
+    """ The saved views of a Manager, kept current as activities are (un)indexed. """
+
+    def __init__(self, manager):
+        self.manager = manager
+        self.views = dict()
+
+    def __len__(self):
+        return len(self.views)
+
+    def define(self, name: str, command: str, base: str, kwargs: dict) -> View:
+        """ Add or replace a view and materialize it. """
+        if base not in ['list', 'current']:
+            raise ValueError(f'base: {repr(base)}')
+        view = View(name, command, base, kwargs)
+        self._refresh(view)  # raises NotImplementedError for unsupported filters
+        self.views[name] = view
+        return view
+
+    def remove(self, name: str):
+        self.views.pop(name)
+
+    def run(self, name: str) -> list:
+        """ Return the members of a view, refreshing it only if it has gone stale. """
+        view = self.views[name]
+        if self._stale(view):
+            self._refresh(view)
+        return list(view.members)
+
+    def update(self, activity):
+        """ Re-evaluate one (re)indexed activity against every materialized view. """
+        for view in self.views.values():
+            if view.members is None:
+                continue
+            if self._match(view, activity):
+                view.members[activity] = True
+            else:
+                view.members.pop(activity, None)
+            self._watch(view, activity)
+
+    def discard(self, activity):
+        for view in self.views.values():
+            if view.members is not None:
+                view.members.pop(activity, None)
+
+    def reset(self):
+        """ Forget materialized results (e.g., after a purge); they rebuild on next use. """
+        for view in self.views.values():
+            view.members = None
+
+    def asdicts(self) -> list:
+        return [v.asdict() for v in self.views.values()]
+
+    def load(self, data: list):
+        """ Restore view definitions; each materializes when first run. """
+        for d in data:
+            self.views[d['name']] = View(d['name'], d['command'], d['base'], d['kwargs'])
+
+    def _stale(self, view) -> bool:
+        if view.members is None:
+            return True
+        if view.relative:
+            return view.day != self.manager._today() or time() >= view.expires
+        return False
+
+    def _refresh(self, view):
+        """ Compile the view's predicate for today and evaluate it over all activities. """
+        self._compile(view)
+        view.members = dict()  # insertion-ordered set
+        for a in self.manager.activities.values():
+            if self._match(view, a):
+                view.members[a] = True
+            self._watch(view, a)
+        logger.debug(f'materialized view "{view.name}" with {len(view.members)} members')
+
+    def _watch(self, view, activity):
+        """ Note when a hidden activity will come out from under a not_before bound. """
+        if view.horizon is not None and activity.not_before is not None:
+            e = not_before_epoch(activity.not_before)
+            if e > view.horizon and e < view.expires:
+                view.expires = e
+
+    def _match(self, view, activity) -> bool:
+        ridx = self.manager.reverse_index[activity.id]
+        for clause in view.clauses:
+            if not clause(activity, ridx):
+                return False
+        if view.or_clauses:
+            for clause in view.or_clauses:
+                if clause(activity, ridx):
+                    return True
+            return False
+        return True
+
+    def _compile(self, view):
+        """ Turn the view's listing kwargs into per-activity clauses, as _get_list would apply them. """
+        m = self.manager
+        kwargs = dict(view.kwargs)
+        if view.base == 'current':
+            m._current_kwargs(kwargs)
+        m._paginate(kwargs)  # presentation only
+        view.relative = False
+        view.horizon = None
+        view.expires = inf
+        view.day = m._today()
+        if not kwargs:
+            or_list = list()
+            not_before_today = True
+        else:
+            or_list, not_before_today = m._normalize_list_kwargs(kwargs)
+        clauses = list()
+        or_clauses = list()
+        if not_before_today:
+            clauses.append(self._clause(view, 'not_before', 'today'))
+        for k, argv in kwargs.items():
+            if k in ['sort', 'or']:
+                continue
+            clause = self._clause(view, k, argv)
+            if k in or_list:
+                or_clauses.append(clause)
+            else:
+                clauses.append(clause)
+        view.clauses = [c for c in clauses if c is not None]
+        view.or_clauses = [c for c in or_clauses if c is not None]
+        if len(view.or_clauses) < len(or_clauses):
+            view.or_clauses = list()  # an "any" alternative matches everything
+
+    def _clause(self, view, idxname, argv):
+        """ Build one predicate over (activity, reverse index entry), or None for "any". """
+        m = self.manager
+        if argv == 'any':
+            return None
+        if idxname in DATE_FIELDS:
+            view.relative = True
+        if idxname == 'not_before':
+            bound, epoch = m._not_before_bound(argv)
+            view.horizon = epoch
+
+            def clause(a, ridx):
+                keys = ridx['not_before']
+                return not keys or keys[0] <= bound
+            return clause
+        elif idxname in ['due', 'overdue']:
+            bounds = m._date_bounds(idxname, argv)
+            if bounds is None:
+                return lambda a, ridx: not ridx['due']
+            start, end = bounds
+            if idxname == 'due':
+                occurrences = m.occurrences
+
+                def clause(a, ridx):
+                    if ridx['due'] and start <= ridx['due'][0] <= end:
+                        return True
+                    return occurrences.occurs(a, start, end, view.day)
+                return clause
+            return lambda a, ridx: bool(ridx['due']) and ridx['due'][0] <= end
+        elif idxname == 'stalled':
+            stalled = is_true(argv)
+            return lambda a, ridx: (len(a.tasks) == 0) == stalled
+        if idxname not in m.indexes:
+            raise NotImplementedError(idxname)
+        filtervals = m._filter_values(argv)
+
+        def clause(a, ridx):
+            for fv in filtervals:
+                if fv is None:
+                    if getattr(a, idxname) is not None:
+                        return False
+                elif fv not in ridx[idxname]:
+                    return False
+            return True
+        return clause
@@ -4,12 +4,10 @@
 Command-line interface for meek
 """
 
-from re import A
 from airtight.cli import configure_commandline
-from meek.interpreter import Interpreter
-from meek.norm import norm
+from meek.interpreter import Interpreter, WHERE_DEFAULT
 import logging
-import shlex
+import sys
 
 
 logger = logging.getLogger(__name__)
@@ -24,39 +22,120 @@ OPTIONAL_ARGUMENTS = [
         False],
     ['-w', '--veryverbose', False,
         'very verbose output (logging level == DEBUG)', False],
+    ['-e', '--engine', 'dict',
+        'query engine: "dict" or "columnar" (requires numpy)', False],
+    ['-f', '--file', '',
+        'run commands from this file ("-" for standard input) instead of interactively',
+        False],
+    ['-j', '--json', False,
+        'non-interactive output as JSON lines (one record per command)', False],
+    ['-d', '--where', WHERE_DEFAULT,
+        'activity store used by non-interactive commands and the server', False],
+    ['-s', '--serve', False,
+        'run as a server on a Unix domain socket (use meekc.py to send commands)', False],
+    ['-k', '--socket', '',
+        'server socket path (default: $MEEK_SOCKET or a per-user path in $XDG_RUNTIME_DIR)',
+        False],
+    ['-i', '--idle', 30.0,
+        'server autosaves after this many idle seconds', False],
+    ['-c', '--concurrent', False,
+        'serve with asyncio: concurrent readers, serialized writers, per-client context',
+        False],
+    ['-t', '--stats-file', '',
+        'server appends timing statistics here as JSON lines when idle and on exit', False],
+    ['-r', '--remind', '',
+        'server sends reminders as due and not_before times arrive: "-" (standard output), '
+        '"fifo:PATH" or "command:COMMAND"', False],
+    ['-p', '--pager', False,
+        'page long listings through $PAGER (default "less -FRX")', False],
 ]
 POSITIONAL_ARGUMENTS = [
     # each row is a list with 3 elements: name, type, help
 ]
 
 
-def interact():
-    i = Interpreter()
+def show(result, pager: bool = False):
+    """Print a result string, or stream the rows of a listing (optionally to a pager)."""
+    if isinstance(result, str):
+        if result:
+            print(result)
+        return
+    if not pager:
+        for row in result:
+            print(row)
+        return
+    import os
+    import subprocess
+    command = os.environ.get('PAGER', 'less -FRX')
+    with subprocess.Popen(command, shell=True, stdin=subprocess.PIPE, text=True) as p:
+        try:
+            for row in result:
+                p.stdin.write(row + '\n')
+        except BrokenPipeError:
+            pass  # the reader quit the pager early
+        finally:
+            try:
+                p.stdin.close()
+            except BrokenPipeError:
+                pass
+
+
+def interact(engine='dict', pager=False):
+    import readline  # line editing and history for input()
+    from meek.completion import install
+    i = Interpreter(engine=engine)
+    i.manager.stream = True
+    install(i)
     while True:  # keep taking commands until something breaks us out to finish the program
         try:
-            s = norm(input('> '))
+            s = input('> ')
         except KeyboardInterrupt:
-            i.parse('quit')
-        while True:  # try to fix common errors and re-parse
-            parts = list()
-            try:
-                parts = shlex.split(s)
-            except ValueError as err:
-                msg = str(err)
-                if s[0:4] == 'new ':
-                    if s[4] == '"' and s[-1] == "'" and len([c for c in s[4:] if c == "'"]) % 2 == 0:
-                        foo = list(s)
-                        foo[-1] = '"'
-                        s = ''.join(foo)
-                else:
-                    logger.error(f'ValueError: {msg}')
-                    break  # need new input
-                continue  # try to split corrected string
-            if parts:
-                result = i.parse(parts)
-                if result:
-                    print(result)
+            s = 'quit'
+        try:
+            result = i.execute(s)
+        except ValueError as err:
+            logger.error(f'ValueError: {err}')
+            continue  # need new input
+        show(result, pager)
+
+
+def split_argv(argv: list):
+    """Separate command-line options from a trailing one-shot meek command."""
+    valued = {
+        flag for row in OPTIONAL_ARGUMENTS for flag in row[0:2]
+        if not isinstance(row[2], bool)}
+    i = 1
+    while i < len(argv):
+        arg = argv[i]
+        if not arg.startswith('-') or arg == '-':
             break
+        if arg in valued:
+            i += 1  # skip the option's value
+        i += 1
+    return argv[:i], argv[i:]
+
+
+def serve(**kwargs):
+    from meek.client import SOCKET_DEFAULT
+    import os
+    import signal
+    path = kwargs['socket'] or os.environ.get('MEEK_SOCKET', SOCKET_DEFAULT)
+    stats_file = kwargs['stats_file'] or None
+    remind = kwargs['remind'] or None
+    if kwargs['concurrent']:
+        import asyncio
+        from meek.aserver import AsyncServer
+        server = AsyncServer(
+            path, where=kwargs['where'], engine=kwargs['engine'], idle=float(kwargs['idle']),
+            stats_file=stats_file, remind=remind)
+        asyncio.run(server.serve(handle_signals=True))
+    else:
+        from meek.server import Server
+        signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # autosave on the way out
+        server = Server(
+            path, where=kwargs['where'], engine=kwargs['engine'], idle=float(kwargs['idle']),
+            stats_file=stats_file, remind=remind)
+        server.serve()
 
 
 def main(**kwargs):
@@ -64,9 +143,31 @@ def main(**kwargs):
     main function
     """
     # logger = logging.getLogger(sys._getframe().f_code.co_name)
-    interact()
+    if kwargs['serve']:
+        serve(**kwargs)
+        return
+    command = kwargs.get('command', [])
+    if not command and not kwargs['file'] and sys.stdin.isatty():
+        interact(engine=kwargs['engine'], pager=kwargs['pager'])
+        return
+    from meek.script import run_script
+    import shlex
+    if command:
+        lines = [shlex.join(command)]
+    elif kwargs['file'] in ['', '-']:
+        lines = sys.stdin
+    else:
+        try:
+            lines = open(kwargs['file'], 'r', encoding='utf-8')
+        except OSError as err:
+            logger.error(f'Cannot read command file: {err}')
+            sys.exit(2)
+    status = run_script(
+        lines, where=kwargs['where'], engine=kwargs['engine'], as_json=kwargs['json'])
+    sys.exit(status)
 
 
 if __name__ == "__main__":
+    sys.argv, command = split_argv(sys.argv)
     main(**configure_commandline(
-        OPTIONAL_ARGUMENTS, POSITIONAL_ARGUMENTS, DEFAULT_LOG_LEVEL))
+        OPTIONAL_ARGUMENTS, POSITIONAL_ARGUMENTS, DEFAULT_LOG_LEVEL), command=command)
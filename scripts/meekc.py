@@ -0,0 +1,11 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Thin command-line client for a running meek server (see cli.py --serve)
+"""
+
+from meek.client import main
+import sys
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -12,7 +12,7 @@ setuptools.setup(
     long_description=long_description,
     long_description_content_type="text/markdown",
     # {project-url}
-    packages=setuptools.find_packages(),
+    packages=setuptools.find_packages(exclude=['benchmarks', 'benchmarks.*', 'tests', 'tests.*']),
     classifiers=[
         "Programming Language :: Python :: 3.9.7",
         "License :: OSI Approved :: GNU Affero General Public License v3",
@@ -26,5 +26,9 @@ setuptools.setup(
         'tzlocal',
         'ujson'
     ],
+    extras_require={
+        'columnar': ['numpy'],
+        'zstd': ['zstandard']
+    },
     python_requires='>=3.9.7'
 )
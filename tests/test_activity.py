@@ -112,3 +112,55 @@ class Test_ActivityProject(TestCase):
         assert_false(a.project)
         a.project = True
         assert_true(a.project)
+
+
+class Test_ActivityHistory(TestCase):
+
+    def test_bounded(self):
+        a = Activity(title='test activity')
+        for i in range(0, a.history_limit * 2):
+            a.tags = f'tag{i}'
+        assert_equal(a.history_limit, len(a.history))
+        spill = a.history_spill
+        assert_equal(a.history_limit + 1, len(spill))
+        summary = a.history_summary
+        assert_equal(len(spill), summary['count'])
+        assert_equal(a.history_limit, summary['fields']['tags'])
+
+    def test_reload_compacts(self):
+        a = Activity(title='test activity')
+        for i in range(0, a.history_limit * 2):
+            a.tags = f'tag{i}'
+        d = a.asdict()
+        b = Activity(**d, mode='memorex')
+        assert_equal(a.history_limit, len(b.history))
+        assert_equal(0, len(b.history_spill))
+        assert_equal(d['history_summary'], b.history_summary)
+
+    def test_reset_history(self):
+        a = Activity(title='test activity', due='2067-10-20')
+        a.reset_history()
+        assert_equal(['title'], [e.field for e in a.history])
+        assert_equal(['due'], [e.field for e in a.history_spill])
+
+
+class Test_ActivityCompact(TestCase):
+
+    def test_slots(self):
+        a = Activity(title='test activity', tags=['home', 'work'])
+        assert_false(hasattr(a, '__dict__'))
+        assert_false(hasattr(a.history[0], '__dict__'))
+
+    def test_lazy(self):
+        a = Activity(mode='memorex', title='test activity')
+        assert_equal([], a.tags)
+        assert_equal(0, len(a.tasks))
+        assert_equal([], a.notes)
+        assert_equal([], a.history)
+
+    def test_event_roundtrip(self):
+        a = Activity(title='test activity')
+        d = a.asdict()
+        b = Activity(**d, mode='memorex')
+        assert_equal(d['history'], b.asdict()['history'])
+        assert_true(isinstance(b.history[0].epoch, int))
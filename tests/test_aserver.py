@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the asyncio meek server: sessions and reader/writer locking"""
+
+import asyncio
+import json
+import logging
+from meek.aserver import AsyncServer, RWLock
+from nose.tools import assert_equal, assert_false, assert_true
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import IsolatedAsyncioTestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Client:
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    async def send(self, command: str) -> dict:
+        self.writer.write(json.dumps({'command': command}).encode('utf-8') + b'\n')
+        await self.writer.drain()
+        return json.loads(await self.reader.readline())
+
+    def close(self):
+        self.writer.close()
+
+
+class Test_RWLock(IsolatedAsyncioTestCase):
+
+    async def test_readers_share_writers_exclude(self):
+        lock = RWLock()
+        log = list()
+
+        async def reader(n):
+            async with lock.read():
+                log.append(('start', n, lock.readers))
+                await asyncio.sleep(0.01)
+                log.append(('end', n))
+
+        async def writer():
+            async with lock.write():
+                assert_equal(0, lock.readers)
+                log.append(('write', lock.readers))
+
+        await asyncio.gather(reader(1), reader(2), writer(), reader(3))
+        # the first two readers overlap; the writer runs before the late reader
+        assert_equal(2, max(entry[2] for entry in log if entry[0] == 'start'))
+        kinds = [entry[0] for entry in log]
+        assert_true(kinds.index('write') < len(kinds) - 2)
+        assert_equal(('end', 3), log[-1])
+
+
+class Test_AsyncServer(IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.store = TemporaryDirectory()
+        self.run = TemporaryDirectory()
+        self.path = Path(self.run.name) / 'meek.sock'
+        self.server = AsyncServer(self.path, where=self.store.name, idle=60.0)
+        self.task = asyncio.create_task(self.server.serve())
+        while self.server.server is None:
+            await asyncio.sleep(0.01)
+
+    async def asyncTearDown(self):
+        if not self.task.done():
+            client = await self.connect()
+            await client.send('shutdown')
+            client.close()
+        await asyncio.wait_for(self.task, 5)
+        self.store.cleanup()
+        self.run.cleanup()
+
+    async def connect(self):
+        return Client(*await asyncio.open_unix_connection(str(self.path)))
+
+    async def test_sessions(self):
+        a = await self.connect()
+        b = await self.connect()
+        await a.send('new "walk dog" tags:pets')
+        await a.send('new "feed cat" tags:pets,cats')
+        assert_equal(2, len((await a.send('list'))['context']))
+        assert_equal(1, len((await b.send('cats'))['context']))
+        # each client keeps its own context
+        assert_true((await a.send('full 1'))['ok'])
+        assert_true('feed cat' in (await b.send('full 0'))['output'])
+        assert_equal(1, len((await b.send('full 0'))['context']))
+        assert_equal(2, len((await a.send('full 0'))['context']))
+        a.close()
+        b.close()
+
+    async def test_concurrent_readers(self):
+        setup = await self.connect()
+        for n in range(20):
+            await setup.send(f'new "task {n}"')
+        clients = [await self.connect() for n in range(8)]
+        records = await asyncio.gather(*[c.send('list') for c in clients])
+        assert_true(all(len(r['context']) == 20 for r in records))
+        for c in [setup] + clients:
+            c.close()
+
+    async def test_rollover_before_readers(self):
+        setup = await self.connect()
+        for n in range(20):
+            await setup.send(f'new "task {n}" due:today')
+        manager = self.server.interpreter.manager
+        rollover = manager.rollover
+        writing = list()
+
+        def locked(*args, **kwargs):
+            writing.append(self.server.lock.writing)
+            return rollover(*args, **kwargs)
+        manager.rollover = locked
+        manager.rollover_at = 0.0  # midnight has passed
+        clients = [await self.connect() for n in range(8)]
+        records = await asyncio.gather(*[c.send('list') for c in clients])
+        assert_true(all(len(r['context']) == 20 for r in records))
+        # once, holding the write lock, rather than by the readers
+        assert_equal([True], writing)
+        assert_true(manager.rollover_at > 0.0)
+        for c in [setup] + clients:
+            c.close()
+
+    async def test_shutdown_saves(self):
+        client = await self.connect()
+        await client.send('new "feed cat"')
+        assert_true((await client.send('shutdown'))['ok'])
+        client.close()
+        await asyncio.wait_for(self.task, 5)
+        assert_false(self.path.exists())
+        assert_equal(1, len(list((Path(self.store.name) / 'activities').iterdir())))
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the synthetic store generator used by the benchmarks"""
+
+from benchmarks.synthetic import generate, write_store
+import logging
+from meek.manager import Manager
+from nose.tools import assert_equal, assert_true
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Synthetic(TestCase):
+
+    def test_deterministic(self):
+        assert_equal(generate(200, seed=3), generate(200, seed=3))
+        assert_true(generate(200, seed=3) != generate(200, seed=4))
+
+    def test_load(self):
+        activities = generate(300)
+        with TemporaryDirectory() as d:
+            m = Manager()
+            m.load_activities(write_store(Path(d), activities))
+        assert_equal(300, len(m.activities))
+        projects = [a for a in m.activities.values() if a.project]
+        assert_equal(12, len(projects))
+        for p in projects:
+            for t in p.tasks:
+                assert_true(t in m.activities)
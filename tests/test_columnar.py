@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test parity of the columnar engine with the dict indexes"""
+
+import logging
+from meek.activity import Activity
+from meek.manager import Manager
+from nose.tools import assert_equal, assert_false, assert_true, raises
+from pathlib import Path
+from unittest import skipIf, TestCase
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+logger = logging.getLogger(__name__)
+test_data_path = Path('tests/data').resolve()
+
+TAGS = ['home', 'work', 'active', 'health']
+DUES = [None, 'today', 'tomorrow', 'yesterday', '2020-01-15', '2067-10-20']
+INTERVALS = ['none', 'day', 'week', 'month']
+QUERIES = [
+    {},
+    {'tags': 'home'},
+    {'tags': ['home', 'work']},
+    {'tags': 'nope'},
+    {'due': 'today'},
+    {'due': 'tomorrow'},
+    {'due': 'next quarter'},
+    {'due': 'none'},
+    {'overdue': 'today'},
+    {'overdue': '2067-10-20'},
+    {'complete': 'any'},
+    {'complete': 'true'},
+    {'interval': None},
+    {'interval': 'day'},
+    {'project': True},
+    {'not_before': 'any'},
+    {'not_before': 'any', 'complete': 'any'},
+    {'words': 'number'},
+    {'words': 'number', 'tags': 'work'},
+    {'overdue': 'today', 'tags': 'active', 'complete': False, 'interval': None, 'or': ['overdue', 'tags']},
+    {'overdue': 'today', 'words': '7', 'or': ['overdue', 'words']},
+]
+
+
+def populate(m):
+    for i in range(0, 36):
+        kwargs = {
+            'title': f'activity number {i}',
+            'tags': [TAGS[i % len(TAGS)], TAGS[(i * 3) % len(TAGS)]],
+            'interval': INTERVALS[i % len(INTERVALS)],
+            'project': i % 7 == 0
+        }
+        due = DUES[i % len(DUES)]
+        if due is not None:
+            kwargs['due'] = due
+        if i % 5 == 0:
+            kwargs['not_before'] = '2067-10-20'
+        elif i % 11 == 0:
+            kwargs['not_before'] = 'yesterday'
+        m.new_activity(**kwargs)
+    for i, a in enumerate(list(m.activities.values())):
+        if i % 4 == 0:
+            a.complete = True
+            m._index_activity(a)
+
+
+@skipIf(numpy is None, 'numpy is not installed')
+class Test_Parity(TestCase):
+
+    def setUp(self):
+        self.dict_manager = Manager()
+        self.columnar_manager = Manager(engine='columnar')
+        populate(self.dict_manager)
+        # give both managers equal (but distinct) activities
+        for a in self.dict_manager.activities.values():
+            self.columnar_manager.add_activity(Activity(**a.asdict(), mode='memorex'))
+
+    def check(self):
+        for q in QUERIES:
+            expected = self.dict_manager._get_list(**dict(q))
+            got = self.columnar_manager._get_list(**dict(q))
+            assert_equal(
+                sorted([a.id.hex for a in expected]),
+                sorted([a.id.hex for a in got]),
+                msg=repr(q))
+
+    def test_queries(self):
+        self.check()
+
+    def test_after_modify(self):
+        for m in [self.dict_manager, self.columnar_manager]:
+            m.list_activities(complete='any', not_before='any')
+            m.modify_activity(['0-9'], tags='-home', due='2067-10-20')
+        self.check()
+
+    def test_after_delete(self):
+        for m in [self.dict_manager, self.columnar_manager]:
+            m.list_activities(complete='any', not_before='any')
+            m.delete_activity(['3-12'])
+        assert_equal(len(self.dict_manager.activities), len(self.columnar_manager.store))
+        self.check()
+
+    def test_agenda(self):
+        expected = self.dict_manager.agenda(days=14, titles=50)
+        assert_true('↻ activity number' in expected)
+        assert_equal(expected, self.columnar_manager.agenda(days=14, titles=50))
+        assert_equal(self.dict_manager.agenda('next year'), self.columnar_manager.agenda('next year'))
+
+    def test_growth(self):
+        m = self.columnar_manager
+        capacity = m.store.capacity
+        for i in range(0, capacity):
+            m.new_activity(title=f'extra {i}', tags='home')
+        assert_true(m.store.capacity > capacity)
+        assert_equal(
+            len(m._filter_list(list(m.activities.values()), 'tags', 'home')),
+            len(m._get_list(tags='home', complete='any', not_before='any')))
+
+
+class Test_Engine(TestCase):
+
+    @raises(ValueError)
+    def test_unsupported(self):
+        Manager(engine='sqlite')
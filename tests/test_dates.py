@@ -6,7 +6,8 @@ from copy import copy
 import logging
 import math
 import maya
-from meek.dates import comprehend_date, iso_datestamp, tz
+from datetime import date
+from meek.dates import comprehend_date, iso_datestamp, period_bounds, tz
 from nose.tools import assert_equal, assert_false, assert_true, raises
 from pathlib import Path
 from pprint import pprint, pformat
@@ -263,3 +264,23 @@ class Test_Dates(TestCase):
             start_dt, end_dt = comprehend_date(q)
             assert_equal(expected[0], iso_datestamp(start_dt)),
             assert_equal(expected[1], iso_datestamp(end_dt))
+
+    def test_period_bounds(self):
+        today = date(2067, 11, 16)  # a Wednesday
+        cases = {
+            'this week': ('2067-11-14', '2067-11-18'),
+            'next week': ('2067-11-21', '2067-11-25'),
+            'last week': ('2067-11-07', '2067-11-11'),
+            'month': ('2067-11-01', '2067-11-30'),
+            'next month': ('2067-12-01', '2067-12-31'),
+            'next quarter': ('2068-01-01', '2068-03-31'),
+            'last quarter': ('2067-07-01', '2067-09-30'),
+            'this year': ('2067-01-01', '2067-12-31')
+        }
+        for q, expected in cases.items():
+            start, end = period_bounds(q, today)
+            assert_equal(expected, (start.isoformat(), end.isoformat()), msg=q)
+
+    @raises(ValueError)
+    def test_period_bounds_unknown(self):
+        period_bounds('fortnight', date(2067, 11, 16))
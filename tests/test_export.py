@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test markdown export: templates, nesting, and reading the export back with import"""
+
+import logging
+from meek.activity import Activity
+from meek.export import Template, parse_line
+from meek.interpreter import Interpreter
+from meek.manager import Manager, UsageError
+from nose.tools import assert_equal, assert_true, raises
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+RULE = 'FREQ=MONTHLY;BYSETPOS=-1;BYDAY=MO,FR'
+
+
+def summary(m: Manager) -> list:
+    """ Sorted (title, due, interval, tags, complete, project, task titles, notes) for every activity. """
+    result = list()
+    for a in m.activities.values():
+        tasks = sorted([m.activities[hexid].title for hexid in a.tasks])
+        notes = [text for text, when in a.notes]
+        result.append((a.title, a.due, a.interval, sorted(a.tags), a.complete, a.project, tasks, notes))
+    return sorted(result)
+
+
+class Test_Template(TestCase):
+
+    def test_render(self):
+        t = Template('* {title} (due:{due}) #{tags}')
+        assert_equal('* nap (due:2067-10-20)', t.render(Activity(title='nap', due='2067-10-20')))
+        assert_equal('* nap #home,rest', t.render(Activity(title='nap', tags=['rest', 'home'])))
+
+    @raises(ValueError)
+    def test_unknown_field(self):
+        Template('- {title} {owner}')
+
+    def test_parse_line(self):
+        kind, depth, fields = parse_line(
+            '    - [x] call "mom" due:2067-10-20 interval:"every other week" tags:family,"on hold"')
+        assert_equal(('activity', 2), (kind, depth))
+        assert_equal({
+            'title': 'call "mom"', 'due': '2067-10-20', 'interval': 'every other week',
+            'tags': ['family', 'on hold'], 'complete': True}, fields)
+        assert_equal(('note', 1, 'ring first'), parse_line('  > ring first'))
+        # a key given twice: the earlier one is part of the title
+        assert_equal(
+            {'title': 'fix due:soon', 'due': '2067-10-20'}, parse_line('- fix due:soon due:2067-10-20 ')[2])
+
+
+class Test_Export(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        m = self.m
+        m.new_activity(title='move house', due='2067-11-01', tags=['home'])
+        m.new_activity(title='pack books')
+        m.new_activity(title='book van', due='2067-10-25')
+        m.new_activity(title='timesheet', interval=RULE, due='2067-10-31', tags=['work', 'on hold'])
+        m.new_activity(title='buy milk')
+        m.list_activities(words=['house'])
+        m.add_note(0, 'ask about parking')
+        m.list_activities(words=['milk'])
+        m.complete_activity(['0'])
+        project = m.activities[m.indexes['words']['house'][0].id.hex]
+        project.project = True
+        project.add_tasks([m.indexes['words']['pack'][0], m.indexes['words']['van'][0]])
+        m._index_activity(project)
+
+    def test_round_trip(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out.md'
+            assert_equal(f'Exported 5 activities to {path}.', self.m.export_activities(path, notes=True))
+            text = path.read_text()
+            m = Manager()
+            m.import_activities(path)
+        assert_true(
+            '- [ ] move house due:2067-11-01 tags:home project:true\n  > ask about parking\n'
+            '  - [ ] book van due:2067-10-25\n  - [ ] pack books\n' in text)
+        assert_true('- [x] buy milk\n' in text)
+        assert_equal(summary(self.m), summary(m))
+
+    def test_empty_project(self):
+        self.m.list_activities(words=['timesheet'])
+        self.m.modify_activity(['0'], project=True)
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out.md'
+            self.m.export_activities(path, notes=True)
+            m = Manager()
+            m.import_activities(path)
+        a = m.indexes['words']['timesheet'][0]
+        assert_true(a.project)
+        assert_equal(0, len(a.tasks))
+        assert_equal(summary(self.m), summary(m))
+
+    def test_listing(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out.md'
+            self.m.export_activities(path, due='2067-10-31')
+            lines = path.read_text().splitlines()
+        assert_equal(['- [ ] timesheet due:2067-10-31 interval:' + RULE + ' tags:"on hold",work'], lines)
+
+    def test_verb(self):
+        i = Interpreter()
+        i.manager = self.m
+        with TemporaryDirectory() as tmp:
+            template = Path(tmp) / 'template.md'
+            template.write_text('{title} @{due}\n')
+            path = Path(tmp) / 'out.md'
+            i.parse(['export', str(path), 'tags:home', f'template:{template}'])
+            assert_equal('move house @2067-11-01\n  book van @2067-10-25\n  pack books\n', path.read_text())
+
+    def test_token_titles(self):
+        m = Manager()
+        titles = ['ask about tags:foo', 'has "quotes" due:x', 'due:soon', r'\tags:odd', 'mail to:bob']
+        for title in titles:
+            m.new_activity(title=title, due='2067-10-20')
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out.md'
+            m.export_activities(path)
+            text = path.read_text()
+            n = Manager()
+            n.import_activities(path)
+        assert_true('- [ ] ask about \\tags:foo due:2067-10-20\n' in text)
+        assert_equal(sorted(titles), sorted([a.title for a in n.activities.values()]))
+        assert_equal(['2067-10-20'] * 5, [a.due for a in n.activities.values()])
+
+    @raises(UsageError)
+    def test_bad_template(self):
+        with TemporaryDirectory() as tmp:
+            template = Path(tmp) / 'template.md'
+            template.write_text('- {nope}')
+            self.m.export_activities(Path(tmp) / 'out.md', template=template)
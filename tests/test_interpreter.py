@@ -2,9 +2,14 @@
 # -*- coding: utf-8 -*-
 """Python 3 tests template (changeme)"""
 
+from io import StringIO
+import json
 import logging
+from meek.interpreter import Interpreter, split_command
+from meek.script import run_script, EXIT_OK, EXIT_USAGE
 from nose.tools import assert_equal, assert_false, assert_true, raises
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 logger = logging.getLogger(__name__)
@@ -34,3 +39,65 @@ class Test_This(TestCase):
     def test_a(self):
         """Change me"""
         pass
+
+
+class Test_Script(TestCase):
+
+    def test_split_command(self):
+        assert_equal(['new', 'walk dog'], split_command('new "walk dog"'))
+        assert_equal(['new', "don't panic"], split_command('new "don\'t panic\''))
+
+    def test_execute(self):
+        i = Interpreter()
+        i.echo_errors = False
+        i.execute('new "walk dog" tags:pets')
+        assert_true('walk dog' in i.execute('list'))
+        i.execute('bogus')
+        assert_equal(['Unrecognized verb "bogus"'], i.errors)
+
+    def test_notes(self):
+        i = Interpreter()
+        i.echo_errors = False
+        i.execute('new "walk dog"')
+        i.execute('list')
+        i.execute('notes 0 add use the long leash')
+        assert_true(i.execute('notes 0 list').endswith(': use the long leash'))
+        assert_equal([], i.errors)
+
+    def test_run_script(self):
+        with TemporaryDirectory() as temp:
+            out = StringIO()
+            status = run_script(
+                ['new "walk dog" tags:pets', '# a comment', '', 'new "feed cat"'],
+                where=temp, out=out)
+            assert_equal(EXIT_OK, status)
+            assert_equal(2, len(list((Path(temp) / 'activities').iterdir())))
+            out = StringIO()
+            status = run_script(['list', 'modify 9 due:today'], where=temp, as_json=True, out=out)
+            assert_equal(EXIT_USAGE, status)
+            records = [json.loads(line) for line in out.getvalue().splitlines()]
+            assert_equal(2, len(records))
+            assert_true(records[0]['ok'])
+            assert_equal(2, len(records[0]['context']))
+            assert_false(records[1]['ok'])
+
+
+class Test_Diagnostics(TestCase):
+
+    def setUp(self):
+        self.i = Interpreter()
+        self.i.echo_errors = False
+        self.i.execute('new "walk dog" tags:pets')
+        self.i.execute('new "feed cat" tags:pets')
+
+    def test_explain(self):
+        report = self.i.execute('explain list tags:pets')
+        assert_true('explain: list tags:pets' in report)
+        assert_true('tags key lookup' in report)
+        self.i.execute('explain help')
+        assert_equal(1, len(self.i.errors))
+
+    def test_profile(self):
+        report = self.i.execute('profile list tags:pets')
+        assert_true('walk dog' in report)
+        assert_true('function calls' in report)
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test JSON Lines export and import, compressed or not, serial or in parallel"""
+
+import logging
+from meek.interpreter import Interpreter
+from meek.jsonl import compression, zstandard
+from meek.manager import Manager, UsageError
+from nose.tools import assert_equal, assert_true, raises
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase, skipIf
+
+logger = logging.getLogger(__name__)
+
+
+def dump(m: Manager) -> dict:
+    return {k: a.asdict() for k, a in m.activities.items()}
+
+
+class Test_JSONL(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        m = self.m
+        m.new_activity(title='café run', due='2067-10-20', tags=['errand', 'food'])
+        m.new_activity(title='timesheet', interval='FREQ=MONTHLY;BYSETPOS=-1;BYDAY=MO,FR', due='2067-10-31')
+        m.new_activity(title='read', not_before='2067-11-01')
+        m.list_activities(words=['café'])
+        m.add_note(0, 'the one on the corner')
+
+    def round_trip(self, name: str, workers: int = 1):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / name
+            assert_equal(f'Exported 3 activities to {path}.', self.m.export_jsonl(path))
+            assert_equal([], [p.name for p in Path(tmp).iterdir() if p != path])
+            m = Manager()
+            assert_equal(f'Imported 3 activities from {path} (0 replaced).', m.import_jsonl(path, workers))
+        assert_equal(dump(self.m), dump(m))
+        assert_true('café run' in m.list_activities(tags='errand', due='2067-10-20'))
+        return m
+
+    def test_plain(self):
+        self.round_trip('store.jsonl')
+
+    def test_gzip(self):
+        assert_equal('gzip', compression('store.jsonl.gz'))
+        self.round_trip('store.jsonl.gz')
+
+    @skipIf(zstandard is None, 'zstandard is not installed')
+    def test_zstd(self):
+        self.round_trip('store.jsonl.zst')
+
+    def test_workers(self):
+        self.round_trip('store.jsonl', workers=2)
+
+    def test_replace(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'store.jsonl'
+            self.m.export_jsonl(path)
+            self.m.list_activities(words=['read'])
+            self.m.modify_activity(['0'], title='read a book')
+            assert_equal(f'Imported 3 activities from {path} (3 replaced).', self.m.import_jsonl(path))
+        assert_equal(3, len(self.m.activities))
+        assert_equal(1, len(self.m.list_activities(words='read', not_before='any').splitlines()))
+        assert_equal('', self.m.list_activities(words='book', not_before='any'))
+
+    @raises(UsageError)
+    def test_bad_line(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'store.jsonl'
+            path.write_text('{"title": "fine"}\n{"title": \n')
+            Manager().import_jsonl(path)
+
+    def test_not_an_object(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'store.jsonl'
+            path.write_text('{"title": "fine"}\n[1, 2]\n')
+            with self.assertRaises(UsageError):
+                self.m.import_jsonl(path)
+        # nothing from a bad file is added
+        assert_equal(3, len(self.m.activities))
+        assert_equal('', self.m.list_activities(words='fine', not_before='any'))
+
+    def test_verbs(self):
+        i = Interpreter()
+        i.manager = self.m
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'store.jsonl.gz'
+            i.parse(['export', 'jsonl', str(path)])
+            j = Interpreter()
+            assert_true(j.parse(['import', 'jsonl', str(path), 'workers:1']).startswith('Imported 3'))
+        assert_equal(dump(self.m), dump(j.manager))
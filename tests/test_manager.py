@@ -2,10 +2,14 @@
 # -*- coding: utf-8 -*-
 """Python 3 tests template (changeme)"""
 
+from datetime import date, timedelta
+import json
 import logging
-from meek.manager import Manager
+from meek.dates import quick_datestamp
+from meek.manager import Manager, UsageError
 from nose.tools import assert_equal, assert_false, assert_true, raises
 from pathlib import Path
+from tempfile import TemporaryDirectory
 from unittest import TestCase
 
 logger = logging.getLogger(__name__)
@@ -80,3 +84,368 @@ class Test_Activity(TestCase):
         m.list_activities()  # put activity in context
         m.modify_activity('0', project=False)
         assert_false(a.project)
+
+
+class Test_History(TestCase):
+
+    def test_archive(self):
+        m = Manager()
+        m.new_activity(title='test activity')
+        a = list(m.activities.values())[0]
+        for i in range(0, a.history_limit + 5):
+            a.tags = f'tag{i}'
+        spilled = len(a.history_spill)
+        with TemporaryDirectory() as where:
+            m.save_activities(Path(where))
+            assert_equal(0, len(a.history_spill))
+            events = m.archived_history(a)
+            assert_equal(spilled, len(events))
+            m.save_activities(Path(where))
+            assert_equal(spilled, len(m.archived_history(a)))
+
+
+class Test_Save(TestCase):
+
+    def test_incremental(self):
+        m = Manager()
+        for i in range(0, 3):
+            m.new_activity(title=f'test activity {i}')
+        with TemporaryDirectory() as where:
+            where = Path(where)
+            assert_equal(f'Wrote 3 JSON files at {where}.', m.save_activities(where))
+            assert_equal(f'Wrote 0 JSON files at {where} (3 unchanged).', m.save_activities(where))
+            m.list_activities()
+            m.modify_activity(['0'], tags='home')
+            m.delete_activity(['1'])
+            assert_equal(f'Wrote 1 JSON files at {where} (1 unchanged).', m.save_activities(where))
+            assert_equal(2, len(list((where / 'activities').iterdir())))
+            n = Manager()
+            n.load_activities(where)
+            assert_equal(
+                sorted([a.asdict()['title'] for a in m.activities.values()]),
+                sorted([a.asdict()['title'] for a in n.activities.values()]))
+            assert_false(any([a.dirty for a in n.activities.values()]))
+
+    def test_backup_kept(self):
+        # incremental saves add to the backup, so an earlier change can still be undone
+        m = Manager()
+        for i in range(0, 3):
+            m.new_activity(title=f'test activity {i}')
+        with TemporaryDirectory() as where:
+            where = Path(where)
+            m.save_activities(where)
+            m.list_activities()
+            ids = [a.id.hex for a in m.current]
+            m.modify_activity(['0'], title='first change')
+            m.save_activities(where)
+            m.list_activities(words=['activity'])
+            m.modify_activity(['0'], title='second change')
+            m.save_activities(where)
+            backup = where / '.bak' / 'activities'
+            titles = [json.loads((backup / f'{aid}.json').read_text())['title'] for aid in ids[0:2]]
+            assert_equal(['test activity 0', 'test activity 1'], titles)
+            assert_false((backup / f'{ids[2]}.json').exists())
+            # a full save starts the backup afresh with the whole store as it was
+            m.save_activities(where / 'elsewhere')
+            m.save_activities(where)
+            assert_equal(3, len(list(backup.iterdir())))
+
+    def test_load_another_store(self):
+        # activities kept from a first store must be written when saving to a second
+        with TemporaryDirectory() as tmp:
+            for name in ['a', 'b']:
+                m = Manager()
+                m.new_activity(title=f'from {name}')
+                m.save_activities(Path(tmp) / name)
+            m = Manager()
+            m.load_activities(Path(tmp) / 'a')
+            m.load_activities(Path(tmp) / 'b')
+            assert_equal(f'Wrote 2 JSON files at {Path(tmp) / "b"}.', m.save_activities(Path(tmp) / 'b'))
+            n = Manager()
+            n.load_activities(Path(tmp) / 'b')
+            assert_equal(['from a', 'from b'], sorted([a.title for a in n.activities.values()]))
+            assert_equal(f'Wrote 0 JSON files at {Path(tmp) / "b"} (2 unchanged).', n.save_activities(Path(tmp) / 'b'))
+
+    def test_cached_asdict(self):
+        m = Manager()
+        m.new_activity(title='test activity')
+        a = list(m.activities.values())[0]
+        d = a.asdict()
+        assert_true(d is a.asdict())
+        a.tags = 'home'
+        assert_equal(['home'], a.asdict()['tags'])
+
+
+class Test_Batch(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        for i in range(0, 3):
+            self.m.new_activity(title=f'test activity {i}')
+        self.m.list_activities()
+
+    def test_one_event(self):
+        m = self.m
+        before = {a.id: len(a.history) for a in m.activities.values()}
+        m.modify_activity(['0-2'], tags=['home', 'work'], due='2067-10-20')
+        for a in m.activities.values():
+            events = a.history[before[a.id]:]
+            assert_equal(['tags', 'due'], [e.field for e in events])
+            assert_equal(1, len(set([e.epoch for e in events])))
+            # reset keeps the tags event but retires the due one
+            a.reset_history()
+            assert_equal('tags', a.history[-1].field)
+            assert_equal({'due': 1}, a.history_summary['fields'])
+        assert_equal(3, len(m.indexes['tags']['home']))
+        assert_equal(3, len(m.indexes['due']['2067-10-20']))
+
+    def test_rollback(self):
+        m = self.m
+        snapshots = {a.id: a.asdict() for a in m.activities.values()}
+        with self.assertRaises(ValueError):
+            with m.batch() as b:
+                for a in m.current:
+                    b.modify(a, tags='home')
+                b.modify(a, interval='fortnightly')
+        for a in m.activities.values():
+            assert_equal(snapshots[a.id], a.asdict())
+            assert_equal('live', a.mode)
+        assert_true('home' not in m.indexes['tags'])
+
+    def test_usage_error_rollback(self):
+        m = self.m
+        with self.assertRaises(UsageError):
+            m.modify_activity(['0-2'], tags='home', interval='fortnightly')
+        assert_true('home' not in m.indexes['tags'])
+        assert_true(all(['home' not in a.tags for a in m.activities.values()]))
+
+
+class Test_Pagination(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        for i in range(0, 50):
+            self.m.new_activity(title=f'task {i:02}', due=f'2067-10-{(i % 28) + 1:02}')
+        self.everything = self.m.list_activities().splitlines()
+
+    def test_limit(self):
+        rows = self.m.list_activities(limit='5').splitlines()
+        assert_equal(self.everything[0:5], rows[0:5])
+        assert_true(rows[5].startswith('(0-4 of 50 shown;'))
+        assert_equal(5, len(self.m.current))
+
+    def test_page(self):
+        rows = self.m.list_activities(page='3', limit='10').splitlines()
+        assert_equal(self.everything[20:30], rows[0:10])
+        # earlier pages stay addressable in the numbered context
+        assert_equal(30, len(self.m.current))
+        assert_equal(self.m.current[25].title, rows[5].split('"')[1])
+        rows = self.m.list_activities(page='5', limit='10').splitlines()
+        assert_equal(self.everything[40:50], rows)
+
+    def test_stream(self):
+        self.m.stream = True
+        rows = self.m.list_activities(limit='3')
+        assert_false(isinstance(rows, str))
+        assert_equal(self.everything[0:3], list(rows)[0:3])
+
+    @raises(UsageError)
+    def test_bad_limit(self):
+        self.m.list_activities(limit='many')
+
+
+class Test_Sort(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        self.m.new_activity(title='banana', due='2067-10-03')
+        self.m.new_activity(title='Apple')
+        self.m.new_activity(title='cherry', due='2067-10-01')
+        self.m.new_activity(title='apricot', due='2067-10-03')
+
+    def titles(self, **kwargs):
+        self.m.list_activities(**kwargs)
+        return [a.title for a in self.m.current]
+
+    def test_default(self):
+        # missing due dates sort last, titles compare case-insensitively
+        assert_equal(['cherry', 'apricot', 'banana', 'Apple'], self.titles())
+
+    def test_descending(self):
+        assert_equal(['apricot', 'banana', 'cherry', 'Apple'], self.titles(sort='-due'))
+        assert_equal(
+            ['apricot', 'banana', 'cherry', 'Apple'], self.titles(sort=['-due', 'title']))
+        assert_equal(['cherry', 'banana', 'apricot', 'Apple'], self.titles(sort='-title'))
+
+    def test_other_field(self):
+        assert_equal(['Apple', 'apricot', 'banana', 'cherry'], self.titles(sort='title'))
+        assert_equal(['Apple', 'apricot'], self.titles(sort='title', limit='2'))
+
+    def test_keys_follow_changes(self):
+        self.m.list_activities()
+        self.m.modify_activity(['3'], due='2067-09-01')
+        assert_equal('Apple', self.titles()[0])
+
+    @raises(UsageError)
+    def test_unknown_field(self):
+        self.m.list_activities(sort='flavor')
+
+
+class Test_Views(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        self.m.new_activity(title='walk dog', tags=['errand'], due='2067-10-03')
+        self.m.new_activity(title='buy milk', tags=['errand'])
+        self.m.new_activity(title='plan trip', project=True)
+        self.m.new_activity(title='sleep', tags=['home'])
+
+    def define(self, name, base, **kwargs):
+        with self.m.capturing() as captured:
+            if base == 'list':
+                self.m.list_activities(**kwargs)
+            else:
+                self.m.list_current(**kwargs)
+        self.m.save_view(name, name, captured)
+
+    def assert_parity(self, name, **kwargs):
+        expected = self.m.list_activities(**kwargs)
+        assert_equal(expected, self.m.run_view(name))
+
+    def test_incremental(self):
+        self.define('errands', 'list', tags='errand')
+        self.define('stuck', 'list', project=True, stalled='true')
+        self.define('dated', 'list', overdue='2067-10-31')
+        self.assert_parity('errands', tags='errand')
+        self.assert_parity('stuck', project=True, stalled='true')
+        self.m.new_activity(title='post letter', tags=['errand'], due='2067-10-05')
+        self.assert_parity('errands', tags='errand')
+        self.assert_parity('dated', overdue='2067-10-31')
+        self.m.modify_activity(['0'], tags='-errand')
+        self.assert_parity('errands', tags='errand')
+        self.m.delete_activity(['1'])
+        self.assert_parity('errands', tags='errand')
+        self.assert_parity('dated', overdue='2067-10-31')
+
+    def test_refresh(self):
+        self.define('errands', 'list', tags='errand')
+        view = self.m.views.views['errands']
+        view.day = '2000-01-01'  # as if the date had rolled over
+        self.m.views.run('errands')
+        assert_true(view.day > '2000-01-01')
+
+    def test_stalled(self):
+        projects = self.m.list_activities(project=True, stalled='true')
+        assert_true('plan trip' in projects)
+
+    def test_persistence(self):
+        self.define('errands', 'list', tags='errand')
+        with TemporaryDirectory() as temp:
+            where = Path(temp)
+            self.m.save_activities(where)
+            m = Manager()
+            m.load_activities(where)
+            assert_equal(['errands'], list(m.views.views.keys()))
+            assert_equal(self.m.run_view('errands'), m.run_view('errands'))
+
+    @raises(UsageError)
+    def test_missing(self):
+        self.m.run_view('nope')
+
+
+class Test_QueryCache(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        self.m.new_activity(title='walk dog', tags=['errand'], due='2067-10-03')
+        self.m.new_activity(title='buy milk', tags=['errand'], due='2067-10-04')
+        self.m.new_activity(title='sleep', tags=['home'])
+
+    def test_hit(self):
+        first = self.m.list_activities(tags='errand')
+        assert_equal(first, self.m.list_activities(tags='errand'))
+        assert_equal(1, self.m.query_cache.hits)
+
+    def test_fine_grained(self):
+        self.m.list_activities(overdue='2067-10-31')
+        self.m.list_activities(tags='errand')
+        self.m.list_activities(words='milk')
+        self.m.modify_activity(['0'], tags=['errand', 'urgent'])
+        # a tag change leaves date-only queries cached
+        self.m.list_activities(overdue='2067-10-31')
+        assert_equal(1, self.m.query_cache.hits)
+        self.m.list_activities(tags='errand')
+        assert_equal(1, self.m.query_cache.hits)
+        assert_equal(1, self.m.query_cache.stale)
+
+    def test_results_follow_changes(self):
+        before = self.m.list_activities(tags='errand')
+        self.m.new_activity(title='post letter', tags=['errand'])
+        after = self.m.list_activities(tags='errand')
+        assert_true('post letter' in after)
+        self.m.list_activities(overdue='2067-10-31')
+        self.m.complete_activity(['0'])
+        assert_equal(1, len(self.m.list_activities(overdue='2067-10-31').splitlines()))
+
+    def test_not_before_expiry(self):
+        from time import time
+        soon = time() + 3600
+        self.m.new_activity(title='later', not_before='2067-01-01')
+        depends_on, expires = self.m._query_dependencies({}, True)
+        assert_true('not_before' in depends_on)
+        assert_true(expires > soon)
+
+
+class Test_Explain(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        self.m.new_activity(title='walk dog', tags=['errand'], due='2067-10-03')
+        self.m.new_activity(title='buy milk', tags=['errand'], due='2067-10-04')
+        self.m.new_activity(title='sleep', tags=['home'])
+
+    def test_steps(self):
+        with self.m.tracing() as trace:
+            self.m._get_list(tags='errand')
+        assert_equal(
+            ["not_before='today'", "tags='errand'", 'complete=False'], [s['step'] for s in trace])
+        assert_equal([3, 3, 2], [s['in'] for s in trace])
+        assert_equal([3, 2, 2], [s['out'] for s in trace])
+        assert_equal('tags key lookup', trace[1]['index'])
+        assert_true(self.m.trace is None)
+
+    def test_explain(self):
+        self.m.list_activities(tags='home')
+        self.m.list_activities(tags='errand')
+        context = list(self.m.current)
+        report = self.m.explain('list tags:home', 'list', {'tags': 'home'})
+        assert_true('query cache: hit' in report)
+        assert_true('filter total' in report)
+        assert_equal(context, self.m.current)  # explain leaves the context alone
+
+
+class Test_Agenda(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        self.today = date.fromisoformat(quick_datestamp('today'))
+        for i in range(0, 5):
+            self.m.new_activity(title=f'task {i}', due=(self.today + timedelta(days=1)).isoformat())
+        self.m.new_activity(title='finished', due=(self.today + timedelta(days=1)).isoformat())
+        self.m.new_activity(title='water plants', due=self.today.isoformat(), interval='week')
+        self.m.list_activities(words='finished')
+        self.m.complete_activity(['0'])
+
+    def test_days(self):
+        lines = self.m.agenda(days=8, titles=2).splitlines()
+        assert_true(lines[0].endswith('6 due, 1 recurring'))
+        monday = self.today - timedelta(days=self.today.weekday())
+        assert_true(lines[2].startswith(monday.isoformat()))  # the calendar
+        tomorrow = [l for l in lines if f' {(self.today + timedelta(days=1)).isoformat()} ' in l]
+        assert_equal(1, len(tomorrow))
+        assert_true(tomorrow[0].endswith('   5  task 0; task 1; (+3 more)'))
+        assert_true(lines[-1].endswith('1  ↻ water plants'))
+
+    @raises(UsageError)
+    def test_bad_period(self):
+        self.m.agenda('fortnight')
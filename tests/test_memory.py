@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test memory accounting"""
+
+import logging
+from meek.activity import Activity
+from meek.interpreter import Interpreter
+from meek.manager import Manager
+from meek.memory import Footprint, deep_sizeof, format_bytes, mapping_sizeof
+from nose.tools import assert_equal, assert_true
+from sys import getsizeof
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Sizes(TestCase):
+
+    def test_deep_sizeof(self):
+        s = 'x' * 1000
+        assert_equal(getsizeof([]), deep_sizeof([]))
+        # a shared object counts once
+        assert_equal(getsizeof([s, s]) + getsizeof(s), deep_sizeof([s, s]))
+        # activities referenced from an index are not counted
+        a = Activity(title='walk dog')
+        assert_equal(getsizeof([a]), deep_sizeof([a]))
+        assert_true(deep_sizeof(a, stop=()) > getsizeof(a))
+
+    def test_sampled(self):
+        d = {f'key {i}': [f'value {i}'] for i in range(0, 5000)}
+        exact = deep_sizeof(d)
+        estimate = mapping_sizeof(d, k=500)
+        assert_true(abs(estimate - exact) / exact < 0.05)
+
+    def test_format(self):
+        assert_equal('512 B', format_bytes(512))
+        assert_equal('1.5 KiB', format_bytes(1536))
+
+
+class Test_Footprint(TestCase):
+
+    def test_footprint(self):
+        m = Manager()
+        for i in range(0, 50):
+            m.new_activity(title=f'activity {i}', tags=['errand'])
+        m.modify_activity(['0'], tags=['errand', 'home'], title='busy')
+        f = Footprint(m, top=3)
+        assert_true(f.sizes['activities'] > f.sizes['activities.history'] > 0)
+        assert_true(f.sizes['indexes.tags'] > 0)
+        assert_equal('busy', f.top[0][2].title)
+        assert_true('largest histories' in f.report())
+
+    def test_verb(self):
+        i = Interpreter()
+        i.echo_errors = False
+        i.execute('new "walk dog"')
+        assert_true('reverse_index' in i.execute('memory top:1 sample:10'))
+        i.execute('memory top:lots')
+        assert_equal(1, len(i.errors))
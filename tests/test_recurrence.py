@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test recurrence rules and the occurrence index"""
+
+from datetime import date, timedelta
+from itertools import islice
+import logging
+from meek.activity import Activity
+from meek.dates import quick_datestamp
+from meek.manager import Manager
+from meek.recurrence import OccurrenceIndex, Rule, next_due, parse_rule, upcoming
+from nose.tools import assert_equal, assert_false, assert_true, raises
+import threading
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+def dates(rule, anchor, n=4):
+    return [d.isoformat() for d in islice(parse_rule(rule).occurrences(date.fromisoformat(anchor)), n)]
+
+
+def days_from_today(n):
+    return (date.fromisoformat(quick_datestamp('today')) + timedelta(days=n)).isoformat()
+
+
+class Test_Rule(TestCase):
+
+    def test_named(self):
+        # 2067-10-07 is a Friday
+        assert_equal('2067-10-10', next_due('workday', '2067-10-07'))
+        assert_equal('2067-10-21', next_due('biweekly', '2067-10-07'))
+        assert_equal('2068-02-29', next_due('quarter', '2067-11-30'))
+        assert_equal(['2067-01-31', '2067-02-28', '2067-03-31'], dates('month', '2067-01-31', 3))
+
+    def test_rules(self):
+        assert_equal(
+            ['2067-10-11', '2067-11-08', '2067-12-13'], dates('FREQ=MONTHLY;BYDAY=2TU', '2067-10-01', 3))
+        assert_equal(
+            ['2067-10-31', '2067-11-30', '2067-12-30'],
+            dates('FREQ=MONTHLY;BYDAY=MO,TU,WE,TH,FR;BYSETPOS=-1', '2067-10-01', 3))
+        # every other week counts from the week of the anchor (a Saturday)
+        assert_equal(
+            ['2067-10-17', '2067-10-19', '2067-10-31'],
+            dates('FREQ=WEEKLY;INTERVAL=2;BYDAY=MO,WE', '2067-10-08', 3))
+        assert_equal(['2067-11-24', '2068-11-22'], dates('FREQ=YEARLY;BYMONTH=11;BYDAY=4TH', '2067-01-01', 2))
+        assert_equal(['2067-02-28', '2067-03-31'], dates('FREQ=MONTHLY;BYMONTHDAY=-1', '2067-02-01', 2))
+
+    def test_canonical(self):
+        assert_equal('FREQ=MONTHLY;BYDAY=-1FR', Rule('freq=monthly;byday=-1fr;').text)
+
+    @raises(ValueError)
+    def test_ordinal_needs_month(self):
+        Rule('FREQ=WEEKLY;BYDAY=2TU')
+
+    @raises(ValueError)
+    def test_unsupported(self):
+        Rule('FREQ=HOURLY')
+
+    def test_upcoming(self):
+        assert_equal(['2067-10-14', '2067-10-21'], upcoming('week', '2067-10-07', 2))
+
+
+class Test_Activity(TestCase):
+
+    def test_rule_interval(self):
+        a = Activity(title='timesheet', interval=['FREQ=MONTHLY;BYDAY=MO', 'FR;BYSETPOS=-1'])
+        assert_equal('FREQ=MONTHLY;BYSETPOS=-1;BYDAY=MO,FR', a.interval)
+
+    @raises(ValueError)
+    def test_bad_interval(self):
+        Activity(title='timesheet', interval='fortnightly')
+
+    def test_complete_workday(self):
+        a = Activity(title='standup', interval='workday', due='today')
+        a.complete = True
+        assert_false(a.complete)
+        expected = date.fromisoformat(quick_datestamp('today')) + timedelta(days=1)
+        while expected.weekday() > 4:
+            expected += timedelta(days=1)
+        assert_equal(expected.isoformat(), a.due)
+
+
+class Test_OccurrenceIndex(TestCase):
+
+    def test_sliding(self):
+        idx = OccurrenceIndex(horizon=10)
+        a = Activity(title='water plants', interval='week', due='2067-10-03')
+        idx.update(a)
+        assert_equal(['2067-10-10'], [d for d, x in idx.schedule('2067-10-01', '2067-10-13', '2067-10-01')])
+        # queries past the horizon extend it
+        assert_equal([a], idx.between('2067-10-30', '2067-10-31', '2067-10-01'))
+        # days slide out of the window as time passes
+        idx.between('2067-10-20', '2067-10-20', '2067-10-18')
+        assert_true('2067-10-10' not in idx.days)
+        assert_true(idx.occurs(a, '2067-10-24', '2067-10-24', '2067-10-18'))
+        a.complete = False
+        a.interval = 'none'
+        idx.update(a)
+        assert_equal([], idx.between('2067-10-01', '2067-12-31', '2067-10-18'))
+        assert_equal(0, len(idx))
+
+    def test_concurrent_readers(self):
+        # readers expand the index lazily, so they must not trip over each other
+        idx = OccurrenceIndex(horizon=10)
+        for n in range(200):
+            idx.update(Activity(title=f'chore {n}', interval='day', due='2067-10-01'))
+        errors = list()
+
+        def read(k):
+            try:
+                for days in range(10, 60, 3):
+                    end = (date(2067, 10, 1) + timedelta(days=days + k)).isoformat()
+                    idx.by_day('2067-10-01', end, '2067-10-01')
+            except Exception as err:
+                errors.append(err)
+        threads = [threading.Thread(target=read, args=(k, )) for k in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        assert_equal([], errors)
+        assert_equal(200, len(idx.between('2067-11-20', '2067-11-20', '2067-10-01')))
+
+
+class Test_Manager(TestCase):
+
+    def test_due_includes_occurrences(self):
+        m = Manager()
+        m.new_activity(title='water plants', interval='week', due=days_from_today(1))
+        m.new_activity(title='buy milk', due=days_from_today(1))
+        assert_equal(2, len(m.list_activities(due=days_from_today(1)).splitlines()))
+        assert_true('water plants' in m.list_activities(due=days_from_today(8)))
+        assert_false('buy milk' in m.list_activities(due=days_from_today(8)))
+        assert_equal(2, m.show_occurrences(days=8).count('water plants'))
+        # the cached answer follows a change of interval
+        m.modify_activity(['0'], interval='none')
+        assert_equal('', m.list_activities(due=days_from_today(8)))
+        assert_true(m.show_occurrences().startswith('Nothing recurs'))
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the reminder heap, its timer thread, and its sinks"""
+
+from io import StringIO
+import logging
+from meek.dates import not_before_epoch
+from meek.manager import Manager
+from meek.reminders import CommandSink, FifoSink, Reminders, StreamSink, sink_for
+from nose.tools import assert_equal, assert_true, raises
+import os
+from pathlib import Path
+import sys
+from tempfile import TemporaryDirectory
+import threading
+from time import time
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+DUE = not_before_epoch('2067-10-20')
+
+
+class Clock:
+
+    def __init__(self, now: float):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class Test_Reminders(TestCase):
+
+    def setUp(self):
+        self.clock = Clock(DUE - 2 * 86400)
+        self.fired = list()
+        self.reminders = Reminders(self.fired.append, clock=self.clock)
+        self.m = Manager()
+        self.m.new_activity(title='later', due='2067-10-22')
+        self.m.new_activity(title='sooner', due='2067-10-20', not_before='2067-10-19')
+        self.m.new_activity(title='past', due='2020-01-01')
+        self.m.remind(self.reminders)
+
+    def test_order(self):
+        assert_equal(3, len(self.reminders))
+        upcoming = self.reminders.upcoming(10)
+        assert_equal(
+            [('not_before', 'sooner'), ('due', 'sooner'), ('due', 'later')],
+            [(r.kind, r.activity.title) for r in upcoming])
+        assert_equal(upcoming[0].when, self.reminders.next_time())
+        assert_equal([], self.reminders.fire())
+        self.clock.now = DUE
+        assert_equal(['not_before', 'due'], [r.kind for r in self.reminders.fire()])
+        assert_equal(2, len(self.fired))
+        assert_equal(1, len(self.reminders))
+
+    def test_changes(self):
+        self.m.list_activities(words='sooner', not_before='any')
+        self.m.modify_activity(['0'], due='2067-11-01')
+        self.m.list_activities(words='later')
+        self.m.delete_activity(['0'])
+        assert_equal(
+            [('not_before', 'sooner'), ('due', 'sooner')],
+            [(r.kind, r.activity.title) for r in self.reminders.upcoming(10)])
+        assert_equal(not_before_epoch('2067-11-01'), self.reminders.upcoming(10)[1].when)
+        self.m.list_activities(words='sooner', not_before='any')
+        self.m.complete_activity(['0'])
+        assert_equal(None, self.reminders.next_time())
+        self.clock.now = DUE * 2
+        assert_equal([], self.reminders.fire())
+
+    def test_thread(self):
+        # a clock a moment before the reminder, running at real speed
+        start = time()
+        self.clock = lambda: DUE - 0.2 + (time() - start)
+        done = threading.Event()
+
+        def sink(reminder):
+            self.fired.append(reminder)
+            done.set()
+        reminders = Reminders(sink, clock=self.clock)
+        m = Manager()
+        m.remind(reminders)
+        reminders.start()  # with nothing to wait for
+        try:
+            m.new_activity(title='water plants', due='2067-10-20')  # wakes the timer
+            assert_true(done.wait(5))
+        finally:
+            reminders.stop()
+        assert_equal('water plants', self.fired[0].activity.title)
+        assert_true(time() - start < 1)
+
+
+class Test_Sinks(TestCase):
+
+    def setUp(self):
+        self.m = Manager()
+        self.m.new_activity(title='water plants', due='2067-10-20')
+        self.reminders = Reminders(clock=Clock(0.0))
+        self.m.remind(self.reminders)
+        self.reminder = self.reminders.upcoming(1)[0]
+
+    def test_stream(self):
+        stream = StringIO()
+        StreamSink(stream)(self.reminder)
+        assert_equal('2067-10-20T00:00:00Z due: water plants\n', stream.getvalue())
+
+    def test_fifo(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'reminders'
+            os.mkfifo(path)
+            FifoSink(path)(self.reminder)  # no reader: logged and dropped
+            fd = os.open(path, os.O_RDONLY | os.O_NONBLOCK)
+            try:
+                FifoSink(path)(self.reminder)
+                assert_equal(b'2067-10-20T00:00:00Z due: water plants\n', os.read(fd, 1024))
+            finally:
+                os.close(fd)
+
+    def test_command(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'out'
+            script = f'import os, sys; open({str(path)!r}, "w").write(os.environ["MEEK_TITLE"] + "|" + sys.argv[1])'
+            CommandSink([sys.executable, '-c', script])(self.reminder)
+            assert_equal('water plants|2067-10-20T00:00:00Z due: water plants', path.read_text())
+
+    def test_spec(self):
+        assert_true(isinstance(sink_for('-'), StreamSink))
+        assert_equal(Path('/tmp/meek'), sink_for('fifo:/tmp/meek').path)
+        assert_equal(['notify-send', 'meek'], sink_for('command:notify-send meek').argv)
+
+    @raises(ValueError)
+    def test_bad_spec(self):
+        sink_for('email:me@example.com')
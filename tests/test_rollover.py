@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the day-rollover job and the due-date buckets it maintains"""
+
+from datetime import date, datetime, timedelta, timezone
+import logging
+from meek.manager import Manager
+from meek.rollover import DateBuckets, bucket_spans, next_midnight
+from nose.tools import assert_equal, assert_false, assert_true
+from time import time
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+DAY = 86400
+
+
+def utc_day(now, days=0):
+    return (datetime.fromtimestamp(now, timezone.utc).date() + timedelta(days=days)).isoformat()
+
+
+class Test_Buckets(TestCase):
+
+    def test_next_midnight(self):
+        now = time()
+        later = next_midnight(now)
+        assert_true(now < later <= now + DAY)
+        assert_true(datetime.fromtimestamp(later, timezone.utc).time().hour == 0 or (
+            datetime.fromtimestamp(later).astimezone().time().hour == 0))
+
+    def test_spans(self):
+        m = Manager()
+        for title, due in [('a', '2067-11-15'), ('b', '2067-11-16'), ('c', '2067-11-18'), ('d', '2067-11-21')]:
+            m.new_activity(title=title, due=due)
+        buckets = DateBuckets()
+        spans = bucket_spans(date(2067, 11, 16))  # a Wednesday
+        buckets.reset(spans, m.activities.values())
+        titles = {name: sorted([a.title for a in buckets.lookup(*span)]) for name, span in spans.items()}
+        assert_equal({'overdue': ['a', 'b'], 'today': ['b'], 'this week': ['a', 'b', 'c']}, titles)
+        assert_equal(None, buckets.lookup('2067-11-01', '2067-11-30'))
+
+
+class Test_Rollover(TestCase):
+
+    def setUp(self):
+        self.now = time()
+        self.m = Manager()
+        for days in [-1, 0, 1]:
+            self.m.new_activity(title=f'due {days}', due=utc_day(self.now, days))
+        self.m.rollover(self.now)
+
+    def test_overdue(self):
+        assert_equal(2, len(self.m.list_activities(overdue='today').splitlines()))
+        self.m.rollover(self.now + DAY)
+        assert_equal(utc_day(self.now, 1), self.m.today)
+        assert_equal(3, len(self.m.list_activities(overdue='today').splitlines()))
+        assert_true('due 1' in self.m.list_activities(due='today'))
+
+    def test_buckets_follow_changes(self):
+        self.m.list_activities(due='tomorrow')
+        self.m.modify_activity(['0'], due=utc_day(self.now, -3))
+        assert_equal(3, len(self.m.list_activities(overdue='today').splitlines()))
+        self.m.list_activities(overdue='today')
+        self.m.delete_activity(['0'])
+        assert_equal(2, len(self.m.list_activities(overdue='today').splitlines()))
+
+    def test_hides_expire(self):
+        self.m.new_activity(title='later', not_before=utc_day(self.now, 3))
+        assert_equal(1, len(self.m.hidden))
+        assert_false('later' in self.m.list_activities())
+        self.m.rollover(self.now + 4 * DAY)
+        assert_equal(0, len(self.m.hidden))
+        assert_true('later' in self.m.list_activities())
+
+    def test_bounds_memo(self):
+        self.m.list_activities(due='2067-10-20')
+        assert_true('2067-10-20' in self.m.bounds)
+        self.m.rollover(self.now + DAY)
+        assert_equal({}, self.m.bounds)
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test keyword rules: parsing, compiled matching, and applying them to activities"""
+
+import json
+import logging
+from meek.activity import Activity
+from meek.manager import Manager, UsageError
+from meek.rules import DEFAULT_RULES, PhraseAutomaton, RuleSet, parse_rules
+from nose.tools import assert_equal, assert_false, assert_true, raises
+from pathlib import Path
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+RULES = [
+    {'word': 'meds', 'set': {'tags': 'health'}},
+    {'phrase': 'pay rent', 'set': {'due': '2067-10-01', 'interval': 'month', 'tags': ['money']}},
+    {'phrase': 'rent', 'set': {'tags': 'home'}},
+    {'regex': '^[Cc]all ', 'set': {'tags': ['phone']}},
+    {'regex': r'\bmom\b', 'set': {'tags': ['family']}},
+]
+
+
+class Test_Automaton(TestCase):
+
+    def test_overlapping(self):
+        a = PhraseAutomaton(['he', 'she', 'his', 'hers'])
+        found = sorted([(start, end, i) for start, end, i in a.search('ushers')])
+        assert_equal([(1, 4, 1), (2, 4, 0), (2, 6, 3)], found)
+
+
+class Test_RuleSet(TestCase):
+
+    def setUp(self):
+        self.rules = RuleSet(parse_rules(RULES))
+
+    def titles(self, title):
+        return [self.rules.rules[n].pattern for n in self.rules.match(Activity(title=title))]
+
+    def test_match(self):
+        assert_equal(['meds'], self.titles('take Meds'))
+        assert_equal([], self.titles('take medsx'))
+        assert_equal(['pay rent', 'rent'], self.titles('pay  rent today'))
+        assert_equal([], self.titles('payrent'))
+        assert_equal(['^[Cc]all ', r'\bmom\b'], self.titles('Call mom'))
+        assert_equal([r'\bmom\b'], self.titles('ask mom to call'))
+
+    def test_regex_flags(self):
+        # each regular expression is compiled on its own, so inline flags are allowed
+        rules = RuleSet(parse_rules([{'regex': '(?i)^call', 'set': {'tags': 'phone'}}] + RULES[4:]))
+        assert_equal([0, 1], rules.match(Activity(title='CALL mom')))
+
+    def test_changes(self):
+        a = Activity(title='pay rent', due='2067-11-01', tags=['money'])
+        assert_equal({'interval': 'month', 'tags': ['home']}, self.rules.changes(a))
+        self.rules.apply(a)
+        assert_equal('2067-11-01', a.due)
+        assert_equal({}, self.rules.changes(a))
+
+    @raises(ValueError)
+    def test_two_words(self):
+        parse_rules([{'word': 'pay rent', 'set': {'tags': 'money'}}])
+
+    @raises(ValueError)
+    def test_bad_field(self):
+        parse_rules([{'word': 'rent', 'set': {'title': 'money'}}])
+
+
+class Test_Manager(TestCase):
+
+    def test_defaults(self):
+        m = Manager()
+        m.new_activity(title='take meds daily')
+        m.new_activity(title='water plants weekly', due='2067-10-20')
+        # what the rules set is indexed
+        assert_equal(1, len(m.list_activities(tags='health').splitlines()))
+        assert_equal(1, len(m.list_activities(interval='day').splitlines()))
+        assert_true('due:2067-10-20' in m.list_activities(interval='week'))
+
+    def test_store_rules_and_apply(self):
+        m = Manager()
+        m.new_activity(title='Call mom')
+        m.new_activity(title='buy milk')
+        m.list_activities(words='milk')
+        m.complete_activity(['0'])
+        m.new_activity(title='call the bank')
+        with TemporaryDirectory() as tmp:
+            where = Path(tmp)
+            m.save_activities(where)
+            with open(where / 'rules.json', 'w', encoding='utf-8') as f:
+                json.dump(RULES, f)
+            m = Manager()
+            m.load_activities(where)
+        assert_equal(5, len(m.rules))
+        generation = m.generations['tags']
+        assert_equal('Rules changed 2 of 3 activities.', m.apply_rules())
+        assert_equal(generation + 2, m.generations['tags'])
+        assert_true('Call mom' in m.list_activities(tags=['phone', 'family']))
+        assert_equal('Rules changed 0 of 3 activities.', m.apply_rules())
+
+    def test_save_and_load(self):
+        m = Manager()
+        m.new_activity(title='buy milk')
+        m.rules = RuleSet(parse_rules(RULES))
+        with TemporaryDirectory() as tmp:
+            for name in ['first', 'second']:
+                # a full save to a new place, then an incremental one over it
+                where = Path(tmp) / name
+                m.save_activities(where)
+                m.save_activities(where)
+                m = Manager()
+                m.load_activities(where)
+                assert_equal([r.asdict() for r in parse_rules(RULES)], [r.asdict() for r in m.rules.rules])
+            m.rules = RuleSet(parse_rules(DEFAULT_RULES))
+            m.save_activities(where)
+            assert_false((where / 'rules.json').exists())
+
+    @raises(UsageError)
+    def test_bad_file(self):
+        with TemporaryDirectory() as tmp:
+            path = Path(tmp) / 'rules.json'
+            path.write_text('{"word": "meds"}')
+            Manager().load_rules(path)
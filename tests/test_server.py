@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the meek server and thin client over a Unix domain socket"""
+
+import logging
+from meek.client import send
+from meek.server import Server
+from nose.tools import assert_equal, assert_false, assert_true, raises
+from pathlib import Path
+import socket
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Server(TestCase):
+
+    def setUp(self):
+        self.store = TemporaryDirectory()
+        self.run = TemporaryDirectory()
+        self.path = Path(self.run.name) / 'meek.sock'
+        self.server = Server(self.path, where=self.store.name, idle=60.0, connection_timeout=0.5)
+        self.thread = Thread(target=self.server.serve, daemon=True)
+        self.thread.start()
+
+    def tearDown(self):
+        if self.thread.is_alive():
+            list(send(['shutdown'], self.path))
+            self.thread.join(5)
+        self.store.cleanup()
+        self.run.cleanup()
+
+    def test_round_trip(self):
+        records = list(send(['new "walk dog" tags:pets', 'list', 'bogus'], self.path))
+        assert_equal(3, len(records))
+        assert_true(records[0]['ok'])
+        assert_true('walk dog' in records[1]['output'])
+        assert_equal(1, len(records[1]['context']))
+        assert_false(records[2]['ok'])
+        # context survives between connections
+        records = list(send(['full 0'], self.path))
+        assert_true('walk dog' in records[0]['output'])
+
+    def test_quit_is_refused(self):
+        records = list(send(['quit force:true'], self.path))
+        assert_false(records[0]['ok'])
+        assert_true(self.thread.is_alive())
+
+    def test_shutdown_saves(self):
+        list(send(['new "feed cat"'], self.path))
+        list(send(['shutdown'], self.path))
+        self.thread.join(5)
+        assert_false(self.thread.is_alive())
+        assert_false(self.path.exists())
+        assert_equal(1, len(list((Path(self.store.name) / 'activities').iterdir())))
+
+    def test_idle_autosave(self):
+        list(send(['new "feed cat"'], self.path))
+        self.server.handle_timeout()
+        assert_equal(1, len(list((Path(self.store.name) / 'activities').iterdir())))
+
+    def test_silent_connection(self):
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as s:
+            s.connect(str(self.path))
+            # served only once the silent connection is dropped
+            records = list(send(['new "feed cat"'], self.path, timeout=5.0))
+            assert_true(records[0]['ok'])
+            assert_equal(b'', s.recv(1))
+
+    @raises(RuntimeError)
+    def test_single_server(self):
+        with TemporaryDirectory() as other:
+            Server(self.path, where=other)
@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test that heavy dependencies are loaded on first use, not at import"""
+
+import logging
+from nose.tools import assert_equal, assert_false, assert_true, raises
+from pathlib import Path
+import subprocess
+import sys
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+test_data_path = Path('tests/data').resolve()
+HEAVY = ['maya', 'dateparser', 'pendulum', 'chardet', 'tzlocal', 'numpy', 'textnorm', 'readline']
+
+
+def loaded_after(code: str):
+    script = f'import sys\n{code}\nprint(" ".join(sorted(sys.modules)))'
+    p = subprocess.run(
+        [sys.executable, '-c', script], capture_output=True, text=True, check=True)
+    return set(p.stdout.split())
+
+
+class Test_Startup(TestCase):
+
+    def test_import(self):
+        modules = loaded_after('import meek.interpreter')
+        assert_equal([], [m for m in HEAVY if m in modules])
+
+    def test_list(self):
+        modules = loaded_after(
+            'from meek.interpreter import Interpreter\n'
+            'i = Interpreter()\n'
+            'i.parse(["new", "test", "activity", "due:today"])\n'
+            'i.parse(["due", "today"])\n'
+            'i.parse(["list"])')
+        assert_false('maya' in modules)
@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test latency histograms, counters, and the stats verb"""
+
+import json
+import logging
+from meek.interpreter import Interpreter
+from meek.stats import Histogram, Metrics, NULL_TIMER
+from nose.tools import assert_almost_equal, assert_equal, assert_in, assert_true
+from pathlib import Path
+import sys
+from tempfile import TemporaryDirectory
+from threading import Thread
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Test_Histogram(TestCase):
+
+    def test_quantiles(self):
+        h = Histogram()
+        for ns in range(1, 1001):
+            h.record(ns * 1000)
+        assert_equal(1000, h.count)
+        assert_equal(1000000, h.max)
+        # bucket bounds are within a fifth of the true value
+        assert_almost_equal(500000, h.quantile(0.5), delta=100000)
+        assert_almost_equal(990000, h.quantile(0.99), delta=200000)
+        assert_equal(1000000, h.quantile(1.0))
+        assert_almost_equal(0.5005, h.summary()['mean_ms'], places=4)
+
+    def test_empty(self):
+        h = Histogram()
+        assert_equal(0.0, h.quantile(0.5))
+        assert_equal(0, h.summary()['count'])
+
+
+class Test_Metrics(TestCase):
+
+    def test_threads(self):
+        m = Metrics()
+
+        def work():
+            for i in range(0, 20000):
+                m.record('x', 1000 + i)
+                m.count('y')
+        threads = [Thread(target=work) for i in range(0, 8)]
+        interval = sys.getswitchinterval()
+        sys.setswitchinterval(1e-6)  # switch threads often, so unguarded updates would be lost
+        try:
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            sys.setswitchinterval(interval)
+        records = {r['name']: r for r in m.records()}
+        assert_equal(160000, records['x']['count'])
+        assert_equal(160000, sum(m.histograms['x'].buckets.values()))
+        assert_equal(160000, records['y']['value'])
+
+    def test_disabled(self):
+        m = Metrics(enabled=False)
+        assert_true(m.time('x') is NULL_TIMER)
+        with m.time('x'):
+            pass
+        m.count('y')
+        assert_equal([], m.records())
+
+    def test_dump(self):
+        m = Metrics()
+        with m.time('x'):
+            pass
+        m.count('y', 3)
+        with TemporaryDirectory() as d:
+            path = Path(d) / 'stats.jsonl'
+            assert_equal(3, m.dump(path, {'z': 1}))
+            m.dump(path)
+            records = [json.loads(line) for line in path.read_text().splitlines()]
+        assert_equal(5, len(records))
+        assert_equal(['x', 'y', 'z'], [r['name'] for r in records[0:3]])
+        assert_equal(['histogram', 'counter', 'gauge'], [r['type'] for r in records[0:3]])
+        assert_equal(3, records[1]['value'])
+        assert_true(all(['time' in r for r in records]))
+
+
+class Test_Verb(TestCase):
+
+    def test_stats(self):
+        i = Interpreter()
+        i.execute('new "Read a book" due:2067-10-01')
+        i.execute('list')
+        report = i.execute('stats')
+        assert_in('verb.new', report)
+        assert_in('verb.list', report)
+        assert_in('manager.filter', report)
+        assert_in('activities', report)
+        i.execute('stats reset')
+        i.execute('stats off')
+        i.execute('list')
+        names = [r['name'] for r in i.manager.metrics.records()]
+        assert_equal(['verb.stats'], names)  # "stats off" itself started timing while on
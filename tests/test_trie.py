@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""Test the prefix trie and the completions built on it"""
+
+import logging
+from meek.completion import Completer
+from meek.interpreter import Interpreter
+from meek.trie import PrefixTrie
+from nose.tools import assert_equal, assert_false, assert_true
+from unittest import TestCase
+
+logger = logging.getLogger(__name__)
+
+
+class Test_PrefixTrie(TestCase):
+
+    def test_complete(self):
+        t = PrefixTrie(['cat', 'car', 'cart', 'dog', 'c'])
+        assert_equal(5, len(t))
+        assert_equal(['c', 'car', 'cart', 'cat'], t.complete('c'))
+        assert_equal(['car', 'cart'], t.complete('car'))
+        assert_equal(['c', 'car'], t.complete('c', limit=2))
+        assert_equal([], t.complete('x'))
+        assert_equal(['c', 'car', 'cart', 'cat', 'dog'], list(t))
+
+    def test_discard(self):
+        t = PrefixTrie(['car', 'cart'])
+        assert_false(t.add('car'))
+        assert_true(t.discard('cart'))
+        assert_false(t.discard('cart'))
+        assert_false(t.discard('ca'))
+        assert_equal(['car'], t.complete(''))
+        assert_true(t.discard('car'))
+        assert_equal({}, t.root)
+
+
+class Test_Completion(TestCase):
+
+    def setUp(self):
+        self.i = Interpreter()
+        self.i.execute('new "walk the dog" tags:pets,errand interval:day')
+        self.i.execute('new "buy dog food" tags:errand')
+        self.c = Completer(self.i)
+
+    def test_index_sync(self):
+        completions = self.i.manager.completions
+        assert_equal(['errand', 'pets'], list(completions['tags']))
+        self.i.execute('list pets')
+        self.i.execute('modify 0 tags:-pets')
+        assert_equal(['errand'], list(completions['tags']))
+        self.i.execute('purge')
+        assert_equal(0, len(completions['words']))
+
+    def test_candidates(self):
+        assert_equal(['load', 'ls'], self.c.candidates('lo', 0, 'lo') + self.c.candidates('ls', 0, 'ls'))
+        assert_equal(['tags:errand'], self.c.candidates('list tags:e', 5, 'tags:e'))
+        assert_equal(['tags:pets,errand'], self.c.candidates('m 0 tags:pets,e', 4, 'tags:pets,e'))
+        assert_equal(['due:today', 'due:tomorrow'], self.c.candidates('new x due:to', 6, 'due:to'))
+        assert_equal(['dog', 'due:'], self.c.candidates('list do', 5, 'do') + self.c.candidates('list du', 5, 'du'))
+        assert_equal(['interval:week', 'interval:workday'], self.c.candidates('m 0 interval:w', 4, 'interval:w'))